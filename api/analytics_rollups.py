@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Analytics rollups for the SubscriptionPro API
+Subscription counts per status and revenue per month are kept up to date by
+database triggers (see supabase-setup.sql), so the admin analytics endpoint
+reads a few pre-aggregated rows instead of the raw tables.
+
+Usage:
+    python analytics_rollups.py rebuild   # backfill / rebuild from raw tables
+    python analytics_rollups.py check     # compare rollups with raw tables
+"""
+
+import argparse
+import sys
+from typing import Dict, List
+
+
+def read_rollups(supabase) -> Dict:
+    """Current analytics totals from the rollup tables"""
+    status_rows = supabase.table('subscription_status_rollup').select('status, subscription_count').execute().data
+    revenue_rows = supabase.table('monthly_revenue_rollup').select('month, revenue').order('month').execute().data
+
+    subscriptions_by_status = {
+        row['status']: row['subscription_count']
+        for row in status_rows
+        if row['subscription_count']
+    }
+    monthly_revenue = {
+        row['month'][:7]: float(row['revenue'])  # YYYY-MM
+        for row in revenue_rows
+        if float(row['revenue'])
+    }
+
+    return {
+        "subscriptions_by_status": subscriptions_by_status,
+        "monthly_revenue": monthly_revenue,
+        "total_revenue": sum(monthly_revenue.values())
+    }
+
+
+def rebuild(supabase) -> Dict[str, int]:
+    """Recompute both rollups from the raw tables; returns buckets per rollup"""
+    rows = supabase.rpc('rebuild_analytics_rollups', {}).execute().data or []
+    return {row['rollup']: row['buckets'] for row in rows}
+
+
+def check(supabase) -> List[Dict]:
+    """Buckets where a rollup disagrees with the raw tables (empty if consistent)"""
+    return supabase.rpc('check_analytics_rollups', {}).execute().data or []
+
+
+def main(argv=None):
+    from supabase_pool import get_supabase_client
+
+    parser = argparse.ArgumentParser(description="Maintain analytics rollups")
+    parser.add_argument('command', choices=['rebuild', 'check'])
+    parser.add_argument('--repair', action='store_true', help="rebuild when check finds drift")
+    args = parser.parse_args(argv)
+
+    supabase = get_supabase_client()
+    if not supabase:
+        print("Supabase is not configured (SUPABASE_URL / SUPABASE_KEY)")
+        return 2
+
+    if args.command == 'rebuild':
+        for rollup, buckets in rebuild(supabase).items():
+            print(f"Rebuilt {rollup}: {buckets} buckets")
+        return 0
+
+    mismatches = check(supabase)
+    for row in mismatches:
+        print(f"{row['rollup']} {row['bucket']}: expected {row['expected']}, rollup has {row['actual']}")
+
+    if not mismatches:
+        print("Rollups are consistent")
+        return 0
+
+    if args.repair:
+        rebuild(supabase)
+        print(f"Rebuilt rollups after {len(mismatches)} mismatches")
+        return 0
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+"""
+Write-behind audit logging for the SubscriptionPro API
+Records go through the shared write_behind queue and are inserted into
+audit_logs as one PostgREST request per batch.
+"""
+
+from write_behind import AuditPipeline, pipeline_from_env
+
+
+def supabase_sink(records):
+    """Insert a batch into audit_logs with one request"""
+    from supabase_pool import get_supabase_client
+
+    supabase = get_supabase_client()
+    if not supabase:
+        raise RuntimeError("Supabase is not configured")
+    supabase.table('audit_logs').insert(records).execute()
+
+
+def create_audit_pipeline(sink=supabase_sink) -> AuditPipeline:
+    """Build the pipeline from environment configuration; flushed at exit"""
+    return pipeline_from_env(sink)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Recurring billing run for the SubscriptionPro API
+Pages through due subscriptions in fixed-size keyset chunks and advances each
+chunk with one bulk database call (apply_billing_advances in
+supabase-setup.sql). Progress is checkpointed per run date, so a run that hits
+its time budget returns early and the next invocation resumes after the last
+completed chunk.
+
+Usage:
+    python billing_run.py [--date YYYY-MM-DD] [--chunk-size 500]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List
+
+CHUNK_SIZE = int(os.environ.get('BILLING_CHUNK_SIZE', 500))
+# Chunk writes allowed in flight while the next chunk is fetched
+MAX_CONCURRENCY = int(os.environ.get('BILLING_MAX_CONCURRENCY', 2))
+# Seconds of work per invocation; keep below the function's maxDuration
+TIME_BUDGET = float(os.environ.get('BILLING_TIME_BUDGET', 20))
+
+# Days between deliveries by frequency; anything else is treated as weekly
+FREQUENCY_DAYS = {
+    'weekly': 7,
+    'monthly': 30,
+    'quarterly': 90,
+    'yearly': 365,
+}
+
+
+def next_delivery_date(current, frequency):
+    """Delivery date following current for the given frequency"""
+    return current + timedelta(days=FREQUENCY_DAYS.get(frequency, 7))
+
+
+class BillingRun:
+    """One resumable billing run for a run date"""
+
+    def __init__(self, supabase, run_date=None, chunk_size=CHUNK_SIZE,
+                 max_concurrency=MAX_CONCURRENCY, time_budget=TIME_BUDGET):
+        self.supabase = supabase
+        self.run_date = run_date or datetime.now(timezone.utc).date()
+        self.chunk_size = chunk_size
+        self.max_concurrency = max(1, max_concurrency)
+        self.time_budget = time_budget
+
+    def load_checkpoint(self) -> Dict:
+        result = self.supabase.table('billing_run_checkpoints').select('*').eq('run_date', self.run_date.isoformat()).execute()
+        if result.data:
+            return result.data[0]
+        return {
+            'run_date': self.run_date.isoformat(),
+            'last_subscription_id': None,
+            'processed': 0,
+            'skipped': 0,
+            'chunks': 0,
+            'status': 'running',
+            'started_at': datetime.now(timezone.utc).isoformat()
+        }
+
+    def save_checkpoint(self, checkpoint):
+        checkpoint['updated_at'] = datetime.now(timezone.utc).isoformat()
+        self.supabase.table('billing_run_checkpoints').upsert(checkpoint).execute()
+
+    def fetch_chunk(self, after_id) -> List[Dict]:
+        """Next chunk of due subscriptions ordered by subscription_id"""
+        query = self.supabase.table('subscriptions') \
+            .select('subscription_id, frequency, next_delivery_date') \
+            .eq('status', 'active') \
+            .lte('next_delivery_date', self.run_date.isoformat())
+        if after_id:
+            query = query.gt('subscription_id', after_id)
+        return query.order('subscription_id').limit(self.chunk_size).execute().data or []
+
+    def apply_chunk(self, rows) -> Dict:
+        """Advance one chunk with a single bulk update"""
+        started = time.perf_counter()
+        updates = []
+        for row in rows:
+            current = date.fromisoformat(row['next_delivery_date'][:10])
+            updates.append({
+                'subscription_id': row['subscription_id'],
+                # Guards against advancing a row twice when a chunk is retried
+                'expected_delivery_date': current.isoformat(),
+                'next_delivery_date': next_delivery_date(current, row['frequency']).isoformat()
+            })
+
+        result = self.supabase.rpc('apply_billing_advances', {
+            'p_updates': updates,
+            'p_run_date': self.run_date.isoformat()
+        }).execute()
+
+        updated = len(result.data or [])
+        elapsed = time.perf_counter() - started
+        return {
+            'rows': len(rows),
+            'updated': updated,
+            'skipped': len(rows) - updated,
+            'seconds': round(elapsed, 4),
+            'rows_per_second': round(len(rows) / elapsed, 1) if elapsed > 0 else None
+        }
+
+    def run(self) -> Dict:
+        """Process chunks until done or out of time; returns a run report"""
+        started = time.monotonic()
+        checkpoint = self.load_checkpoint()
+        report = {
+            'run_date': self.run_date.isoformat(),
+            'complete': checkpoint['status'] == 'completed',
+            'processed': 0,
+            'skipped': 0,
+            'failed': 0,
+            # Rows written by chunks that finished after an earlier chunk failed
+            'applied_after_failure': 0,
+            'chunks': [],
+            'error': None
+        }
+        if report['complete']:
+            report['totals'] = {key: checkpoint[key] for key in ('processed', 'skipped', 'chunks')}
+            return report
+
+        in_flight = deque()
+        after_id = checkpoint['last_subscription_id']
+        exhausted = False
+
+        def commit_oldest():
+            # Chunks are committed in fetch order so the checkpoint never
+            # moves past a chunk that has not been written
+            chunk_number, last_id, rows, future = in_flight.popleft()
+            if future.cancelled():
+                return
+            try:
+                stats = future.result()
+            except Exception as e:
+                report['failed'] += len(rows)
+                if report['error'] is None:
+                    report['error'] = f"Chunk {chunk_number} failed: {e}"
+                    # Chunks that have not started are left for the resumed run
+                    for *_, pending in in_flight:
+                        pending.cancel()
+                return
+
+            if report['error'] is not None:
+                # Already written, but the checkpoint cannot move past the
+                # failed chunk; the rows advanced here are no longer due, so
+                # the resumed run does not fetch them again
+                report['applied_after_failure'] += stats['updated']
+                return
+
+            stats['chunk'] = chunk_number
+            report['chunks'].append(stats)
+            report['processed'] += stats['updated']
+            report['skipped'] += stats['skipped']
+
+            checkpoint['last_subscription_id'] = last_id
+            checkpoint['processed'] += stats['updated']
+            checkpoint['skipped'] += stats['skipped']
+            checkpoint['chunks'] += 1
+            self.save_checkpoint(checkpoint)
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='billing-chunk') as executor:
+            chunk_number = checkpoint['chunks']
+            while report['error'] is None and time.monotonic() - started < self.time_budget:
+                rows = self.fetch_chunk(after_id)
+                if not rows:
+                    exhausted = True
+                    break
+
+                chunk_number += 1
+                after_id = rows[-1]['subscription_id']
+                in_flight.append((chunk_number, after_id, rows, executor.submit(self.apply_chunk, rows)))
+
+                while len(in_flight) >= self.max_concurrency:
+                    commit_oldest()
+
+                if len(rows) < self.chunk_size:
+                    exhausted = True
+                    break
+
+            while in_flight:
+                commit_oldest()
+
+        if exhausted and report['error'] is None:
+            checkpoint['status'] = 'completed'
+            self.save_checkpoint(checkpoint)
+            report['complete'] = True
+
+        elapsed = time.monotonic() - started
+        report['elapsed_seconds'] = round(elapsed, 3)
+        report['rows_per_second'] = round(report['processed'] / elapsed, 1) if elapsed > 0 else None
+        report['totals'] = {key: checkpoint[key] for key in ('processed', 'skipped', 'chunks')}
+        return report
+
+
+def main(argv=None):
+    from supabase_pool import get_supabase_client
+
+    parser = argparse.ArgumentParser(description="Run recurring billing")
+    parser.add_argument('--date', type=date.fromisoformat, default=None, help="run date (default: today, UTC)")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--concurrency', type=int, default=MAX_CONCURRENCY)
+    parser.add_argument('--time-budget', type=float, default=float('inf'),
+                        help="seconds before stopping (default: run to completion)")
+    args = parser.parse_args(argv)
+
+    supabase = get_supabase_client()
+    if not supabase:
+        print("Supabase is not configured (SUPABASE_URL / SUPABASE_KEY)")
+        return 2
+
+    report = BillingRun(supabase, args.date, args.chunk_size, args.concurrency, args.time_budget).run()
+    print(json.dumps(report, indent=2))
+    return 0 if report['complete'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+"""
+Product catalog cache for the SubscriptionPro API
+BaseHTTPRequestHandler side of the shared catalog_core cache: the handler's
+send_catalog_response() serves cached listings, negotiates a content coding
+and answers matching If-None-Match requests with 304.
+"""
+
+# Core types are re-exported so the handler only imports this module
+from catalog_core import (
+    CATALOG_CACHE_SIZE, CATALOG_CACHE_TTL, CatalogCache, CatalogEntry, etag_matches, strong_etag
+)
@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+"""
+Response compression for the SubscriptionPro API
+The handler negotiates and compresses through this module; the codings
+themselves come from the shared content_coding core.
+"""
+
+# Core functions are re-exported so the handler and caches only import this module
+from content_coding import (
+    BROTLI_AVAILABLE, COMPRESSION_ENABLED, MIN_SIZE, PREFERENCE, ZSTD_AVAILABLE,
+    StreamCompressor, compress, compress_stream, negotiate, parse_accept_encoding
+)
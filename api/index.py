@@ -1,5 +1,4 @@
 from http.server import BaseHTTPRequestHandler
-import json
 import os
 import urllib.parse
 from datetime import datetime, timedelta, timezone
@@ -8,30 +7,106 @@ import jwt
 import hashlib
 import hmac
 import uuid
-from collections import defaultdict
-
-# Supabase client setup
-try:
-    from supabase import create_client, Client
-    SUPABASE_AVAILABLE = True
-except ImportError:
-    SUPABASE_AVAILABLE = False
+from concurrent.futures import ThreadPoolExecutor
+
+# Supabase client setup (one pooled client per process)
+from supabase_pool import registry as supabase_registry, get_supabase_client
+from rate_limiter import create_rate_limiter
+from router import Router, MethodNotAllowed
+from token_cache import VerifiedTokenCache
+import serialization
+import tracing
+import compression
+import analytics_rollups
+from billing_run import BillingRun
+from audit_log import create_audit_pipeline
+from snapshot_cache import SnapshotCache
+from catalog_cache import CatalogCache, etag_matches
+from subscription_transitions import TransitionRejected, transition_subscription
+from request_body import MAX_BODY_SIZE, RequestBody, RequestBodyError
+from metrics import RequestMetrics, UNMATCHED_ROUTE, send_metrics
+from pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_page, page_size, query_value
+
+# Signing secret, read once per process
+JWT_SECRET = os.environ.get('JWT_SECRET', 'your-secret-key')
+
+# Sort keys accepted by GET /admin/users (see admin_list_users in supabase-setup.sql)
+ADMIN_USER_SORTS = ('created_at', 'email', 'name')
+
+# Rate limit bucket applied when a route does not name one
+DEFAULT_RATE_LIMITS = {'GET': 'general', 'POST': 'general'}
+
+# Per-route request body limits in bytes (MAX_BODY_SIZE applies elsewhere)
+AUTH_MAX_BODY = 16 * 1024
+WEBHOOK_MAX_BODY = int(os.environ.get('SFCC_WEBHOOK_MAX_BODY', 5 * 1024 * 1024))
+# Shared secret for X-SFCC-Signature (hex HMAC-SHA256 of the raw body); unset skips the check
+SFCC_WEBHOOK_SECRET = os.environ.get('SFCC_WEBHOOK_SECRET')
+
+# Route table: (method, pattern, handler method, options)
+#   query      - pass parsed query string as `query_params`
+#   body       - parse the JSON request body and pass it as `data`
+#   max_body   - request body limit in bytes (default MAX_BODY_SIZE)
+#   rate_limit - rate limit bucket, None to skip
+ROUTES = [
+    ('GET', '/', 'handle_health'),
+    ('GET', '/health', 'handle_health'),
+    ('GET', '/metrics', 'handle_metrics', {'query': True}),
+    ('GET', '/monitoring/metrics', 'handle_metrics', {'query': True}),
+    ('GET', '/users', 'handle_users_get', {'query': True}),
+    ('GET', '/products', 'handle_products_get', {'query': True}),
+    ('GET', '/subscriptions', 'handle_subscriptions_get', {'query': True}),
+    ('GET', '/admin/dashboard', 'handle_dashboard'),
+    ('GET', '/admin/users', 'handle_admin_users', {'query': True}),
+    ('GET', '/admin/analytics', 'handle_admin_analytics'),
+    ('GET', '/subscriptions/{subscription_id}/pause', 'handle_subscription_pause'),
+    ('GET', '/subscriptions/{subscription_id}/resume', 'handle_subscription_resume'),
+    ('GET', '/subscriptions/{subscription_id}/skip', 'handle_subscription_skip'),
+    ('GET', '/merchant/dashboard', 'handle_merchant_dashboard'),
+    ('GET', '/merchant/products', 'handle_merchant_products'),
+    ('GET', '/recurring-billing/process', 'handle_recurring_billing'),
+    ('GET', '/sfcc/webhook', 'handle_sfcc_webhook', {'max_body': WEBHOOK_MAX_BODY}),
+    ('GET', '/sfcc/sync/customers', 'handle_sfcc_customer_sync'),
+    ('GET', '/sfcc/sync/products', 'handle_sfcc_product_sync'),
+    ('GET', '/sfcc/orders', 'handle_sfcc_order_creation'),
+
+    ('POST', '/auth/login', 'handle_login', {'body': True, 'max_body': AUTH_MAX_BODY, 'rate_limit': 'auth'}),
+    ('POST', '/auth/register', 'handle_register', {'body': True, 'max_body': AUTH_MAX_BODY, 'rate_limit': 'auth'}),
+    ('POST', '/auth/logout', 'handle_logout', {'rate_limit': 'auth'}),
+    ('POST', '/users', 'handle_users_post', {'body': True}),
+    ('POST', '/products', 'handle_products_post', {'body': True}),
+    ('POST', '/subscriptions', 'handle_subscriptions_post', {'body': True}),
+    ('POST', '/payments', 'handle_payments_post', {'body': True}),
+    ('POST', '/sfcc/webhook', 'handle_sfcc_webhook', {'max_body': WEBHOOK_MAX_BODY}),
+    ('POST', '/sfcc/orders', 'handle_sfcc_order_creation'),
+
+    ('PUT', '/subscriptions/{subscription_id}', 'handle_subscriptions_put', {'body': True}),
+    ('PUT', '/users/{user_id}', 'handle_users_put', {'body': True}),
+
+    ('DELETE', '/subscriptions/{subscription_id}', 'handle_subscriptions_delete'),
+]
 
 class handler(BaseHTTPRequestHandler):
-    # Rate limiting storage (in production, use Redis or database)
-    _rate_limit_storage = defaultdict(list)
+    # Rate limiting (token-bucket state shared through Redis when REDIS_URL is set)
+    _rate_limiter = create_rate_limiter()
     _rate_limit_enabled = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    _router = Router(ROUTES)
+    # Claims of already-verified tokens, shared by all requests in the process
+    _token_cache = VerifiedTokenCache(JWT_SECRET, max_entries=int(os.environ.get('JWT_CACHE_SIZE', 10000)))
+    # Bounded pool for running independent Supabase queries concurrently
+    _query_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('QUERY_FANOUT_WORKERS', 4)),
+                                         thread_name_prefix='supabase-query')
+    # Audit records are written in batches off the request path
+    _audit_log = create_audit_pipeline()
+    # Assembled dashboards shared by every concurrent poller
+    _dashboard_cache = SnapshotCache(ttl=float(os.environ.get('DASHBOARD_CACHE_TTL', 30)),
+                                     stale_ttl=float(os.environ.get('DASHBOARD_STALE_TTL', 300)))
+    # Serialized product listings, invalidated by every product write
+    _catalog_cache = CatalogCache()
+    # Latency histograms per route pattern and status
+    _metrics = RequestMetrics()
 
     def __init__(self, *args, **kwargs):
-        self.supabase = None
-        if SUPABASE_AVAILABLE and os.environ.get('SUPABASE_URL') and os.environ.get('SUPABASE_KEY'):
-            try:
-                self.supabase = create_client(
-                    os.environ.get('SUPABASE_URL'),
-                    os.environ.get('SUPABASE_KEY')
-                )
-            except Exception as e:
-                print(f"Supabase initialization error: {e}")
+        self.supabase = get_supabase_client()
         super().__init__(*args, **kwargs)
 
     def check_rate_limit(self, endpoint_type='general'):
@@ -42,213 +117,128 @@ class handler(BaseHTTPRequestHandler):
         # Get client IP
         client_ip = self.headers.get('X-Forwarded-For', '').split(',')[0] if self.headers.get('X-Forwarded-For') else self.client_address[0]
 
-        # Rate limit configurations
-        rate_limits = {
-            'auth': {'requests': 10, 'window': 60},  # 10 requests per minute for auth
-            'general': {'requests': 60, 'window': 60},  # 60 requests per minute for general
-            'admin': {'requests': 100, 'window': 60}  # 100 requests per minute for admin
-        }
+        # Per-user and per-role keys need the caller's identity
+        user_payload = None
+        if self._rate_limiter.needs_identity:
+            user_payload = self.verify_token(self.headers.get('Authorization', ''))
 
-        limit_config = rate_limits.get(endpoint_type, rate_limits['general'])
-        key = f"{client_ip}:{endpoint_type}"
+        decision = self._rate_limiter.check(endpoint_type, client_ip, user_payload)
+        return decision.allowed
 
-        current_time = time.time()
-        window_start = current_time - limit_config['window']
-
-        # Clean old requests
-        self._rate_limit_storage[key] = [
-            req_time for req_time in self._rate_limit_storage[key]
-            if req_time > window_start
-        ]
+    def do_GET(self):
+        self.dispatch('GET')
 
-        # Check if limit exceeded
-        if len(self._rate_limit_storage[key]) >= limit_config['requests']:
-            return False
+    def do_POST(self):
+        self.dispatch('POST')
 
-        # Add current request
-        self._rate_limit_storage[key].append(current_time)
-        return True
+    def do_PUT(self):
+        self.dispatch('PUT')
 
-    def do_GET(self):
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def send_response(self, code, message=None):
+        self._status = code
+        super().send_response(code, message)
+
+    def end_headers(self):
+        trace = getattr(self, 'trace', None)
+        if trace is not None:
+            if tracing.SERVER_TIMING_ENABLED:
+                self.send_header('Server-Timing', trace.server_timing())
+            if trace.profile_id:
+                self.send_header('X-Profile-Id', trace.profile_id)
+        super().end_headers()
+
+    def dispatch(self, method):
+        """Handle the request, recording its latency under the matched route pattern"""
+        start_time = time.perf_counter()
+        self._status = None
+        self._route_pattern = UNMATCHED_ROUTE
+        self._metrics.begin(method)
+        self.trace = tracing.start_trace(method, self.headers.get('traceparent'))
+        try:
+            self.route_request(method)
+        finally:
+            # A request that never got a response is counted as a server error
+            status = self._status or 500
+            self._metrics.end(method, self._route_pattern, status, time.perf_counter() - start_time)
+            tracing.finish_trace(self.trace, f"{method} {self._route_pattern}", **{
+                'http.request.method': method,
+                'http.route': self._route_pattern,
+                'http.response.status_code': status
+            })
+            self.trace = None
+
+    def route_request(self, method):
+        """Route the request through the compiled route table"""
         try:
-            # Check rate limit first
-            if not self.check_rate_limit('general'):
-                self.send_error_response(429, "Rate limit exceeded. Please try again later.")
-                return
-
             parsed_path = urllib.parse.urlparse(self.path)
             path = parsed_path.path
-            query_params = urllib.parse.parse_qs(parsed_path.query)
 
             # Remove /api prefix if present
             if path.startswith('/api'):
                 path = path[4:]
 
-            # Add CORS headers
-            self.add_cors_headers()
-
-            # Route handling
-            if path == '/' or path == '/health':
-                self.handle_health()
-            elif path == '/users':
-                self.handle_users_get(query_params)
-            elif path == '/products':
-                self.handle_products_get(query_params)
-            elif path == '/subscriptions':
-                self.handle_subscriptions_get(query_params)
-            elif path == '/admin/dashboard':
-                self.handle_dashboard()
-            elif path == '/admin/users':
-                self.handle_admin_users(query_params)
-            elif path == '/admin/analytics':
-                self.handle_admin_analytics()
-            elif path.startswith('/subscriptions/') and path.endswith('/pause'):
-                subscription_id = path.split('/')[2]
-                self.handle_subscription_pause(subscription_id)
-            elif path.startswith('/subscriptions/') and path.endswith('/resume'):
-                subscription_id = path.split('/')[2]
-                self.handle_subscription_resume(subscription_id)
-            elif path.startswith('/subscriptions/') and path.endswith('/skip'):
-                subscription_id = path.split('/')[2]
-                self.handle_subscription_skip(subscription_id)
-            elif path == '/merchant/dashboard':
-                self.handle_merchant_dashboard()
-            elif path == '/merchant/products':
-                self.handle_merchant_products()
-            elif path == '/recurring-billing/process':
-                self.handle_recurring_billing()
-            elif path == '/sfcc/webhook':
-                self.handle_sfcc_webhook()
-            elif path == '/sfcc/sync/customers':
-                self.handle_sfcc_customer_sync()
-            elif path == '/sfcc/sync/products':
-                self.handle_sfcc_product_sync()
-            elif path == '/sfcc/orders':
-                self.handle_sfcc_order_creation()
+            try:
+                match = self._router.match(method, path)
+            except MethodNotAllowed as e:
+                match = None
+                not_allowed = e.allowed
             else:
-                self.send_error_response(404, "Endpoint not found")
-
-        except Exception as e:
-            self.send_error_response(500, f"Internal server error: {str(e)}")
-
-    def do_POST(self):
-        try:
-            parsed_path = urllib.parse.urlparse(self.path)
-            path = parsed_path.path
-
-            # Remove /api prefix if present
-            if path.startswith('/api'):
-                path = path[4:]
+                not_allowed = None
 
             # Check rate limit (stricter for auth endpoints)
-            endpoint_type = 'auth' if path.startswith('/auth') else 'general'
-            if not self.check_rate_limit(endpoint_type):
-                self.send_error_response(429, "Rate limit exceeded. Please try again later.")
+            endpoint_type = match.route.options.get('rate_limit', DEFAULT_RATE_LIMITS.get(method)) if match else DEFAULT_RATE_LIMITS.get(method)
+            if endpoint_type:
+                with tracing.span('rate_limit'):
+                    allowed = self.check_rate_limit(endpoint_type)
+                if not allowed:
+                    self.send_error_response(429, "Rate limit exceeded. Please try again later.")
+                    return
+
+            if not_allowed:
+                self.send_error_response(405, "Method not allowed", headers={'Allow': ', '.join(not_allowed + ['OPTIONS'])})
                 return
 
-            # Add CORS headers
-            self.add_cors_headers()
-
-            # Get request body
-            content_length = int(self.headers.get('Content-Length', 0))
-            post_data = self.rfile.read(content_length).decode('utf-8') if content_length > 0 else '{}'
-
-            try:
-                data = json.loads(post_data)
-            except json.JSONDecodeError:
-                self.send_error_response(400, "Invalid JSON in request body")
-                return
-
-            # Route handling
-            if path == '/auth/login':
-                self.handle_login(data)
-            elif path == '/auth/register':
-                self.handle_register(data)
-            elif path == '/users':
-                self.handle_users_post(data)
-            elif path == '/products':
-                self.handle_products_post(data)
-            elif path == '/subscriptions':
-                self.handle_subscriptions_post(data)
-            elif path == '/payments':
-                self.handle_payments_post(data)
-            else:
+            if match is None:
                 self.send_error_response(404, "Endpoint not found")
+                return
 
-        except Exception as e:
-            self.send_error_response(500, f"Internal server error: {str(e)}")
-
-    def do_PUT(self):
-        try:
-            parsed_path = urllib.parse.urlparse(self.path)
-            path = parsed_path.path
-
-            # Remove /api prefix if present
-            if path.startswith('/api'):
-                path = path[4:]
-
-            # Add CORS headers
-            self.add_cors_headers()
+            route = match.route
+            self._route_pattern = route.pattern
+            kwargs = dict(match.params)
 
-            # Get request body
-            content_length = int(self.headers.get('Content-Length', 0))
-            put_data = self.rfile.read(content_length).decode('utf-8') if content_length > 0 else '{}'
+            if route.options.get('query'):
+                kwargs['query_params'] = urllib.parse.parse_qs(parsed_path.query)
 
+            # Oversized bodies are refused from the headers, before any read
+            self.request_body = None
             try:
-                data = json.loads(put_data)
-            except json.JSONDecodeError:
-                self.send_error_response(400, "Invalid JSON in request body")
+                self.request_body = RequestBody(self.rfile, self.headers, route.options.get('max_body', MAX_BODY_SIZE))
+                if route.options.get('body'):
+                    with tracing.span('body'):
+                        kwargs['data'] = self.request_body.json()
+                    if not isinstance(kwargs['data'], dict):
+                        raise RequestBodyError("JSON body must be an object")
+            except RequestBodyError as e:
+                self.send_body_error(e)
                 return
 
-            # Extract ID from path
-            path_parts = path.strip('/').split('/')
-            if len(path_parts) >= 2:
-                resource_id = path_parts[1]
-                resource_type = path_parts[0]
-
-                if resource_type == 'subscriptions':
-                    self.handle_subscriptions_put(resource_id, data)
-                elif resource_type == 'users':
-                    self.handle_users_put(resource_id, data)
-                else:
-                    self.send_error_response(404, "Resource not found")
+            # Per-route latency and errors are recorded by _metrics around dispatch
+            if tracing.should_profile(self.profile_requested()):
+                with tracing.profiled(self.trace, route.name):
+                    getattr(self, route.name)(**kwargs)
             else:
-                self.send_error_response(400, "Invalid resource path")
-
-        except Exception as e:
-            self.send_error_response(500, f"Internal server error: {str(e)}")
-
-    def do_DELETE(self):
-        try:
-            parsed_path = urllib.parse.urlparse(self.path)
-            path = parsed_path.path
-
-            # Remove /api prefix if present
-            if path.startswith('/api'):
-                path = path[4:]
-
-            # Add CORS headers
-            self.add_cors_headers()
-
-            # Extract ID from path
-            path_parts = path.strip('/').split('/')
-            if len(path_parts) >= 2:
-                resource_id = path_parts[1]
-                resource_type = path_parts[0]
-
-                if resource_type == 'subscriptions':
-                    self.handle_subscriptions_delete(resource_id)
-                else:
-                    self.send_error_response(404, "Resource not found")
-            else:
-                self.send_error_response(400, "Invalid resource path")
+                getattr(self, route.name)(**kwargs)
 
         except Exception as e:
             self.send_error_response(500, f"Internal server error: {str(e)}")
 
     def do_OPTIONS(self):
-        self.add_cors_headers()
         self.send_response(200)
+        self.add_cors_headers()
+        self.send_header('Content-Length', '0')
         self.end_headers()
 
     def add_cors_headers(self):
@@ -258,63 +248,170 @@ class handler(BaseHTTPRequestHandler):
 
         if '*' in allowed_origins or origin in allowed_origins:
             self.send_header('Access-Control-Allow-Origin', origin or '*')
+            # Lets browser devtools show the Server-Timing breakdown cross-origin
+            self.send_header('Timing-Allow-Origin', origin or '*')
 
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization, X-Requested-With')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization, X-Requested-With, X-Profile, traceparent')
         self.send_header('Access-Control-Allow-Credentials', 'true')
         self.send_header('Access-Control-Max-Age', '86400')
 
-    def send_json_response(self, data, status_code=200):
+    def send_json_response(self, data, status_code=200, headers=None):
         """Send JSON response with proper headers"""
+        if serialization.should_stream(data):
+            self.stream_json_response(data, status_code, headers)
+            return
+
+        with tracing.span('serialize'):
+            body = serialization.dumps(data)
+        coding = compression.negotiate(self.headers.get('Accept-Encoding'), len(body))
+        if coding:
+            with tracing.span('compress', coding=coding):
+                body = compression.compress(body, coding)
+
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_encoding_headers(coding)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.add_cors_headers()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_catalog_response(self, key, loader):
+        """Send a cached catalog response, or 304 if the client's ETag still matches"""
+        entry = self._catalog_cache.get(key)
+        cache_state = 'HIT'
+        if entry is None:
+            cache_state = 'MISS'
+            version = self._catalog_cache.version
+            rows = loader()
+            with tracing.span('serialize'):
+                body = serialization.dumps(rows)
+            entry = self._catalog_cache.put(key, version, body)
+
+        # Compressed variants are built once per entry and coding
+        coding = compression.negotiate(self.headers.get('Accept-Encoding'), len(entry.body))
+        body, etag = entry.encoded(coding, compression.compress)
+
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'X-Cache': cache_state}
+        if etag_matches(self.headers.get('If-None-Match'), etag):
+            self._catalog_cache.not_modified += 1
+            self.send_response(304)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_encoding_headers(None)
+            self.add_cors_headers()
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_encoding_headers(coding)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.add_cors_headers()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_json_response(self, data, status_code=200, headers=None):
+        """Send a large JSON document in chunks without buffering it whole"""
+        # Chunked framing needs HTTP/1.1 on both ends; otherwise the body is
+        # delimited by closing the connection
+        chunked = self.protocol_version >= 'HTTP/1.1' and self.request_version >= 'HTTP/1.1'
+
+        # Streamed documents are large by definition, so no size check
+        coding = compression.negotiate(self.headers.get('Accept-Encoding'))
+        compressor = compression.StreamCompressor(coding) if coding else None
+
         self.send_response(status_code)
         self.send_header('Content-Type', 'application/json')
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.send_encoding_headers(coding)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.add_cors_headers()
         self.end_headers()
-        self.wfile.write(json.dumps(data, default=str).encode('utf-8'))
 
-    def send_error_response(self, status_code, message):
+        def write(chunk):
+            if not chunk:
+                return
+            if chunked:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(chunk), chunk))
+            else:
+                self.wfile.write(chunk)
+
+        for chunk in serialization.iter_json(data):
+            write(compressor.compress(chunk) if compressor else chunk)
+        if compressor:
+            write(compressor.finish())
+        if chunked:
+            self.wfile.write(b'0\r\n\r\n')
+
+    def send_encoding_headers(self, coding):
+        """Content-Encoding for the chosen coding; Vary whenever compression is on"""
+        if coding:
+            self.send_header('Content-Encoding', coding)
+        if compression.COMPRESSION_ENABLED:
+            self.send_header('Vary', 'Accept-Encoding')
+
+    def send_body_error(self, error):
+        """Reject a request body; close the connection if the body was not fully read"""
+        headers = None
+        if self.request_body is None or not self.request_body.complete:
+            # The unread remainder would otherwise be parsed as the next request
+            self.close_connection = True
+            headers = {'Connection': 'close'}
+        self.send_error_response(error.status_code, str(error), headers)
+
+    def send_error_response(self, status_code, message, headers=None):
         """Send error response"""
         error_data = {
             "error": message,
             "status_code": status_code,
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
-        self.send_json_response(error_data, status_code)
+        self.send_json_response(error_data, status_code, headers)
 
     def verify_token(self, token):
         """Verify JWT token"""
-        try:
-            if not token:
-                return None
-
-            # Remove 'Bearer ' prefix if present
-            if token.startswith('Bearer '):
-                token = token[7:]
-
-            # For Supabase, we would verify the JWT token here
-            # For now, we'll do basic validation
-            secret = os.environ.get('JWT_SECRET', 'your-secret-key')
-            payload = jwt.decode(token, secret, algorithms=['HS256'])
-            return payload
-        except jwt.ExpiredSignatureError:
-            return None
-        except jwt.InvalidTokenError:
+        if not token:
             return None
 
+        # Remove 'Bearer ' prefix if present
+        if token.startswith('Bearer '):
+            token = token[7:]
+
+        # Signature is checked once per token; repeat calls hit the cache
+        with tracing.span('auth'):
+            return self._token_cache.verify(token)
+
+    def profile_requested(self):
+        """True when an admin asked for this request to be profiled"""
+        if self.headers.get('X-Profile') != '1':
+            return False
+        user_payload = self.verify_token(self.headers.get('Authorization', ''))
+        return bool(user_payload) and user_payload.get('role') == 'admin'
+
     def hash_password(self, password):
         """Hash password using SHA256"""
         return hashlib.sha256(password.encode()).hexdigest()
 
     def generate_token(self, user_data):
         """Generate JWT token"""
-        secret = os.environ.get('JWT_SECRET', 'your-secret-key')
         payload = {
             'user_id': str(user_data['user_id']),
             'email': user_data['email'],
             'role': user_data.get('user_role', 'customer'),
             'exp': datetime.now(timezone.utc) + timedelta(hours=24)
         }
-        return jwt.encode(payload, secret, algorithm='HS256')
+        return jwt.encode(payload, JWT_SECRET, algorithm='HS256')
 
     def handle_health(self):
         """Health check endpoint"""
@@ -324,10 +421,20 @@ class handler(BaseHTTPRequestHandler):
             "version": "1.0.0",
             "timestamp": datetime.now(timezone.utc).isoformat(),
             "database": "connected" if self.supabase else "not_configured",
+            "connection_pool": supabase_registry.stats(),
+            "rate_limiter": self._rate_limiter.stats(),
+            "token_cache": self._token_cache.stats(),
+            "dashboard_cache": self._dashboard_cache.stats(),
+            "catalog_cache": self._catalog_cache.stats(),
+            "audit_log": self._audit_log.stats(),
             "environment": os.environ.get('VERCEL_ENV', 'development')
         }
         self.send_json_response(health_data)
 
+    def handle_metrics(self, query_params):
+        """Request latency, in-flight and error metrics as JSON or Prometheus text"""
+        send_metrics(self, self._metrics, query_value(query_params, 'format'))
+
     def handle_login(self, data):
         """Handle user login"""
         email = data.get('email')
@@ -435,6 +542,16 @@ class handler(BaseHTTPRequestHandler):
         except Exception as e:
             self.send_error_response(500, f"Registration failed: {str(e)}")
 
+    def handle_logout(self):
+        """Revoke the presented token for the rest of its lifetime"""
+        auth_header = self.headers.get('Authorization', '')
+        if not self.verify_token(auth_header):
+            self.send_error_response(401, "Authentication required")
+            return
+
+        self._token_cache.revoke(auth_header[7:] if auth_header.startswith('Bearer ') else auth_header)
+        self.send_json_response({"success": True, "message": "Logged out"})
+
     def handle_users_get(self, query_params):
         """Handle GET /users"""
         # Verify authentication
@@ -451,9 +568,10 @@ class handler(BaseHTTPRequestHandler):
 
         try:
             # If admin, can see all users; if customer, only own profile
+            next_cursor = None
             if user_payload.get('role') == 'admin':
-                result = self.supabase.table('users').select('user_id, email, first_name, last_name, user_role, created_at').execute()
-                users_data = result.data
+                query = self.supabase.table('users').select('user_id, email, first_name, last_name, user_role, created_at')
+                users_data, next_cursor = keyset_page(query, query_params, 'user_id')
             else:
                 result = self.supabase.table('users').select('*').eq('user_id', user_payload['user_id']).execute()
                 users_data = result.data
@@ -461,11 +579,15 @@ class handler(BaseHTTPRequestHandler):
             response_data = {
                 "success": True,
                 "users": users_data,
-                "total": len(users_data)
+                "total": len(users_data),
+                "has_more": next_cursor is not None,
+                "next_cursor": next_cursor
             }
 
             self.send_json_response(response_data)
 
+        except InvalidCursor as e:
+            self.send_error_response(400, str(e))
         except Exception as e:
             self.send_error_response(500, f"Failed to fetch users: {str(e)}")
 
@@ -475,28 +597,31 @@ class handler(BaseHTTPRequestHandler):
             self.send_error_response(503, "Database not available")
             return
 
-        try:
+        search_term = query_value(query_params, 'search')
+        category = query_value(query_params, 'category')
+
+        def load_products():
             # Products are publicly accessible
             query = self.supabase.table('products').select('*')
 
             # Add filters if provided
-            if 'category' in query_params:
+            if category is not None:
                 # This would be implemented when category field is added
                 pass
 
-            if 'search' in query_params:
-                search_term = query_params['search'][0]
+            if search_term is not None:
                 query = query.ilike('name', f'%{search_term}%')
 
             result = query.execute()
 
-            response_data = {
+            return {
                 "success": True,
                 "products": result.data,
                 "total": len(result.data)
             }
 
-            self.send_json_response(response_data)
+        try:
+            self.send_catalog_response(('products', search_term, category), load_products)
 
         except Exception as e:
             self.send_error_response(500, f"Failed to fetch products: {str(e)}")
@@ -522,16 +647,20 @@ class handler(BaseHTTPRequestHandler):
             else:
                 query = self.supabase.table('subscriptions').select('*, products(name, price)').eq('user_id', user_payload['user_id'])
 
-            result = query.execute()
+            subscriptions, next_cursor = keyset_page(query, query_params, 'subscription_id')
 
             response_data = {
                 "success": True,
-                "subscriptions": result.data,
-                "total": len(result.data)
+                "subscriptions": subscriptions,
+                "total": len(subscriptions),
+                "has_more": next_cursor is not None,
+                "next_cursor": next_cursor
             }
 
             self.send_json_response(response_data)
 
+        except InvalidCursor as e:
+            self.send_error_response(400, str(e))
         except Exception as e:
             self.send_error_response(500, f"Failed to fetch subscriptions: {str(e)}")
 
@@ -648,6 +777,9 @@ class handler(BaseHTTPRequestHandler):
             update_result = self.supabase.table('subscriptions').update(update_data).eq('subscription_id', subscription_id).execute()
 
             if update_result.data:
+                self.log_audit_action(user_payload['user_id'], 'update_subscription', 'subscriptions', subscription_id,
+                                      old_values={field: result.data[0].get(field) for field in update_data},
+                                      new_values=update_data)
                 response_data = {
                     "success": True,
                     "subscription": update_result.data[0],
@@ -662,47 +794,13 @@ class handler(BaseHTTPRequestHandler):
 
     def handle_subscriptions_delete(self, subscription_id):
         """Handle DELETE /subscriptions/{id} - Cancel subscription"""
-        # Verify authentication
-        auth_header = self.headers.get('Authorization', '')
-        user_payload = self.verify_token(auth_header)
-
-        if not user_payload:
-            self.send_error_response(401, "Authentication required")
-            return
-
-        if not self.supabase:
-            self.send_error_response(503, "Database not available")
-            return
-
+        # Status is set to canceled; the row is kept
         try:
-            # Check if subscription exists and user has permission
-            query = self.supabase.table('subscriptions').select('*').eq('subscription_id', subscription_id)
-
-            if user_payload.get('role') != 'admin':
-                query = query.eq('user_id', user_payload['user_id'])
-
-            result = query.execute()
-
-            if not result.data:
-                self.send_error_response(404, "Subscription not found")
-                return
-
-            # Update status to canceled instead of deleting
-            update_data = {
-                'status': 'canceled',
-                'updated_at': datetime.now(timezone.utc).isoformat()
-            }
-
-            update_result = self.supabase.table('subscriptions').update(update_data).eq('subscription_id', subscription_id).execute()
-
-            if update_result.data:
-                response_data = {
+            if self.apply_subscription_transition(subscription_id, 'cancel'):
+                self.send_json_response({
                     "success": True,
                     "message": "Subscription canceled successfully"
-                }
-                self.send_json_response(response_data)
-            else:
-                self.send_error_response(500, "Failed to cancel subscription")
+                })
 
         except Exception as e:
             self.send_error_response(500, f"Failed to cancel subscription: {str(e)}")
@@ -761,19 +859,66 @@ class handler(BaseHTTPRequestHandler):
             self.send_error_response(503, "Database not available")
             return
 
+        sort = query_value(query_params, 'sort', 'created_at')
+        if sort not in ADMIN_USER_SORTS:
+            self.send_error_response(400, f"sort must be one of: {', '.join(ADMIN_USER_SORTS)}")
+            return
+
+        order = query_value(query_params, 'order', 'desc' if sort == 'created_at' else 'asc').lower()
+        if order not in ('asc', 'desc'):
+            self.send_error_response(400, "order must be asc or desc")
+            return
+
+        limit = page_size(query_params)
+        is_active = query_value(query_params, 'is_active')
+        params = {
+            'p_limit': limit + 1,
+            'p_sort': sort,
+            'p_descending': order == 'desc',
+            'p_role': query_value(query_params, 'role') or None,
+            'p_search': query_value(query_params, 'search') or None,
+            'p_is_active': None if is_active is None else is_active.lower() == 'true'
+        }
+
+        cursor = query_value(query_params, 'cursor')
+        if cursor:
+            try:
+                cursor_sort, cursor_order, after_key, after_id = decode_cursor(cursor, size=4)
+            except InvalidCursor as e:
+                self.send_error_response(400, str(e))
+                return
+            if (cursor_sort, cursor_order) != (sort, order):
+                self.send_error_response(400, "Cursor does not match the requested sort order")
+                return
+            params['p_after_key'] = after_key
+            params['p_after_id'] = after_id
+        else:
+            # Page numbers are still accepted from older clients
+            try:
+                page = max(1, int(query_value(query_params, 'page', 1)))
+            except ValueError:
+                page = 1
+            params['p_offset'] = (page - 1) * limit
+
         try:
-            # Get all users with their subscription counts
-            users_result = self.supabase.table('users').select('user_id, email, first_name, last_name, user_role, created_at').execute()
+            # One query: a page of users with their subscription counts
+            result = self.supabase.rpc('admin_list_users', params).execute()
+            rows = result.data or []
 
-            # Get subscription counts for each user
-            for user in users_result.data:
-                subs_result = self.supabase.table('subscriptions').select('subscription_id', count='exact').eq('user_id', user['user_id']).execute()
-                user['subscription_count'] = subs_result.count or 0
+            has_more = len(rows) > limit
+            users = rows[:limit]
+            next_cursor = encode_cursor(sort, order, users[-1]['sort_key'], users[-1]['user_id']) if has_more else None
+            for user in users:
+                del user['sort_key']
 
             response_data = {
                 "success": True,
-                "users": users_result.data,
-                "total": len(users_result.data)
+                "users": users,
+                "count": len(users),
+                "has_more": has_more,
+                "next_cursor": next_cursor,
+                "sort": sort,
+                "order": order
             }
 
             self.send_json_response(response_data)
@@ -796,31 +941,10 @@ class handler(BaseHTTPRequestHandler):
             return
 
         try:
-            # Get analytics data
-            # This is a simplified version - in production you'd want more sophisticated analytics
-            subscriptions_by_status = {}
-            status_result = self.supabase.table('subscriptions').select('status').execute()
-
-            for sub in status_result.data:
-                status = sub['status']
-                subscriptions_by_status[status] = subscriptions_by_status.get(status, 0) + 1
-
-            # Revenue by month (simplified)
-            payments_result = self.supabase.table('payments').select('amount, payment_date').eq('status', 'successful').execute()
-
-            monthly_revenue = {}
-            for payment in payments_result.data:
-                if payment['payment_date']:
-                    month = payment['payment_date'][:7]  # YYYY-MM
-                    monthly_revenue[month] = monthly_revenue.get(month, 0) + float(payment['amount'])
-
+            # Pre-aggregated by triggers; see analytics_rollups.py
             analytics_data = {
                 "success": True,
-                "analytics": {
-                    "subscriptions_by_status": subscriptions_by_status,
-                    "monthly_revenue": monthly_revenue,
-                    "total_revenue": sum(monthly_revenue.values())
-                },
+                "analytics": analytics_rollups.read_rollups(self.supabase),
                 "timestamp": datetime.now(timezone.utc).isoformat()
             }
 
@@ -914,6 +1038,7 @@ class handler(BaseHTTPRequestHandler):
             }
 
             result = self.supabase.table('products').insert(product_data).execute()
+            self._catalog_cache.bump()
 
             if result.data:
                 response_data = {
@@ -981,157 +1106,73 @@ class handler(BaseHTTPRequestHandler):
         except Exception as e:
             self.send_error_response(500, f"Failed to update user: {str(e)}")
 
-    def handle_subscription_pause(self, subscription_id):
-        """Handle subscription pause"""
+    def apply_subscription_transition(self, subscription_id, action):
+        """Apply a state transition for the caller; None once an error response was sent"""
         auth_header = self.headers.get('Authorization', '')
         user_payload = self.verify_token(auth_header)
 
         if not user_payload:
             self.send_error_response(401, "Authentication required")
-            return
+            return None
 
         if not self.supabase:
             self.send_error_response(503, "Database not available")
-            return
+            return None
 
+        # Admins may act on any subscription, everyone else only on their own
+        owner_id = None if user_payload.get('role') == 'admin' else user_payload['user_id']
         try:
-            # Check subscription ownership
-            query = self.supabase.table('subscriptions').select('*').eq('subscription_id', subscription_id)
-            if user_payload.get('role') != 'admin':
-                query = query.eq('user_id', user_payload['user_id'])
-
-            result = query.execute()
-            if not result.data:
-                self.send_error_response(404, "Subscription not found")
-                return
-
-            # Update subscription status
-            update_result = self.supabase.table('subscriptions').update({
-                'status': 'paused',
-                'updated_at': datetime.now(timezone.utc).isoformat()
-            }).eq('subscription_id', subscription_id).execute()
+            with tracing.span('transition', action=action):
+                transition = transition_subscription(self.supabase, subscription_id, action, owner_id)
+        except TransitionRejected as e:
+            headers = {'X-Subscription-Status': e.current_status} if e.current_status else None
+            self.send_error_response(e.status_code, str(e), headers)
+            return None
 
-            if update_result.data:
-                # Log the action
-                self.log_audit_action(user_payload['user_id'], 'pause_subscription', 'subscriptions', subscription_id)
+        self.log_audit_action(user_payload['user_id'], f'{action}_subscription', 'subscriptions', subscription_id,
+                              old_values={'status': transition.previous_status},
+                              new_values={'status': transition.subscription.get('status')})
+        return transition
 
-                response_data = {
+    def handle_subscription_pause(self, subscription_id):
+        """Handle subscription pause"""
+        try:
+            transition = self.apply_subscription_transition(subscription_id, 'pause')
+            if transition:
+                self.send_json_response({
                     "success": True,
                     "message": "Subscription paused successfully",
-                    "subscription": update_result.data[0]
-                }
-                self.send_json_response(response_data)
-            else:
-                self.send_error_response(500, "Failed to pause subscription")
+                    "subscription": transition.subscription
+                })
 
         except Exception as e:
             self.send_error_response(500, f"Failed to pause subscription: {str(e)}")
 
     def handle_subscription_resume(self, subscription_id):
         """Handle subscription resume"""
-        auth_header = self.headers.get('Authorization', '')
-        user_payload = self.verify_token(auth_header)
-
-        if not user_payload:
-            self.send_error_response(401, "Authentication required")
-            return
-
-        if not self.supabase:
-            self.send_error_response(503, "Database not available")
-            return
-
         try:
-            # Check subscription ownership
-            query = self.supabase.table('subscriptions').select('*').eq('subscription_id', subscription_id)
-            if user_payload.get('role') != 'admin':
-                query = query.eq('user_id', user_payload['user_id'])
-
-            result = query.execute()
-            if not result.data:
-                self.send_error_response(404, "Subscription not found")
-                return
-
-            # Update subscription status
-            update_result = self.supabase.table('subscriptions').update({
-                'status': 'active',
-                'updated_at': datetime.now(timezone.utc).isoformat()
-            }).eq('subscription_id', subscription_id).execute()
-
-            if update_result.data:
-                # Log the action
-                self.log_audit_action(user_payload['user_id'], 'resume_subscription', 'subscriptions', subscription_id)
-
-                response_data = {
+            transition = self.apply_subscription_transition(subscription_id, 'resume')
+            if transition:
+                self.send_json_response({
                     "success": True,
                     "message": "Subscription resumed successfully",
-                    "subscription": update_result.data[0]
-                }
-                self.send_json_response(response_data)
-            else:
-                self.send_error_response(500, "Failed to resume subscription")
+                    "subscription": transition.subscription
+                })
 
         except Exception as e:
             self.send_error_response(500, f"Failed to resume subscription: {str(e)}")
 
     def handle_subscription_skip(self, subscription_id):
         """Handle subscription skip next delivery"""
-        auth_header = self.headers.get('Authorization', '')
-        user_payload = self.verify_token(auth_header)
-
-        if not user_payload:
-            self.send_error_response(401, "Authentication required")
-            return
-
-        if not self.supabase:
-            self.send_error_response(503, "Database not available")
-            return
-
         try:
-            # Get subscription details
-            query = self.supabase.table('subscriptions').select('*').eq('subscription_id', subscription_id)
-            if user_payload.get('role') != 'admin':
-                query = query.eq('user_id', user_payload['user_id'])
-
-            result = query.execute()
-            if not result.data:
-                self.send_error_response(404, "Subscription not found")
-                return
-
-            subscription = result.data[0]
-
-            # Calculate next delivery date
-            current_next_date = datetime.fromisoformat(subscription['next_delivery_date'].replace('Z', '+00:00'))
-
-            if subscription['frequency'] == 'weekly':
-                new_next_date = current_next_date + timedelta(weeks=1)
-            elif subscription['frequency'] == 'monthly':
-                new_next_date = current_next_date + timedelta(days=30)
-            elif subscription['frequency'] == 'quarterly':
-                new_next_date = current_next_date + timedelta(days=90)
-            elif subscription['frequency'] == 'yearly':
-                new_next_date = current_next_date + timedelta(days=365)
-            else:
-                new_next_date = current_next_date + timedelta(weeks=1)  # Default to weekly
-
-            # Update next delivery date
-            update_result = self.supabase.table('subscriptions').update({
-                'next_delivery_date': new_next_date.isoformat(),
-                'updated_at': datetime.now(timezone.utc).isoformat()
-            }).eq('subscription_id', subscription_id).execute()
-
-            if update_result.data:
-                # Log the action
-                self.log_audit_action(user_payload['user_id'], 'skip_subscription', 'subscriptions', subscription_id)
-
-                response_data = {
+            transition = self.apply_subscription_transition(subscription_id, 'skip')
+            if transition:
+                self.send_json_response({
                     "success": True,
                     "message": "Next delivery skipped successfully",
-                    "subscription": update_result.data[0],
-                    "new_delivery_date": new_next_date.isoformat()
-                }
-                self.send_json_response(response_data)
-            else:
-                self.send_error_response(500, "Failed to skip delivery")
+                    "subscription": transition.subscription,
+                    "new_delivery_date": transition.subscription.get('next_delivery_date')
+                })
 
         except Exception as e:
             self.send_error_response(500, f"Failed to skip delivery: {str(e)}")
@@ -1150,43 +1191,73 @@ class handler(BaseHTTPRequestHandler):
             return
 
         try:
-            # Get comprehensive merchant metrics
-            users_result = self.supabase.table('users').select('user_id', count='exact').execute()
-            active_subs_result = self.supabase.table('subscriptions').select('subscription_id', count='exact').eq('status', 'active').execute()
-            total_revenue_result = self.supabase.table('payments').select('amount').eq('status', 'successful').execute()
+            dashboard_data, cache_state = self._dashboard_cache.get('merchant_dashboard', self.build_merchant_dashboard)
+            self.send_json_response(dashboard_data, headers={'X-Cache': cache_state.upper()})
 
-            # Calculate metrics
-            total_revenue = sum(float(payment['amount']) for payment in total_revenue_result.data) if total_revenue_result.data else 0
+        except Exception as e:
+            self.send_error_response(500, f"Failed to fetch merchant dashboard: {str(e)}")
 
-            # Get subscription trends (last 6 months)
-            subscription_trends = []
-            for i in range(6):
-                month_start = datetime.now(timezone.utc).replace(day=1) - timedelta(days=30*i)
-                month_end = month_start + timedelta(days=30)
+    def build_merchant_dashboard(self):
+        """Assemble merchant dashboard metrics from concurrent queries"""
+        supabase = self.supabase
+        queries = {
+            # Only the exact count is needed, not the rows
+            'users': lambda: supabase.table('users').select('user_id', count='exact').limit(1).execute(),
+            'active_subscriptions': lambda: supabase.table('subscriptions').select('subscription_id', count='exact').eq('status', 'active').limit(1).execute(),
+            # Revenue is pre-aggregated per month (see analytics_rollups.py)
+            'revenue': lambda: supabase.table('monthly_revenue_rollup').select('revenue').execute(),
+            # Last 6 calendar months, zero-filled, in one grouped query
+            'trends': lambda: supabase.rpc('subscription_monthly_trends', {'p_months': 6}).execute()
+        }
+        futures = {name: self._query_executor.submit(tracing.bind(query)) for name, query in queries.items()}
+        results = {name: future.result() for name, future in futures.items()}
 
-                month_subs = self.supabase.table('subscriptions').select('subscription_id', count='exact').gte('created_at', month_start.isoformat()).lt('created_at', month_end.isoformat()).execute()
+        subscription_trends = [
+            {
+                'month': datetime.strptime(row['month'][:10], '%Y-%m-%d').strftime('%b'),
+                'subscriptions': row['subscriptions']
+            }
+            for row in results['trends'].data or []
+        ]
 
-                subscription_trends.append({
-                    'month': month_start.strftime('%b'),
-                    'subscriptions': month_subs.count or 0
-                })
+        return {
+            "success": True,
+            "metrics": {
+                "total_users": results['users'].count or 0,
+                "active_subscriptions": results['active_subscriptions'].count or 0,
+                "total_revenue": sum(float(row['revenue']) for row in results['revenue'].data or []),
+                "currency": "INR",
+                "subscription_trends": subscription_trends
+            },
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
 
-            dashboard_data = {
+    def handle_merchant_products(self):
+        """Handle merchant product catalog, including inactive products"""
+        auth_header = self.headers.get('Authorization', '')
+        user_payload = self.verify_token(auth_header)
+
+        if not user_payload or user_payload.get('role') != 'admin':
+            self.send_error_response(403, "Merchant access required")
+            return
+
+        if not self.supabase:
+            self.send_error_response(503, "Database not available")
+            return
+
+        def load_products():
+            result = self.supabase.table('products').select('*').order('created_at', desc=True).execute()
+            return {
                 "success": True,
-                "metrics": {
-                    "total_users": users_result.count or 0,
-                    "active_subscriptions": active_subs_result.count or 0,
-                    "total_revenue": total_revenue,
-                    "currency": "INR",
-                    "subscription_trends": list(reversed(subscription_trends))
-                },
-                "timestamp": datetime.now(timezone.utc).isoformat()
+                "products": result.data,
+                "total": len(result.data)
             }
 
-            self.send_json_response(dashboard_data)
+        try:
+            self.send_catalog_response(('merchant_products',), load_products)
 
         except Exception as e:
-            self.send_error_response(500, f"Failed to fetch merchant dashboard: {str(e)}")
+            self.send_error_response(500, f"Failed to fetch merchant products: {str(e)}")
 
     def log_audit_action(self, user_id, action, resource_type, resource_id, old_values=None, new_values=None):
         """Log audit action"""
@@ -1206,7 +1277,8 @@ class handler(BaseHTTPRequestHandler):
                 'created_at': datetime.now(timezone.utc).isoformat()
             }
 
-            self.supabase.table('audit_logs').insert(audit_data).execute()
+            # Queued; a background thread inserts batches into audit_logs
+            self._audit_log.log(audit_data)
         except Exception as e:
             print(f"Failed to log audit action: {e}")
 
@@ -1225,54 +1297,12 @@ class handler(BaseHTTPRequestHandler):
             return
 
         try:
-            # Get subscriptions due for billing
-            today = datetime.now(timezone.utc).date()
-            due_subscriptions = self.supabase.table('subscriptions').select('*').eq('status', 'active').lte('next_delivery_date', today.isoformat()).execute()
-
-            processed_count = 0
-            failed_count = 0
-
-            for subscription in due_subscriptions.data:
-                try:
-                    # Process billing for this subscription
-                    # This would integrate with payment gateway
-
-                    # Calculate next delivery date
-                    current_date = datetime.fromisoformat(subscription['next_delivery_date'])
-
-                    if subscription['frequency'] == 'weekly':
-                        next_date = current_date + timedelta(weeks=1)
-                    elif subscription['frequency'] == 'monthly':
-                        next_date = current_date + timedelta(days=30)
-                    elif subscription['frequency'] == 'quarterly':
-                        next_date = current_date + timedelta(days=90)
-                    elif subscription['frequency'] == 'yearly':
-                        next_date = current_date + timedelta(days=365)
-                    else:
-                        next_date = current_date + timedelta(weeks=1)
-
-                    # Update subscription
-                    self.supabase.table('subscriptions').update({
-                        'next_delivery_date': next_date.isoformat(),
-                        'delivery_count': (subscription.get('delivery_count', 0) + 1),
-                        'last_delivery_date': today.isoformat(),
-                        'updated_at': datetime.now(timezone.utc).isoformat()
-                    }).eq('subscription_id', subscription['subscription_id']).execute()
-
-                    processed_count += 1
-
-                except Exception as e:
-                    print(f"Failed to process subscription {subscription['subscription_id']}: {e}")
-                    failed_count += 1
-
-            response_data = {
-                "success": True,
-                "processed": processed_count,
-                "failed": failed_count,
-                "total": len(due_subscriptions.data)
-            }
+            # Chunked and checkpointed; call again while "complete" is false
+            report = BillingRun(self.supabase).run()
+            report['success'] = report['error'] is None
+            report['total'] = report['processed'] + report['skipped'] + report['failed']
 
-            self.send_json_response(response_data)
+            self.send_json_response(report, 200 if report['success'] else 500)
 
         except Exception as e:
             self.send_error_response(500, f"Failed to process recurring billing: {str(e)}")
@@ -1280,22 +1310,25 @@ class handler(BaseHTTPRequestHandler):
     def handle_sfcc_webhook(self):
         """Handle SFCC webhook events"""
         try:
-            # Get request body
-            content_length = int(self.headers.get('Content-Length', 0))
-            webhook_data = self.rfile.read(content_length).decode('utf-8') if content_length > 0 else '{}'
+            # Raw bytes are read once and shared by the signature check and the parser
+            try:
+                webhook_data = self.request_body.raw()
+            except RequestBodyError as e:
+                self.send_body_error(e)
+                return
+
+            if SFCC_WEBHOOK_SECRET and not self.verify_sfcc_signature(webhook_data, self.headers.get('X-SFCC-Signature')):
+                self.send_error_response(401, "Invalid webhook signature")
+                return
 
             try:
-                data = json.loads(webhook_data)
-            except json.JSONDecodeError:
+                data = self.request_body.json()
+            except RequestBodyError:
+                data = None
+            if not isinstance(data, dict):
                 self.send_error_response(400, "Invalid JSON in webhook data")
                 return
 
-            # Verify webhook signature (implement based on SFCC webhook security)
-            # signature = self.headers.get('X-SFCC-Signature')
-            # if not self.verify_sfcc_signature(webhook_data, signature):
-            #     self.send_error_response(401, "Invalid webhook signature")
-            #     return
-
             event_type = data.get('event_type')
 
             if event_type == 'order.created':
@@ -1318,6 +1351,15 @@ class handler(BaseHTTPRequestHandler):
         except Exception as e:
             self.send_error_response(500, f"Failed to process SFCC webhook: {str(e)}")
 
+    def verify_sfcc_signature(self, body, signature):
+        """Check a hex HMAC-SHA256 of the raw body against SFCC_WEBHOOK_SECRET"""
+        if not signature:
+            return False
+        if signature.startswith('sha256='):
+            signature = signature[7:]
+        expected = hmac.new(SFCC_WEBHOOK_SECRET.encode('utf-8'), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature.strip().lower())
+
     def process_sfcc_order_webhook(self, data):
         """Process SFCC order webhook"""
         try:
@@ -1385,6 +1427,7 @@ class handler(BaseHTTPRequestHandler):
                 update_data = {k: v for k, v in update_data.items() if v is not None}
 
                 self.supabase.table('products').update(update_data).eq('salesforce_product_id', product_id).execute()
+                self._catalog_cache.bump()
                 print(f"Updated product {product_id} from SFCC webhook")
 
         except Exception as e:
@@ -1446,14 +1489,11 @@ class handler(BaseHTTPRequestHandler):
             return
 
         try:
-            # Get request body
-            content_length = int(self.headers.get('Content-Length', 0))
-            order_data = self.rfile.read(content_length).decode('utf-8') if content_length > 0 else '{}'
-
+            # The order payload is not used yet; an oversized or malformed body is still rejected
             try:
-                data = json.loads(order_data)
-            except json.JSONDecodeError:
-                self.send_error_response(400, "Invalid JSON in request body")
+                self.request_body.json()
+            except RequestBodyError as e:
+                self.send_body_error(e)
                 return
 
             # This would create an order in SFCC for a subscription
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Request metrics for the SubscriptionPro API
+BaseHTTPRequestHandler side of the shared request_metrics core: the handler
+calls begin()/end() around dispatch with the matched route pattern, and
+send_metrics() writes the snapshot as JSON or Prometheus text.
+"""
+
+# Core types are re-exported so the handler only imports this module
+from request_metrics import (
+    UNMATCHED_ROUTE, Histogram, RequestMetrics, RollingHistogram, bucket_bounds, bucket_index, process_stats
+)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def send_metrics(handler, registry: RequestMetrics, fmt=None):
+    """Write the registry's snapshot as JSON, or Prometheus text when fmt is 'prometheus'"""
+    if fmt != 'prometheus':
+        handler.send_json_response(registry.snapshot())
+        return
+    body = registry.prometheus().encode('utf-8')
+    handler.send_response(200)
+    handler.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+    handler.send_header('Content-Length', str(len(body)))
+    handler.add_cors_headers()
+    handler.end_headers()
+    handler.wfile.write(body)
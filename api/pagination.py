@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Keyset pagination for the SubscriptionPro API
+PostgREST side of the shared keyset core: list endpoints page newest first
+over (created_at, <primary key>) with keyset_page(), which turns the cursor
+into a PostgREST `or` filter.
+"""
+
+# Cursor and page-size helpers are re-exported so the handler only imports this module
+from keyset import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, decode_cursor, encode_cursor, page_size, query_value, split_page
+)
+
+
+def _quote(value) -> str:
+    """Quote a value for a PostgREST logic-tree filter"""
+    text = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{text}"'
+
+
+def keyset_filter(sort_column, id_column, after_key, after_id, descending=True) -> str:
+    """PostgREST `or` filter for rows strictly after (after_key, after_id)"""
+    op = 'lt' if descending else 'gt'
+    key, ident = _quote(after_key), _quote(after_id)
+    return f'{sort_column}.{op}.{key},and({sort_column}.eq.{key},{id_column}.{op}.{ident})'
+
+
+def keyset_page(query, query_params, id_column, sort_column='created_at', descending=True):
+    """Fetch one page of a PostgREST query ordered by (sort_column, id_column)
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    Raises InvalidCursor for a cursor that cannot be decoded.
+    """
+    limit = page_size(query_params)
+    cursor = query_value(query_params, 'cursor')
+    if cursor:
+        after_key, after_id = decode_cursor(cursor, size=2)
+        query = query.or_(keyset_filter(sort_column, id_column, after_key, after_id, descending))
+
+    # One extra row tells us whether another page exists
+    query = query.order(sort_column, desc=descending).order(id_column, desc=descending).limit(limit + 1)
+    rows = query.execute().data or []
+    return split_page(rows, limit, lambda row: (row[sort_column], row[id_column]))
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Rate limiting for the SubscriptionPro API
+GCRA (generic cell rate algorithm) limiter: each key stores a single
+"theoretical arrival time", so a check is O(1) regardless of the window size.
+State lives in a bounded in-process store or in Redis when several instances
+must enforce one shared limit.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, NamedTuple
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+
+# Requests allowed per window, by endpoint type
+DEFAULT_LIMITS = {
+    'auth': {'requests': 10, 'window': 60},  # 10 requests per minute for auth
+    'general': {'requests': 60, 'window': 60},  # 60 requests per minute for general
+    'admin': {'requests': 100, 'window': 60}  # 100 requests per minute for admin
+}
+
+
+# Role scope: budgets shared by every caller with a role, checked in addition
+# to that caller's own bucket. Sized for the role's whole population rather
+# than one client; roles not listed here have no shared budget.
+ROLE_RATE_LIMITS = {
+    'customer': {
+        'auth': {'requests': 600, 'window': 60},
+        'general': {'requests': 6000, 'window': 60}
+    },
+    'admin': {
+        'auth': {'requests': 100, 'window': 60},
+        'admin': {'requests': 1000, 'window': 60}
+    }
+}
+
+
+class Decision(NamedTuple):
+    allowed: bool
+    remaining: int
+    retry_after: float
+
+
+class MemoryStore:
+    """In-process GCRA state with LRU eviction and a fixed key budget"""
+
+    def __init__(self, max_keys=100000, sweep_batch=8):
+        self.max_keys = max_keys
+        self.sweep_batch = sweep_batch
+        self._tats = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def gcra(self, key, interval, tolerance, now=None):
+        """Apply one request to key; returns (allowed, new_tat_offset, retry_after)"""
+        with self._lock:
+            now = time.monotonic() if now is None else now
+            tat = self._tats.get(key, now)
+            if tat < now:
+                tat = now
+
+            new_tat = tat + interval
+            if new_tat - now > tolerance + interval:
+                self._tats.move_to_end(key)
+                return False, tat - now, tat - now - tolerance
+
+            self._tats[key] = new_tat
+            self._tats.move_to_end(key)
+            self._evict(now)
+            return True, new_tat - now, 0.0
+
+    def _evict(self, now):
+        # A key whose TAT has passed is indistinguishable from a fresh key, so
+        # idle entries at the LRU end can be dropped without changing behaviour
+        for _ in range(self.sweep_batch):
+            if not self._tats:
+                break
+            oldest_tat = next(iter(self._tats.values()))
+            if oldest_tat > now and len(self._tats) <= self.max_keys:
+                break
+            self._tats.popitem(last=False)
+            self.evictions += 1
+
+        while len(self._tats) > self.max_keys:
+            self._tats.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self._tats)
+
+
+class RedisStore:
+    """GCRA state in Redis, shared by every API instance"""
+
+    # Uses the Redis server clock so instances with skewed clocks agree
+    SCRIPT = """
+    local interval = tonumber(ARGV[1])
+    local tolerance = tonumber(ARGV[2])
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+    if tat < now then tat = now end
+    local new_tat = tat + interval
+    if new_tat - now > tolerance + interval then
+        return {0, tostring(tat - now), tostring(tat - now - tolerance)}
+    end
+    redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+    return {1, tostring(new_tat - now), '0'}
+    """
+
+    def __init__(self, client, prefix='ratelimit:'):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(self.SCRIPT)
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("redis package is not installed")
+        return cls(redis.Redis.from_url(url, socket_timeout=0.5), **kwargs)
+
+    def gcra(self, key, interval, tolerance, now=None):
+        allowed, offset, retry_after = self._script(keys=[self.prefix + key], args=[interval, tolerance])
+        return bool(int(allowed)), float(offset), float(retry_after)
+
+
+class RateLimiter:
+    """Per-endpoint-type limits keyed by client IP or user, optionally also per role
+
+    With the 'role' scope each request is charged to the caller's own bucket
+    (user, or IP when anonymous) and, for authenticated callers, to a bucket
+    shared by their role that uses the larger ROLE_RATE_LIMITS budgets.
+    """
+
+    SCOPES = ('ip', 'user', 'role')
+
+    def __init__(self, store=None, limits=None, scope='ip', fallback_store=None, role_limits=None):
+        if scope not in self.SCOPES:
+            raise ValueError(f"Unknown rate limit scope: {scope}")
+        self.store = store if store is not None else MemoryStore()
+        self.fallback_store = fallback_store
+        self.limits = limits or DEFAULT_LIMITS
+        self.role_limits = ROLE_RATE_LIMITS if role_limits is None else role_limits
+        self.scope = scope
+        self.store_errors = 0
+
+    @property
+    def needs_identity(self):
+        """Whether keys depend on the authenticated user"""
+        return self.scope != 'ip'
+
+    def key_for(self, endpoint_type, client_ip, user_payload=None):
+        """Build the caller's own bucket key for a request"""
+        if user_payload and self.scope in ('user', 'role') and user_payload.get('user_id'):
+            return f"user:{user_payload['user_id']}:{endpoint_type}"
+        return f"ip:{client_ip}:{endpoint_type}"
+
+    def role_key_for(self, endpoint_type, user_payload=None):
+        """Shared role bucket key and its limits, or (None, None) when the role has no budget"""
+        if self.scope != 'role' or not user_payload:
+            return None, None
+        role = user_payload.get('role', 'customer')
+        role_limits = self.role_limits.get(role, {})
+        endpoint_type = self._limit_type(endpoint_type, user_payload)
+        limit_config = role_limits.get(endpoint_type, role_limits.get('general'))
+        if limit_config is None:
+            return None, None
+        return f"role:{role}:{endpoint_type}", limit_config
+
+    @staticmethod
+    def _limit_type(endpoint_type, user_payload):
+        if endpoint_type == 'general' and user_payload and user_payload.get('role') == 'admin':
+            return 'admin'
+        return endpoint_type
+
+    def limit_for(self, endpoint_type, user_payload=None):
+        """Admins get the admin limits on general endpoints"""
+        return self.limits.get(self._limit_type(endpoint_type, user_payload), self.limits['general'])
+
+    def _consume(self, key, limit_config, now) -> Decision:
+        interval = limit_config['window'] / limit_config['requests']
+        tolerance = limit_config['window'] - interval
+        try:
+            allowed, offset, retry_after = self.store.gcra(key, interval, tolerance, now)
+        except Exception as e:
+            self.store_errors += 1
+            if self.fallback_store is None:
+                print(f"Rate limit store error, allowing request: {e}")
+                return Decision(True, limit_config['requests'], 0.0)
+            allowed, offset, retry_after = self.fallback_store.gcra(key, interval, tolerance, now)
+
+        remaining = max(0, math.floor((tolerance - offset) / interval + 1e-9) + 1) if allowed else 0
+        return Decision(allowed, remaining, max(0.0, retry_after))
+
+    def check(self, endpoint_type, client_ip, user_payload=None, now=None) -> Decision:
+        """Consume one request from the caller's bucket (and its role's, with the role scope)"""
+        decision = self._consume(self.key_for(endpoint_type, client_ip, user_payload),
+                                 self.limit_for(endpoint_type, user_payload), now)
+        if not decision.allowed:
+            return decision
+
+        role_key, role_config = self.role_key_for(endpoint_type, user_payload)
+        if role_key is None:
+            return decision
+        shared = self._consume(role_key, role_config, now)
+        if not shared.allowed:
+            return shared
+        return Decision(True, min(decision.remaining, shared.remaining), 0.0)
+
+    def stats(self) -> Dict:
+        stats = {'scope': self.scope, 'store': type(self.store).__name__, 'store_errors': self.store_errors}
+        if isinstance(self.store, MemoryStore):
+            stats.update({'keys': len(self.store), 'max_keys': self.store.max_keys, 'evictions': self.store.evictions})
+        return stats
+
+
+def create_rate_limiter() -> RateLimiter:
+    """Build the limiter from environment configuration"""
+    scope = os.environ.get('RATE_LIMIT_SCOPE', 'ip')
+    memory_store = MemoryStore(max_keys=int(os.environ.get('RATE_LIMIT_MAX_KEYS', 100000)))
+
+    redis_url = os.environ.get('RATE_LIMIT_REDIS_URL') or os.environ.get('REDIS_URL')
+    if redis_url and not REDIS_AVAILABLE:
+        print("Rate limit Redis URL is set but the redis package is not installed; "
+              "limits are per process, not shared across instances")
+    if redis_url and REDIS_AVAILABLE:
+        try:
+            return RateLimiter(RedisStore.from_url(redis_url), scope=scope, fallback_store=memory_store)
+        except Exception as e:
+            print(f"Redis rate limit store unavailable, using in-process store: {e}")
+
+    return RateLimiter(memory_store, scope=scope)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Request body reader for the SubscriptionPro API
+Each request gets one RequestBody bound to its route's size limit. A declared
+Content-Length above the limit is rejected before any of the body is read;
+chunked bodies are counted as they arrive and rejected as soon as they pass
+the limit. The body is read once, in fixed-size blocks, into a single buffer
+that serves both raw() (for signature checks) and json().
+"""
+
+import json
+import os
+from typing import Optional
+
+try:
+    import orjson
+    _loads = orjson.loads
+    _DecodeError = orjson.JSONDecodeError
+except ImportError:
+    _loads = json.loads
+    _DecodeError = json.JSONDecodeError
+
+# Default upper bound for request bodies, in bytes
+MAX_BODY_SIZE = int(os.environ.get('MAX_BODY_SIZE', 1024 * 1024))
+# Bytes requested from the socket per read
+READ_BLOCK = 64 * 1024
+
+
+class RequestBodyError(Exception):
+    """Body cannot be accepted; carries the HTTP status to answer with"""
+
+    status_code = 400
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        if status_code is not None:
+            self.status_code = status_code
+
+
+class BodyTooLarge(RequestBodyError):
+    status_code = 413
+
+
+class RequestBody:
+    """Lazily read, size-limited body of one request"""
+
+    def __init__(self, rfile, headers, max_size: Optional[int] = None):
+        self.rfile = rfile
+        self.max_size = MAX_BODY_SIZE if max_size is None else max_size
+        self.chunked = 'chunked' in headers.get('Transfer-Encoding', '').lower()
+        self._raw = None
+        self._json = None
+        self._parsed = False
+
+        if self.chunked:
+            self.length = None
+            return
+
+        try:
+            self.length = int(headers.get('Content-Length') or 0)
+        except ValueError:
+            raise RequestBodyError("Invalid Content-Length")
+        if self.length < 0:
+            raise RequestBodyError("Invalid Content-Length")
+        if self.length > self.max_size:
+            raise BodyTooLarge(f"Request body exceeds {self.max_size} bytes")
+
+    def raw(self) -> bytearray:
+        """The complete body; read from the socket on first call only"""
+        if self._raw is None:
+            self._raw = self._read_chunked() if self.chunked else self._read_exact(self.length)
+        return self._raw
+
+    @property
+    def complete(self) -> bool:
+        """True once the whole body has been read off the connection"""
+        return self._raw is not None
+
+    def json(self, default=None):
+        """Parsed JSON body; `default` (an empty dict unless given) when the body is empty"""
+        if not self._parsed:
+            raw = self.raw()
+            # Parsed straight from the read buffer, without a decoded str copy
+            if not raw or raw.isspace():
+                self._json = {} if default is None else default
+            else:
+                try:
+                    self._json = _loads(raw)
+                except (_DecodeError, UnicodeDecodeError):
+                    raise RequestBodyError("Invalid JSON in request body")
+            self._parsed = True
+        return self._json
+
+    def _read_exact(self, length) -> bytearray:
+        buffer = bytearray(length)
+        view = memoryview(buffer)
+        received = 0
+        while received < length:
+            n = self.rfile.readinto(view[received:received + READ_BLOCK])
+            if not n:
+                raise RequestBodyError("Request body ended before Content-Length bytes were received")
+            received += n
+        view.release()
+        return buffer
+
+    def _read_chunked(self) -> bytearray:
+        buffer = bytearray()
+        while True:
+            size_line = self.rfile.readline(1024)
+            try:
+                size = int(size_line.split(b';', 1)[0].strip(), 16)
+            except ValueError:
+                raise RequestBodyError("Invalid chunked request body")
+            if size == 0:
+                # Skip trailers up to the terminating blank line
+                while self.rfile.readline(1024) not in (b'\r\n', b'\n', b''):
+                    pass
+                return buffer
+            if len(buffer) + size > self.max_size:
+                raise BodyTooLarge(f"Request body exceeds {self.max_size} bytes")
+            buffer += self._read_exact(size)
+            self.rfile.readline(1024)  # CRLF after the chunk data
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Request routing for the SubscriptionPro API
+Routes are declared once as (method, pattern, handler name) and compiled into
+a path-segment trie, so dispatch cost depends on path depth rather than on the
+number of registered endpoints.
+"""
+
+from typing import Dict, List, NamedTuple, Optional
+
+
+class Route(NamedTuple):
+    method: str
+    pattern: str
+    name: str
+    options: Dict
+
+
+class RouteMatch(NamedTuple):
+    route: Route
+    params: Dict[str, str]
+
+
+class MethodNotAllowed(Exception):
+    """Path exists but not for the requested method"""
+
+    def __init__(self, allowed: List[str]):
+        super().__init__(f"Allowed methods: {', '.join(allowed)}")
+        self.allowed = allowed
+
+
+class _Node:
+    __slots__ = ('static', 'param', 'param_name', 'routes')
+
+    def __init__(self):
+        self.static = {}
+        self.param = None
+        self.param_name = None
+        self.routes = {}
+
+
+class Router:
+    """Segment trie router with `{name}` path parameters"""
+
+    def __init__(self, routes=None):
+        self._root = _Node()
+        for method, pattern, name, *options in routes or []:
+            self.add(method, pattern, name, **(options[0] if options else {}))
+
+    @staticmethod
+    def _segments(path):
+        return [segment for segment in path.split('/') if segment]
+
+    def add(self, method, pattern, name, **options):
+        """Register handler method `name` for method + pattern"""
+        node = self._root
+        for segment in self._segments(pattern):
+            if segment.startswith('{') and segment.endswith('}'):
+                param_name = segment[1:-1]
+                if node.param is None:
+                    node.param = _Node()
+                    node.param_name = param_name
+                elif node.param_name != param_name:
+                    raise ValueError(f"Conflicting parameter names at {pattern}: {node.param_name} / {param_name}")
+                node = node.param
+            else:
+                node = node.static.setdefault(segment, _Node())
+
+        method = method.upper()
+        if method in node.routes:
+            raise ValueError(f"Duplicate route: {method} {pattern}")
+
+        route = Route(method, pattern, name, options)
+        node.routes[method] = route
+        return route
+
+    def _find(self, node, segments, index, params):
+        if index == len(segments):
+            return node if node.routes else None
+
+        segment = segments[index]
+        child = node.static.get(segment)
+        if child is not None:
+            found = self._find(child, segments, index + 1, params)
+            if found is not None:
+                return found
+
+        if node.param is not None:
+            params[node.param_name] = segment
+            found = self._find(node.param, segments, index + 1, params)
+            if found is not None:
+                return found
+            del params[node.param_name]
+
+        return None
+
+    def match(self, method, path) -> Optional[RouteMatch]:
+        """Resolve a request; None if no route, MethodNotAllowed on method mismatch"""
+        params = {}
+        node = self._find(self._root, self._segments(path), 0, params)
+        if node is None:
+            return None
+
+        route = node.routes.get(method.upper())
+        if route is None:
+            raise MethodNotAllowed(sorted(node.routes))
+        return RouteMatch(route, params)
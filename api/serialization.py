@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+JSON serialization for the SubscriptionPro API
+Uses orjson when it is installed and the stdlib encoder otherwise. Rows of a
+known shape get a compiled encoder that converts only the columns that need
+it, and documents holding large arrays can be produced incrementally so rows
+are streamed instead of being materialized as one string.
+"""
+
+import json
+import os
+import threading
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from uuid import UUID
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Lists with at least this many items are streamed rather than buffered
+STREAM_THRESHOLD = int(os.environ.get('JSON_STREAM_THRESHOLD', 1000))
+# Target size of each streamed chunk in bytes
+CHUNK_SIZE = int(os.environ.get('JSON_CHUNK_SIZE', 64 * 1024))
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+# Conversions for values neither encoder handles natively, by exact type
+CONVERTERS = {
+    datetime: _isoformat,
+    date: _isoformat,
+    dt_time: _isoformat,
+    UUID: str,
+    Decimal: str,  # keep exact amounts; matches the previous default=str output
+    bytes: lambda value: value.decode('utf-8', 'replace'),
+    set: list,
+    frozenset: list,
+}
+
+# orjson serializes these itself and faster than any Python-level conversion
+_ORJSON_NATIVE = (datetime, date, dt_time, UUID)
+
+
+def _default(value):
+    converter = CONVERTERS.get(type(value))
+    if converter is None:
+        for base, candidate in CONVERTERS.items():
+            if isinstance(value, base):
+                converter = candidate
+                break
+        else:
+            return str(value)
+    return converter(value)
+
+
+if ORJSON_AVAILABLE:
+    def dumps(data) -> bytes:
+        """Encode data as UTF-8 JSON bytes"""
+        return orjson.dumps(data, default=_default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    _encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(',', ':'))
+
+    def dumps(data) -> bytes:
+        """Encode data as UTF-8 JSON bytes"""
+        return _encoder.encode(data).encode('utf-8')
+
+
+class RowEncoder:
+    """Encoder compiled for one row shape (column names and value types)"""
+
+    __slots__ = ('columns', 'conversions')
+
+    def __init__(self, row):
+        self.columns = tuple(row)
+        # Only columns whose type the active encoder cannot handle natively
+        self.conversions = tuple(
+            (column, CONVERTERS[type(value)])
+            for column, value in row.items()
+            if type(value) in CONVERTERS and not (ORJSON_AVAILABLE and isinstance(value, _ORJSON_NATIVE))
+        )
+
+    def prepare(self, row):
+        """Return row with converted values; the input dict is not modified"""
+        if not self.conversions:
+            return row
+        row = dict(row)
+        for column, convert in self.conversions:
+            value = row[column]
+            if value is not None:
+                row[column] = convert(value)
+        return row
+
+    def encode(self, row) -> bytes:
+        return dumps(self.prepare(row))
+
+
+_row_encoders = {}
+_row_encoders_lock = threading.Lock()
+_MAX_ROW_ENCODERS = 256
+
+
+def _shape(row):
+    return tuple((column, type(value)) for column, value in row.items())
+
+
+def row_encoder(row, shape=None) -> RowEncoder:
+    """Compiled encoder for the shape of row, cached per process"""
+    shape = _shape(row) if shape is None else shape
+    encoder = _row_encoders.get(shape)
+    if encoder is None:
+        encoder = RowEncoder(row)
+        with _row_encoders_lock:
+            if len(_row_encoders) >= _MAX_ROW_ENCODERS:
+                _row_encoders.clear()
+            _row_encoders[shape] = encoder
+    return encoder
+
+
+def encode_rows(rows):
+    """Yield each row of a list as JSON bytes, reusing compiled encoders"""
+    encoder = None
+    current_shape = None
+    for row in rows:
+        if not isinstance(row, dict):
+            yield dumps(row)
+            continue
+        # Rows from one query nearly always share a shape
+        shape = _shape(row)
+        if shape != current_shape:
+            encoder = row_encoder(row, shape)
+            current_shape = shape
+        yield encoder.encode(row)
+
+
+def should_stream(data, threshold=None) -> bool:
+    """Whether data holds an array large enough to be streamed"""
+    threshold = STREAM_THRESHOLD if threshold is None else threshold
+    if isinstance(data, list):
+        return len(data) >= threshold
+    if isinstance(data, dict):
+        return any(isinstance(value, list) and len(value) >= threshold for value in data.values())
+    return False
+
+
+def _iter_array(rows):
+    yield b'['
+    first = True
+    for encoded in encode_rows(rows):
+        yield encoded if first else b',' + encoded
+        first = False
+    yield b']'
+
+
+def _iter_document(data, threshold):
+    if isinstance(data, list):
+        yield from _iter_array(data)
+        return
+
+    yield b'{'
+    for index, (key, value) in enumerate(data.items()):
+        prefix = dumps(str(key)) + b':'
+        yield prefix if index == 0 else b',' + prefix
+        if isinstance(value, list) and len(value) >= threshold:
+            yield from _iter_array(value)
+        else:
+            yield dumps(value)
+    yield b'}'
+
+
+def iter_json(data, chunk_size=None, threshold=None):
+    """Encode data incrementally, yielding chunks of roughly chunk_size bytes"""
+    chunk_size = CHUNK_SIZE if chunk_size is None else chunk_size
+    threshold = STREAM_THRESHOLD if threshold is None else threshold
+
+    buffer = bytearray()
+    for piece in _iter_document(data, threshold):
+        buffer += piece
+        if len(buffer) >= chunk_size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Self-hosted server for the SubscriptionPro API
+Runs the Vercel `handler` from index.py behind a bounded thread pool or a set
+of pre-forked worker processes sharing one port via SO_REUSEPORT
+
+Usage:
+    python server.py --mode thread --threads 32
+    python server.py --mode prefork --workers 4 --threads 16
+"""
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer
+
+from index import handler
+from supabase_pool import registry as supabase_registry
+
+# Unread request bodies up to this size are discarded so the connection can
+# be reused; anything larger closes the connection instead
+BODY_DRAIN_LIMIT = 64 * 1024
+
+
+class _BodyReader:
+    """Wraps rfile for one request and counts how much of the body was read"""
+
+    def __init__(self, raw, length):
+        self.raw = raw
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.raw.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def readinto(self, buffer):
+        view = memoryview(buffer)
+        if self.remaining <= 0:
+            return 0
+        if len(view) > self.remaining:
+            view = view[:self.remaining]
+        n = self.raw.readinto(view)
+        self.remaining -= n or 0
+        return n
+
+    def readline(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        line = self.raw.readline(size)
+        self.remaining -= len(line)
+        return line
+
+    def drain(self, limit):
+        """Discard the unread part of the body; False if it is too large"""
+        if self.remaining > limit:
+            return False
+        while self.remaining > 0:
+            if not self.read(min(self.remaining, 8192)):
+                return False
+        return True
+
+
+class KeepAliveHandler(handler):
+    """HTTP/1.1 variant of the API handler with persistent connections"""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out as separate writes; with Nagle on, every reused
+    # connection waits for the client's delayed ACK (~40ms) before the body
+    disable_nagle_algorithm = True
+    # Idle keep-alive connections are closed after this many seconds
+    timeout = float(os.environ.get('KEEPALIVE_TIMEOUT', 5))
+
+    def parse_request(self):
+        if not super().parse_request():
+            return False
+
+        if self.headers.get('Transfer-Encoding'):
+            # Chunked request bodies are not framed by Content-Length
+            self.close_connection = True
+        else:
+            # Same check as RequestBody; a bad length leaves the stream unframed
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                self.close_connection = True
+                self.send_error(400, "Invalid Content-Length")
+                return False
+            if length > 0:
+                self.rfile = _BodyReader(self.rfile, length)
+        return True
+
+    def handle_one_request(self):
+        super().handle_one_request()
+
+        body = self.rfile
+        if isinstance(body, _BodyReader):
+            self.rfile = body.raw
+            if not self.close_connection and not body.drain(BODY_DRAIN_LIMIT):
+                self.close_connection = True
+
+        if self.server.draining.is_set():
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        if self.server.access_log:
+            super().log_message(format, *args)
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that hands each connection to a bounded worker pool"""
+
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, threads=16, reuse_port=False, access_log=False):
+        self.reuse_port = reuse_port
+        self.access_log = access_log
+        self.draining = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='api-worker')
+        self._active = 0
+        self._active_lock = threading.Condition()
+        super().__init__(server_address, handler_class)
+
+    def server_bind(self):
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+    def process_request(self, request, client_address):
+        with self._active_lock:
+            self._active += 1
+        self._executor.submit(self._process_request_worker, request, client_address)
+
+    def _process_request_worker(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            with self._active_lock:
+                self._active -= 1
+                self._active_lock.notify_all()
+
+    def begin_drain(self):
+        """Stop accepting connections; safe to call from a signal handler"""
+        if not self.draining.is_set():
+            self.draining.set()
+            threading.Thread(target=self.shutdown, daemon=True).start()
+
+    def wait_drained(self, timeout):
+        """Wait for in-flight connections to finish; False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._active_lock:
+            while self._active > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._active_lock.wait(remaining)
+        return True
+
+
+def serve(host, port, threads, reuse_port=False, drain_timeout=30.0, access_log=False):
+    """Run one server process until SIGTERM/SIGINT, then drain gracefully"""
+    server = PooledHTTPServer((host, port), KeepAliveHandler, threads=threads,
+                              reuse_port=reuse_port, access_log=access_log)
+
+    def _on_signal(signum, frame):
+        server.begin_drain()
+
+    signal.signal(signal.SIGTERM, _on_signal)
+    signal.signal(signal.SIGINT, _on_signal)
+
+    print(f"[{os.getpid()}] Serving on {host}:{port} with {threads} threads")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        drained = server.wait_drained(drain_timeout)
+        # Write out queued audit records before the connections go away
+        handler._audit_log.close()
+        supabase_registry.close()
+        print(f"[{os.getpid()}] {'Drained' if drained else 'Drain timed out'}, exiting")
+
+    if not drained:
+        # Worker threads are still blocked on client sockets
+        os._exit(1)
+
+
+def serve_prefork(host, port, workers, threads, drain_timeout=30.0, access_log=False):
+    """Fork worker processes that each bind the port with SO_REUSEPORT"""
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        raise RuntimeError("SO_REUSEPORT is not supported on this platform")
+
+    children = {}
+    stopping = threading.Event()
+
+    def _spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            # Never share the parent's HTTP connections with a child
+            supabase_registry.reset()
+            if os.environ.get('SUPABASE_WARMUP', 'false').lower() == 'true':
+                supabase_registry.warm_up()
+            try:
+                serve(host, port, threads, reuse_port=True,
+                      drain_timeout=drain_timeout, access_log=access_log)
+            finally:
+                os._exit(0)
+        children[pid] = time.monotonic()
+
+    def _on_signal(signum, frame):
+        stopping.set()
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _on_signal)
+    signal.signal(signal.SIGINT, _on_signal)
+
+    for _ in range(workers):
+        _spawn()
+    print(f"[{os.getpid()}] Started {workers} workers on {host}:{port}")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+
+        started = children.pop(pid, None)
+        if started is None or stopping.is_set():
+            continue
+
+        print(f"[{os.getpid()}] Worker {pid} exited with status {status}, restarting")
+        if time.monotonic() - started < 1:
+            # Avoid a tight crash loop
+            time.sleep(1)
+        _spawn()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SubscriptionPro API server")
+    parser.add_argument('--host', default=os.environ.get('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 3000)))
+    parser.add_argument('--mode', choices=['thread', 'prefork'], default=os.environ.get('API_SERVER_MODE', 'thread'))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('API_WORKERS', os.cpu_count() or 1)),
+                        help="worker processes in prefork mode")
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('API_THREADS', 16)),
+                        help="request threads per process")
+    parser.add_argument('--drain-timeout', type=float, default=float(os.environ.get('DRAIN_TIMEOUT', 30)))
+    parser.add_argument('--access-log', action='store_true')
+    args = parser.parse_args(argv)
+
+    if args.mode == 'prefork':
+        serve_prefork(args.host, args.port, args.workers, args.threads,
+                      drain_timeout=args.drain_timeout, access_log=args.access_log)
+    else:
+        serve(args.host, args.port, args.threads,
+              drain_timeout=args.drain_timeout, access_log=args.access_log)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Snapshot cache for expensive read-only API responses
+Each key holds one assembled value. Within `ttl` it is served as-is; after
+that and until `ttl + stale_ttl` it is still served while a single background
+refresh runs. Concurrent misses for the same key are coalesced so only one
+caller runs the loader and the others wait for its result.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+FRESH = 'fresh'
+STALE = 'stale'
+MISS = 'miss'
+
+
+class _Entry:
+    __slots__ = ('value', 'created', 'refreshing')
+
+    def __init__(self, value, created):
+        self.value = value
+        self.created = created
+        self.refreshing = False
+
+
+class _Flight:
+    """One in-progress load that other callers can wait on"""
+
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SnapshotCache:
+    """TTL cache with stale-while-revalidate and single-flight loading"""
+
+    def __init__(self, ttl=30.0, stale_ttl=300.0):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refresh_errors = 0
+
+    def get(self, key, loader: Callable, now=None) -> Tuple[object, str]:
+        """Return (value, state) for key, loading it with loader() if needed"""
+        now = time.monotonic() if now is None else now
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                age = now - entry.created
+                if age < self.ttl:
+                    self.hits += 1
+                    return entry.value, FRESH
+                if age < self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    if not entry.refreshing:
+                        entry.refreshing = True
+                        threading.Thread(target=self._refresh, args=(key, loader, entry),
+                                         name=f'snapshot-refresh-{key}', daemon=True).start()
+                    return entry.value, STALE
+
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                leader = True
+                self.misses += 1
+            else:
+                leader = False
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, MISS
+
+        try:
+            flight.value = loader()
+            with self._lock:
+                self._entries[key] = _Entry(flight.value, time.monotonic())
+            return flight.value, MISS
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def _refresh(self, key, loader, entry):
+        try:
+            value = loader()
+        except Exception as e:
+            # Keep serving the stale value; the next stale hit retries
+            self.refresh_errors += 1
+            print(f"Snapshot refresh failed for {key}: {e}")
+            entry.refreshing = False
+            return
+
+        with self._lock:
+            self._entries[key] = _Entry(value, time.monotonic())
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when key is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict:
+        return {
+            'keys': len(self._entries),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'refresh_errors': self.refresh_errors
+        }
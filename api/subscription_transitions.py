@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Subscription state transitions for the SubscriptionPro API
+Pause, resume, skip and cancel are applied by the transition_subscription
+database function (see supabase-setup.sql) in one round trip: the function
+checks the current status, computes the new next_delivery_date and updates
+the row in a single conditional statement. A transition that cannot be
+applied comes back as a typed rejection instead of a silent overwrite.
+"""
+
+from typing import Dict, NamedTuple, Optional
+
+# action -> (statuses it may start from, status it leaves behind; None keeps it)
+TRANSITIONS = {
+    'pause': (('active',), 'paused'),
+    'resume': (('paused',), 'active'),
+    'skip': (('active', 'paused'), None),
+    'cancel': (('active', 'paused'), 'canceled'),
+}
+
+
+class TransitionRejected(Exception):
+    """Transition was not applied; carries the HTTP status to answer with"""
+
+    status_code = 409
+
+    def __init__(self, message, current_status=None):
+        super().__init__(message)
+        self.current_status = current_status
+
+
+class SubscriptionNotFound(TransitionRejected):
+    status_code = 404
+
+
+class InvalidTransition(TransitionRejected):
+    status_code = 409
+
+
+class Transition(NamedTuple):
+    previous_status: str
+    subscription: Dict
+
+
+def transition_subscription(supabase, subscription_id, action, user_id: Optional[str] = None) -> Transition:
+    """Apply action to a subscription (restricted to user_id's unless None)"""
+    if action not in TRANSITIONS:
+        raise ValueError(f"Unknown subscription action: {action}")
+
+    result = supabase.rpc('transition_subscription', {
+        'p_subscription_id': subscription_id,
+        'p_action': action,
+        'p_user_id': user_id
+    }).execute()
+    row = (result.data or [None])[0]
+    if not row:
+        raise RuntimeError("transition_subscription returned no result")
+
+    if row['outcome'] == 'applied':
+        return Transition(row['previous_status'], row['subscription'])
+    if row['outcome'] == 'not_found':
+        raise SubscriptionNotFound("Subscription not found")
+    allowed = ' or '.join(TRANSITIONS[action][0])
+    raise InvalidTransition(
+        f"Cannot {action} a {row['previous_status']} subscription (must be {allowed})",
+        current_status=row['previous_status']
+    )
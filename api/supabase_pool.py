@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""
+Process-wide Supabase client registry
+Creates one client per (url, key) lazily and shares it across requests so
+PostgREST calls reuse persistent keep-alive connections
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+import tracing
+
+try:
+    from supabase import create_client, Client
+    from supabase.lib.client_options import ClientOptions
+    from postgrest import SyncPostgrestClient
+    SUPABASE_AVAILABLE = True
+except ImportError:
+    SUPABASE_AVAILABLE = False
+
+try:
+    import httpcore
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+try:
+    # postgrest's session class (httpx.Client plus the aclose() it calls on shutdown)
+    from postgrest.utils import SyncClient as SessionBase
+except ImportError:
+    SessionBase = httpx.Client if HTTPX_AVAILABLE else None
+
+
+if HTTPX_AVAILABLE:
+    # httpcore errors re-raised as the httpx exception of the same name
+    HTTPCORE_ERRORS = {getattr(httpcore, name): getattr(httpx, name) for name in (
+        'ConnectTimeout', 'ReadTimeout', 'WriteTimeout', 'PoolTimeout', 'TimeoutException',
+        'ConnectError', 'ReadError', 'WriteError', 'NetworkError',
+        'RemoteProtocolError', 'LocalProtocolError', 'ProtocolError', 'UnsupportedProtocol', 'ProxyError'
+    )}
+
+    @contextmanager
+    def httpx_errors():
+        try:
+            yield
+        except Exception as e:
+            for cls in type(e).__mro__:
+                if cls in HTTPCORE_ERRORS:
+                    raise HTTPCORE_ERRORS[cls](str(e)) from e
+            raise
+
+    class PoolStream(httpx.SyncByteStream):
+        """Response body read from a pooled connection"""
+
+        def __init__(self, stream):
+            self._stream = stream
+
+        def __iter__(self):
+            with httpx_errors():
+                for part in self._stream:
+                    yield part
+
+        def close(self):
+            if hasattr(self._stream, 'close'):
+                self._stream.close()
+
+    class PooledTransport(httpx.BaseTransport):
+        """httpx transport over an httpcore connection pool built from explicit settings
+
+        The registry keeps one per client and closes it itself, so PostgREST
+        sessions built on it (supabase-py rebuilds them on auth changes) all
+        share the same keep-alive connections.
+        """
+
+        def __init__(self, verify=True, http2=False, limits=None):
+            limits = limits or httpx.Limits(max_connections=100, max_keepalive_connections=20)
+            self.pool = httpcore.ConnectionPool(
+                ssl_context=httpx.create_ssl_context(verify=verify),
+                max_connections=limits.max_connections,
+                max_keepalive_connections=limits.max_keepalive_connections,
+                keepalive_expiry=limits.keepalive_expiry,
+                http1=True,
+                http2=http2
+            )
+
+        def handle_request(self, request):
+            core_request = httpcore.Request(
+                method=request.method,
+                url=httpcore.URL(scheme=request.url.raw_scheme, host=request.url.raw_host,
+                                 port=request.url.port, target=request.url.raw_path),
+                headers=request.headers.raw,
+                content=request.stream,
+                extensions=request.extensions
+            )
+            with httpx_errors():
+                response = self.pool.handle_request(core_request)
+            return httpx.Response(status_code=response.status, headers=response.headers,
+                                  stream=PoolStream(response.stream), extensions=response.extensions)
+
+        @property
+        def open_connections(self) -> int:
+            return len(self.pool.connections)
+
+        def close(self):
+            self.pool.close()
+
+    class TracedClient(SessionBase):
+        """httpx client that times each PostgREST call as a `supabase` span"""
+
+        def send(self, request, **kwargs):
+            with tracing.span('supabase', tracing.KIND_CLIENT, **{
+                'http.request.method': request.method,
+                'url.path': request.url.path
+            }) as span:
+                response = super().send(request, **kwargs)
+                if span is not None:
+                    span.attributes['http.response.status_code'] = response.status_code
+                return response
+
+
+if SUPABASE_AVAILABLE and HTTPX_AVAILABLE:
+    class PooledPostgrestClient(SyncPostgrestClient):
+        """PostgREST client whose session is a TracedClient on a shared transport"""
+
+        def __init__(self, base_url, *, transport, **kwargs):
+            # create_session() runs inside the base constructor
+            self.transport = transport
+            super().__init__(base_url, **kwargs)
+
+        def create_session(self, base_url, headers, timeout):
+            return TracedClient(base_url=base_url, headers=headers, timeout=timeout, transport=self.transport)
+
+    class PooledClient(Client):
+        """Supabase client whose PostgREST clients, including rebuilt ones, use transport"""
+
+        def __init__(self, url, key, transport, options=None):
+            self.transport = transport
+            super().__init__(url, key, options or ClientOptions())
+
+        def _init_postgrest_client(self, rest_url, headers, schema, timeout):
+            # supabase-py calls this again whenever an auth event drops its PostgREST client
+            return PooledPostgrestClient(rest_url, headers=headers, schema=schema, timeout=timeout,
+                                         transport=self.transport)
+
+
+class SupabaseClientRegistry:
+    """Thread-safe, lazily populated registry of shared Supabase clients"""
+
+    def __init__(self, max_connections=None, max_keepalive=None, keepalive_expiry=None,
+                 timeout=None, verify=None, http2=None):
+        self.max_connections = int(max_connections or os.environ.get('SUPABASE_POOL_MAX_CONNECTIONS', 20))
+        self.max_keepalive = int(max_keepalive or os.environ.get('SUPABASE_POOL_MAX_KEEPALIVE', 10))
+        self.keepalive_expiry = float(keepalive_expiry or os.environ.get('SUPABASE_POOL_KEEPALIVE_SECONDS', 60))
+        self.timeout = float(timeout or os.environ.get('SUPABASE_POOL_TIMEOUT', 30))
+        self.verify = verify if verify is not None else os.environ.get('SUPABASE_POOL_VERIFY', 'true').lower() == 'true'
+        self.http2 = http2 if http2 is not None else os.environ.get('SUPABASE_POOL_HTTP2', 'false').lower() == 'true'
+
+        self._clients: Dict[Tuple[str, str], 'Client'] = {}
+        # One transport per client; open_connections() reads these pools
+        self._transports: Dict[Tuple[str, str], 'PooledTransport'] = {}
+        self._lock = threading.Lock()
+
+        # Pool statistics; counters have their own lock so lookups never wait on client creation
+        self._stats_lock = threading.Lock()
+        self._created = 0
+        self._acquisitions = 0
+        self._reuses = 0
+        self._failures = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def get_client(self, url=None, key=None) -> Optional['Client']:
+        """Return the shared client for url/key, creating it on first use"""
+        url = url or os.environ.get('SUPABASE_URL')
+        key = key or os.environ.get('SUPABASE_KEY')
+        if not SUPABASE_AVAILABLE or not url or not key:
+            return None
+
+        registry_key = (url, key)
+
+        # Fast path: no locking once the client exists
+        client = self._clients.get(registry_key)
+        if client is not None:
+            self._record_acquisition(0.0, reused=True)
+            return client
+
+        wait_start = time.perf_counter()
+        with self._lock:
+            waited = time.perf_counter() - wait_start
+            client = self._clients.get(registry_key)
+            if client is not None:
+                self._record_acquisition(waited, reused=True)
+                return client
+
+            try:
+                client = self._create_client(url, key)
+            except Exception as e:
+                with self._stats_lock:
+                    self._failures += 1
+                print(f"Supabase initialization error: {e}")
+                return None
+
+            self._clients[registry_key] = client
+            with self._stats_lock:
+                self._created += 1
+            self._record_acquisition(waited, reused=False)
+            return client
+
+    def _create_client(self, url, key):
+        """Build a client whose PostgREST sessions keep connections alive; called under _lock"""
+        if not HTTPX_AVAILABLE:
+            return create_client(url, key)
+
+        transport = PooledTransport(
+            verify=self.verify,
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive,
+                keepalive_expiry=self.keepalive_expiry
+            )
+        )
+        client = PooledClient(url, key, transport, ClientOptions(postgrest_client_timeout=self.timeout))
+        self._transports[(url, key)] = transport
+        return client
+
+    def _record_acquisition(self, waited, reused):
+        with self._stats_lock:
+            self._acquisitions += 1
+            if reused:
+                self._reuses += 1
+            self._wait_total += waited
+            if waited > self._wait_max:
+                self._wait_max = waited
+
+    def warm_up(self, url=None, key=None) -> bool:
+        """Create the client and open a connection before the first request"""
+        client = self.get_client(url, key)
+        if client is None:
+            return False
+
+        try:
+            client.table('products').select('product_id').limit(1).execute()
+            return True
+        except Exception as e:
+            print(f"Supabase warm-up failed: {e}")
+            return False
+
+    def open_connections(self) -> Optional[int]:
+        """Count connections currently held by the registry's HTTP pools"""
+        if not self._transports:
+            return None if self._clients else 0
+        return sum(transport.open_connections for transport in list(self._transports.values()))
+
+    def stats(self) -> Dict:
+        """Return pool statistics"""
+        with self._stats_lock:
+            created, failures = self._created, self._failures
+            acquisitions, reuses = self._acquisitions, self._reuses
+            wait_total, wait_max = self._wait_total, self._wait_max
+        return {
+            'clients': len(self._clients),
+            'clients_created': created,
+            'creation_failures': failures,
+            'acquisitions': acquisitions,
+            'reuse_count': reuses,
+            'open_connections': self.open_connections(),
+            'acquisition_wait_ms': {
+                'total': round(wait_total * 1000, 3),
+                'max': round(wait_max * 1000, 3),
+                'avg': round(wait_total * 1000 / acquisitions, 3) if acquisitions else 0.0
+            }
+        }
+
+    def reset(self):
+        """Forget clients inherited from a parent process without closing them"""
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._clients = {}
+        self._transports = {}
+
+    def close(self):
+        """Close every client's connection pool and empty the registry"""
+        with self._lock:
+            for transport in self._transports.values():
+                try:
+                    transport.close()
+                except Exception:
+                    pass
+            self._clients.clear()
+            self._transports.clear()
+
+
+registry = SupabaseClientRegistry()
+
+
+def get_supabase_client() -> Optional['Client']:
+    """Return the process-wide Supabase client, or None if not configured"""
+    return registry.get_client()
+
+
+if os.environ.get('SUPABASE_WARMUP', 'false').lower() == 'true':
+    registry.warm_up()
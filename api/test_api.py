@@ -11,6 +11,7 @@ import threading
 from unittest.mock import Mock, patch, MagicMock
 import os
 import sys
+import io
 
 # Add the api directory to Python path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
@@ -313,6 +314,1407 @@ class TestDataValidation:
         for freq in invalid_frequencies:
             assert freq not in valid_frequencies
 
+class TestSupabasePool:
+    """Shared Supabase client registry tests"""
+
+    def test_client_created_once_across_threads(self):
+        """Concurrent acquisitions share a single client"""
+        import supabase_pool
+
+        registry = supabase_pool.SupabaseClientRegistry()
+        fake_client = Mock()
+
+        with patch.object(supabase_pool, 'SUPABASE_AVAILABLE', True), \
+             patch.object(registry, '_create_client', return_value=fake_client) as create:
+            clients = []
+            threads = [
+                threading.Thread(target=lambda: clients.append(registry.get_client('https://db.test', 'key')))
+                for _ in range(20)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert create.call_count == 1
+        assert all(client is fake_client for client in clients)
+
+        stats = registry.stats()
+        assert stats['clients_created'] == 1
+        assert stats['acquisitions'] == 20
+        assert stats['reuse_count'] == 19
+
+    def test_unconfigured_registry_returns_none(self):
+        """Missing credentials yield no client"""
+        import supabase_pool
+
+        registry = supabase_pool.SupabaseClientRegistry()
+        with patch.dict(os.environ, {'SUPABASE_URL': '', 'SUPABASE_KEY': ''}):
+            assert registry.get_client() is None
+
+    def test_rebuilt_postgrest_sessions_share_the_registry_pool(self):
+        """Sessions use the registry's settings and pool, also after an auth event rebuilds PostgREST"""
+        import httpx
+        import supabase_pool
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Rows(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                body = b'[{"product_id": 1}]'
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Rows)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{server.server_address[1]}'
+        registry = supabase_pool.SupabaseClientRegistry(max_connections=5, timeout=7)
+        # Only the PostgREST side is exercised; the base constructor also builds auth and storage clients
+        with patch.object(supabase_pool.Client, '__init__',
+                          lambda client, url, key, options: setattr(client, 'options', options)):
+            client = registry._create_client(url, 'key')
+        assert client.options.postgrest_client_timeout == 7
+        try:
+            postgrest = client._init_postgrest_client(f'{url}/rest/v1', {'apikey': 'key'}, 'public', 7)
+            session = postgrest.session
+            assert isinstance(session, supabase_pool.TracedClient) and hasattr(session, 'aclose')
+            assert session.timeout == httpx.Timeout(7)
+            assert registry.open_connections() == 0
+            postgrest.from_('products').select('product_id').execute()
+
+            # supabase-py builds a new PostgREST client after an auth event
+            rebuilt = client._init_postgrest_client(f'{url}/rest/v1', {'apikey': 'key'}, 'public', 7)
+            assert rebuilt.session is not session
+            assert rebuilt.from_('products').select('product_id').execute().data == [{'product_id': 1}]
+
+            # The rebuilt session reused the kept-alive connection
+            assert registry.open_connections() == 1
+        finally:
+            registry.close()
+            server.shutdown()
+            server.server_close()
+        assert registry.open_connections() == 0
+
+class TestRateLimiter:
+    """GCRA rate limiter tests"""
+
+    def test_burst_then_reject(self):
+        """A full window's worth of requests passes, the next is rejected"""
+        from rate_limiter import RateLimiter, MemoryStore
+
+        limiter = RateLimiter(MemoryStore())
+        decisions = [limiter.check('auth', '10.0.0.1', now=100.0) for _ in range(11)]
+
+        assert all(d.allowed for d in decisions[:10])
+        assert decisions[9].remaining == 0
+        assert not decisions[10].allowed
+        assert decisions[10].retry_after == pytest.approx(6.0)
+
+        # One emission interval later a single request is allowed again
+        assert limiter.check('auth', '10.0.0.1', now=106.0).allowed
+        assert not limiter.check('auth', '10.0.0.1', now=106.0).allowed
+
+    def test_memory_budget_is_fixed(self):
+        """Idle and least recently used keys are evicted"""
+        from rate_limiter import RateLimiter, MemoryStore
+
+        store = MemoryStore(max_keys=100)
+        limiter = RateLimiter(store)
+        for i in range(1000):
+            limiter.check('general', f'10.0.{i // 256}.{i % 256}', now=float(i))
+
+        assert len(store) <= 100
+        assert store.evictions >= 900
+
+    def test_user_keys(self):
+        """Authenticated callers are keyed by user under the user and role scopes"""
+        from rate_limiter import RateLimiter
+
+        admin = {'user_id': 'u-1', 'role': 'admin'}
+        assert RateLimiter(scope='user').key_for('general', '1.2.3.4', admin) == 'user:u-1:general'
+        assert RateLimiter(scope='role').key_for('general', '1.2.3.4', admin) == 'user:u-1:general'
+        assert RateLimiter(scope='role').role_key_for('general', admin)[0] == 'role:admin:admin'
+        assert RateLimiter(scope='user').role_key_for('general', admin) == (None, None)
+        assert RateLimiter(scope='user').key_for('general', '1.2.3.4') == 'ip:1.2.3.4:general'
+        assert RateLimiter().limit_for('general', admin)['requests'] == 100
+
+    def test_role_bucket_is_checked_with_the_user_bucket(self):
+        """The role scope charges both the caller's bucket and the shared role bucket"""
+        from rate_limiter import RateLimiter
+
+        limits = {'general': {'requests': 3, 'window': 60}}
+        role_limits = {'customer': {'general': {'requests': 4, 'window': 60}}}
+        limiter = RateLimiter(limits=limits, scope='role', role_limits=role_limits)
+        alice = {'user_id': 'alice', 'role': 'customer'}
+        bob = {'user_id': 'bob', 'role': 'customer'}
+
+        # Alice runs out of her own budget before the role's
+        assert all(limiter.check('general', '1.1.1.1', alice, now=0.0).allowed for _ in range(3))
+        assert not limiter.check('general', '1.1.1.1', alice, now=0.0).allowed
+
+        # Bob has his own budget but the role has one request left
+        assert limiter.check('general', '2.2.2.2', bob, now=0.0).allowed
+        decision = limiter.check('general', '2.2.2.2', bob, now=0.0)
+        assert not decision.allowed
+        assert decision.retry_after > 0
+
+        # Anonymous callers have no role bucket and keep their per-IP limit
+        assert limiter.check('general', '3.3.3.3', now=0.0).allowed
+
+    def test_redis_url_without_redis_package_warns(self, monkeypatch, capsys):
+        """A shared limit that silently became per-process is reported"""
+        import rate_limiter
+
+        monkeypatch.setattr(rate_limiter, 'REDIS_AVAILABLE', False)
+        monkeypatch.setenv('REDIS_URL', 'redis://localhost:6379/0')
+        monkeypatch.setenv('RATE_LIMIT_SCOPE', 'role')
+
+        limiter = rate_limiter.create_rate_limiter()
+
+        assert limiter.scope == 'role'
+        assert isinstance(limiter.store, rate_limiter.MemoryStore)
+        assert 'redis package is not installed' in capsys.readouterr().out
+
+    def test_store_failure_falls_back(self):
+        """A failing shared store degrades to the local store"""
+        from rate_limiter import RateLimiter, MemoryStore
+
+        broken = Mock()
+        broken.gcra.side_effect = ConnectionError("redis down")
+        limiter = RateLimiter(broken, fallback_store=MemoryStore())
+
+        assert limiter.check('general', '10.0.0.1').allowed
+        assert limiter.store_errors == 1
+
+class FakeSocket:
+    """In-memory socket for driving the real request handler"""
+
+    def __init__(self, raw_request):
+        self._rfile = io.BytesIO(raw_request)
+        self.sent = bytearray()
+
+    def makefile(self, mode, *args, **kwargs):
+        return self._rfile
+
+    def sendall(self, data):
+        self.sent += data
+
+    def settimeout(self, timeout):
+        pass
+
+
+def run_request(method, path, headers=None, body=b''):
+    """Send one raw HTTP request through index.handler and parse the reply"""
+    from index import handler as api_handler
+
+    lines = [f"{method} {path} HTTP/1.1", "Host: localhost", f"Content-Length: {len(body)}"]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    raw = ("\r\n".join(lines) + "\r\n\r\n").encode() + body
+
+    sock = FakeSocket(raw)
+    with patch.object(api_handler, 'log_message'):
+        api_handler(sock, ('127.0.0.1', 40000), Mock())
+
+    head, _, payload = bytes(sock.sent).partition(b"\r\n\r\n")
+    status_line, *header_lines = head.decode().split("\r\n")
+    response_headers = dict(line.split(": ", 1) for line in header_lines)
+    return int(status_line.split()[1]), response_headers, payload
+
+
+class TestRouter:
+    """Compiled route table tests"""
+
+    def test_path_parameters_and_static_precedence(self):
+        """Static segments win over parameters; parameters are extracted"""
+        from router import Router
+
+        router = Router([
+            ('GET', '/subscriptions/{subscription_id}', 'detail'),
+            ('GET', '/subscriptions/{subscription_id}/pause', 'pause'),
+            ('GET', '/subscriptions/export', 'export'),
+        ])
+
+        match = router.match('GET', '/subscriptions/abc-123/pause')
+        assert match.route.name == 'pause'
+        assert match.params == {'subscription_id': 'abc-123'}
+        assert router.match('GET', '/subscriptions/export').route.name == 'export'
+        assert router.match('GET', '/subscriptions/abc/unknown') is None
+
+    def test_method_not_allowed(self):
+        """Known path with another method raises MethodNotAllowed"""
+        from router import Router, MethodNotAllowed
+
+        router = Router([('GET', '/users', 'list'), ('POST', '/users', 'create')])
+        with pytest.raises(MethodNotAllowed) as exc_info:
+            router.match('DELETE', '/users')
+        assert exc_info.value.allowed == ['GET', 'POST']
+
+    def test_handler_dispatch(self):
+        """Requests through the handler reach routes and report 404/405"""
+        status, headers, payload = run_request('GET', '/api/health')
+        assert status == 200
+        assert json.loads(payload)['status'] == 'healthy'
+
+        status, _, _ = run_request('GET', '/api/does-not-exist')
+        assert status == 404
+
+        status, headers, _ = run_request('DELETE', '/api/health')
+        assert status == 405
+        assert 'GET' in headers['Allow']
+
+    def test_route_timing_counters(self):
+        """Dispatched routes are counted in the request metrics"""
+        from index import handler as api_handler
+        from metrics import RequestMetrics
+
+        with patch.object(api_handler, '_metrics', RequestMetrics()):
+            run_request('GET', '/health')
+            assert api_handler._metrics.snapshot()['routes']['GET /health']['total_requests'] == 1
+
+class TestTokenCache:
+    """Verified JWT cache tests"""
+
+    def make_token(self, secret='test-secret', **claims):
+        import jwt
+        payload = {'user_id': 'u1', 'role': 'customer', 'exp': int(time.time()) + 3600}
+        payload.update(claims)
+        return jwt.encode(payload, secret, algorithm='HS256')
+
+    def test_signature_checked_once(self):
+        """Repeat lookups are served from the cache"""
+        import jwt
+        from token_cache import VerifiedTokenCache
+
+        cache = VerifiedTokenCache('test-secret')
+        token = self.make_token()
+        with patch('token_cache.jwt.decode', wraps=jwt.decode) as decode:
+            for _ in range(5):
+                assert cache.verify(token)['user_id'] == 'u1'
+        assert decode.call_count == 1
+        assert cache.stats()['hits'] == 4
+        assert cache.stats()['misses'] == 1
+
+    def test_invalid_and_expired_tokens(self):
+        """Bad signatures and expired tokens are rejected and not cached"""
+        from token_cache import VerifiedTokenCache
+
+        cache = VerifiedTokenCache('test-secret')
+        assert cache.verify(self.make_token(secret='other-secret')) is None
+        assert cache.verify(self.make_token(exp=int(time.time()) - 10)) is None
+        assert cache.stats()['size'] == 0
+
+        # Cached entries lapse at the token's exp and are verified afresh
+        token = self.make_token()
+        cache.verify(token)
+        with patch('token_core.time.time', return_value=time.time() + 7200):
+            cache.verify(token)
+        assert cache.stats()['misses'] == 4
+
+    def test_revocation_and_bound(self):
+        """Revoked tokens are rejected; size never exceeds max_entries"""
+        from token_cache import VerifiedTokenCache
+
+        cache = VerifiedTokenCache('test-secret', max_entries=3)
+        token = self.make_token()
+        assert cache.verify(token)
+        cache.revoke(token)
+        assert cache.verify(token) is None
+
+        for i in range(10):
+            cache.verify(self.make_token(user_id=f'u{i}'))
+        assert cache.stats()['size'] == 3
+
+class TestSerialization:
+    """JSON encoder and streaming writer tests"""
+
+    def sample_rows(self, count):
+        from datetime import datetime, timezone
+        from decimal import Decimal
+        from uuid import UUID
+
+        return [{
+            'subscription_id': UUID(int=i),
+            'amount': Decimal('299.50'),
+            'created_at': datetime(2024, 1, 1, tzinfo=timezone.utc),
+            'status': 'active'
+        } for i in range(count)]
+
+    def test_typed_columns(self):
+        """datetime, UUID and Decimal columns encode the same with either encoder"""
+        import serialization
+
+        row = json.loads(serialization.dumps(self.sample_rows(1)[0]))
+        assert row['subscription_id'] == '00000000-0000-0000-0000-000000000000'
+        assert row['amount'] == '299.50'
+        assert row['created_at'].startswith('2024-01-01T00:00:00')
+
+        encoded = [json.loads(chunk) for chunk in serialization.encode_rows(self.sample_rows(3))]
+        assert encoded[2]['subscription_id'].endswith('2')
+
+    def test_streamed_document_matches_buffered(self):
+        """Chunked output reassembles to the same document"""
+        import serialization
+
+        data = {'success': True, 'subscriptions': self.sample_rows(500), 'count': 500}
+        chunks = list(serialization.iter_json(data, chunk_size=4096, threshold=100))
+
+        assert len(chunks) > 1
+        assert json.loads(b''.join(chunks)) == json.loads(serialization.dumps(data))
+
+    def test_handler_streams_large_lists(self):
+        """Large list responses are written without Content-Length"""
+        from index import handler as api_handler
+
+        rows = self.sample_rows(50)
+        with patch('serialization.STREAM_THRESHOLD', 10), \
+                patch.object(api_handler, 'handle_health', lambda self: self.send_json_response({'items': rows})):
+            status, headers, payload = run_request('GET', '/health')
+
+        assert status == 200
+        assert 'Content-Length' not in headers
+        assert len(json.loads(payload)['items']) == 50
+
+def admin_headers():
+    """Authorization header carrying an admin token"""
+    import jwt
+    import index
+
+    token = jwt.encode({'user_id': 'admin-1', 'role': 'admin', 'exp': int(time.time()) + 3600},
+                       index.JWT_SECRET, algorithm='HS256')
+    return {'Authorization': f'Bearer {token}'}
+
+
+class TestAdminUsers:
+    """Single-query admin user listing tests"""
+
+    def rows(self, count):
+        return [{
+            'user_id': f'00000000-0000-0000-0000-{i:012d}',
+            'email': f'user{i}@example.com',
+            'user_role': 'customer',
+            'created_at': '2024-01-01T00:00:00',
+            'sort_key': f'2024-01-01 00:00:{59 - i:02d}',
+            'subscription_count': i,
+            'active_subscription_count': 0
+        } for i in range(count)]
+
+    def test_one_query_and_cursor(self):
+        """A page is one rpc call; a full page returns a cursor for the next"""
+        from pagination import decode_cursor
+
+        supabase = Mock()
+        supabase.rpc.return_value.execute.return_value = Mock(data=self.rows(3))
+        with patch('index.get_supabase_client', return_value=supabase):
+            status, _, payload = run_request('GET', '/api/admin/users?limit=2&role=customer', admin_headers())
+
+        body = json.loads(payload)
+        assert status == 200
+        assert supabase.rpc.call_count == 1
+        assert supabase.table.call_count == 0
+
+        name, params = supabase.rpc.call_args[0]
+        assert name == 'admin_list_users'
+        assert params['p_limit'] == 3
+        assert params['p_role'] == 'customer'
+
+        assert body['count'] == 2 and body['has_more']
+        assert 'sort_key' not in body['users'][0]
+        assert decode_cursor(body['next_cursor'])[2:] == ['2024-01-01 00:00:58', self.rows(2)[1]['user_id']]
+
+        supabase.rpc.return_value.execute.return_value = Mock(data=self.rows(1))
+        with patch('index.get_supabase_client', return_value=supabase):
+            status, _, payload = run_request('GET', f"/api/admin/users?limit=2&cursor={body['next_cursor']}",
+                                             admin_headers())
+
+        params = supabase.rpc.call_args[0][1]
+        assert params['p_after_key'] == '2024-01-01 00:00:58'
+        assert json.loads(payload)['next_cursor'] is None
+
+    def test_rejects_bad_sort_and_cursor(self):
+        """Unknown sort keys and mismatched cursors are client errors"""
+        from pagination import encode_cursor
+
+        with patch('index.get_supabase_client', return_value=Mock()):
+            status, _, _ = run_request('GET', '/api/admin/users?sort=password_hash', admin_headers())
+            assert status == 400
+
+            cursor = encode_cursor('email', 'asc', 'a@example.com', 'id')
+            status, _, _ = run_request('GET', f'/api/admin/users?cursor={cursor}', admin_headers())
+            assert status == 400
+
+class TestAnalyticsRollups:
+    """Analytics rollup reader and maintenance command tests"""
+
+    def fake_supabase(self, mismatches=()):
+        tables = {
+            'subscription_status_rollup': [
+                {'status': 'active', 'subscription_count': 42},
+                {'status': 'paused', 'subscription_count': 0}
+            ],
+            'monthly_revenue_rollup': [
+                {'month': '2024-01-01', 'revenue': '1299.00'},
+                {'month': '2024-02-01', 'revenue': 899.5}
+            ]
+        }
+        supabase = Mock()
+        supabase.table.side_effect = lambda name: Mock(**{
+            'select.return_value.execute.return_value': Mock(data=tables[name]),
+            'select.return_value.order.return_value.execute.return_value': Mock(data=tables[name])
+        })
+        rebuilt = [{'rollup': 'subscription_status', 'buckets': 2}, {'rollup': 'monthly_revenue', 'buckets': 2}]
+        supabase.rpc.side_effect = lambda name, params: Mock(**{
+            'execute.return_value': Mock(data=list(mismatches) if name == 'check_analytics_rollups' else rebuilt)
+        })
+        return supabase
+
+    def test_endpoint_reads_rollups_only(self):
+        """Analytics come from the rollup tables, not subscriptions/payments"""
+        supabase = self.fake_supabase()
+        with patch('index.get_supabase_client', return_value=supabase):
+            status, _, payload = run_request('GET', '/api/admin/analytics', admin_headers())
+
+        analytics = json.loads(payload)['analytics']
+        assert status == 200
+        assert analytics['subscriptions_by_status'] == {'active': 42}
+        assert analytics['monthly_revenue'] == {'2024-01': 1299.0, '2024-02': 899.5}
+        assert analytics['total_revenue'] == pytest.approx(2198.5)
+        assert {call[0][0] for call in supabase.table.call_args_list} == {
+            'subscription_status_rollup', 'monthly_revenue_rollup'
+        }
+
+    def test_check_command(self):
+        """check exits non-zero on drift and --repair rebuilds"""
+        import analytics_rollups
+
+        drift = [{'rollup': 'monthly_revenue', 'bucket': '2024-01', 'expected': 10, 'actual': 9}]
+        with patch('supabase_pool.get_supabase_client', return_value=self.fake_supabase()):
+            assert analytics_rollups.main(['check']) == 0
+
+        supabase = self.fake_supabase(drift)
+        with patch('supabase_pool.get_supabase_client', return_value=supabase):
+            assert analytics_rollups.main(['check']) == 1
+            assert analytics_rollups.main(['check', '--repair']) == 0
+        assert supabase.rpc.call_args[0][0] == 'rebuild_analytics_rollups'
+
+class TestSnapshotCache:
+    """Dashboard snapshot cache tests"""
+
+    def test_fresh_then_stale_while_revalidate(self):
+        """Stale snapshots are served while one background refresh runs"""
+        from snapshot_cache import SnapshotCache
+
+        cache = SnapshotCache(ttl=10, stale_ttl=60)
+        versions = iter(range(10))
+        refreshed = threading.Event()
+
+        def loader():
+            value = next(versions)
+            if value == 1:
+                refreshed.set()
+            return value
+
+        start = time.monotonic()
+        assert cache.get('k', loader) == (0, 'miss')
+        assert cache.get('k', loader, now=start + 5) == (0, 'fresh')
+        assert cache.get('k', loader, now=start + 20) == (0, 'stale')
+        assert refreshed.wait(2)
+
+        time.sleep(0.05)
+        assert cache.get('k', loader)[0] == 1
+        assert cache.stats()['stale_hits'] == 1
+
+    def test_concurrent_misses_coalesce(self):
+        """Only one of many concurrent callers runs the loader"""
+        from snapshot_cache import SnapshotCache
+
+        cache = SnapshotCache(ttl=10)
+        release = threading.Event()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            release.wait(2)
+            return 'dashboard'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get('k', loader)[0])) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        assert len(calls) == 1
+        assert results == ['dashboard'] * 8
+        assert cache.stats()['coalesced'] == 7
+
+    def test_merchant_dashboard_snapshot(self):
+        """Dashboard is assembled from four queries once, then served cached"""
+        from index import handler as api_handler
+
+        supabase = MagicMock()
+        supabase.table.return_value.select.return_value.limit.return_value.execute.return_value = Mock(count=5, data=[])
+        supabase.table.return_value.select.return_value.eq.return_value.limit.return_value.execute.return_value = Mock(count=3, data=[])
+        supabase.table.return_value.select.return_value.execute.return_value = Mock(data=[{'revenue': '100.50'}, {'revenue': 20}])
+        supabase.rpc.return_value.execute.return_value = Mock(data=[
+            {'month': '2024-05-01', 'subscriptions': 2},
+            {'month': '2024-06-01', 'subscriptions': 0}
+        ])
+
+        api_handler._dashboard_cache.invalidate()
+        with patch('index.get_supabase_client', return_value=supabase):
+            status, headers, payload = run_request('GET', '/api/merchant/dashboard', admin_headers())
+            _, cached_headers, _ = run_request('GET', '/api/merchant/dashboard', admin_headers())
+        api_handler._dashboard_cache.invalidate()
+
+        metrics = json.loads(payload)['metrics']
+        assert status == 200
+        assert headers['X-Cache'] == 'MISS' and cached_headers['X-Cache'] == 'FRESH'
+        assert metrics['total_users'] == 5
+        assert metrics['active_subscriptions'] == 3
+        assert metrics['total_revenue'] == pytest.approx(120.5)
+        assert metrics['subscription_trends'] == [{'month': 'May', 'subscriptions': 2}, {'month': 'Jun', 'subscriptions': 0}]
+        assert supabase.rpc.call_count == 1
+
+class FakeBillingQuery:
+    """Just enough of the postgrest query builder for billing runs"""
+
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.filters = []
+        self.row_limit = None
+        self.upserted = None
+
+    def select(self, *columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: str(row.get(column)) == str(value))
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(lambda row: row[column] <= value)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row[column] > value)
+        return self
+
+    def order(self, column):
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def upsert(self, row):
+        self.upserted = dict(row)
+        return self
+
+    def execute(self):
+        if self.upserted is not None:
+            self.db.checkpoints[self.upserted['run_date']] = self.upserted
+            return Mock(data=[self.upserted])
+        rows = self.db.subscriptions if self.table == 'subscriptions' else list(self.db.checkpoints.values())
+        rows = sorted((dict(r) for r in rows if all(f(r) for f in self.filters)),
+                      key=lambda r: r.get('subscription_id', ''))
+        return Mock(data=rows[:self.row_limit])
+
+
+class FakeBillingDB:
+    def __init__(self, count):
+        self.subscriptions = [{
+            'subscription_id': f'sub-{i:04d}',
+            'status': 'active',
+            'frequency': 'monthly',
+            'next_delivery_date': '2024-03-01',
+            'last_delivery_date': None,
+            'delivery_count': 0
+        } for i in range(count)]
+        self.checkpoints = {}
+        self.rpc_calls = 0
+
+    def table(self, name):
+        return FakeBillingQuery(self, name)
+
+    def rpc(self, name, params):
+        assert name == 'apply_billing_advances'
+        self.rpc_calls += 1
+        by_id = {row['subscription_id']: row for row in self.subscriptions}
+        advanced = []
+        for update in params['p_updates']:
+            row = by_id[update['subscription_id']]
+            if row['next_delivery_date'] == update['expected_delivery_date'] and row['last_delivery_date'] != params['p_run_date']:
+                row.update(next_delivery_date=update['next_delivery_date'], last_delivery_date=params['p_run_date'],
+                           delivery_count=row['delivery_count'] + 1)
+                advanced.append({'subscription_id': row['subscription_id']})
+        return Mock(**{'execute.return_value': Mock(data=advanced)})
+
+
+class TestBillingRun:
+    """Chunked recurring billing run tests"""
+
+    def test_chunks_use_one_bulk_call_each(self):
+        """Every due subscription is advanced once, one rpc per chunk"""
+        from datetime import date
+        from billing_run import BillingRun
+
+        db = FakeBillingDB(25)
+        report = BillingRun(db, date(2024, 3, 1), chunk_size=10, max_concurrency=2).run()
+
+        assert report['complete']
+        assert report['processed'] == 25
+        assert [chunk['rows'] for chunk in report['chunks']] == [10, 10, 5]
+        assert db.rpc_calls == 3
+        assert all(row['next_delivery_date'] == '2024-03-31' and row['delivery_count'] == 1 for row in db.subscriptions)
+        assert db.checkpoints['2024-03-01']['status'] == 'completed'
+
+        # Re-running a completed date does nothing
+        assert BillingRun(db, date(2024, 3, 1), chunk_size=10).run()['processed'] == 0
+        assert db.rpc_calls == 3
+
+    def test_resumes_after_time_budget(self):
+        """A run out of time stops at a checkpoint and the next run resumes"""
+        from datetime import date
+        from billing_run import BillingRun
+
+        db = FakeBillingDB(25)
+        first = BillingRun(db, date(2024, 3, 1), chunk_size=10, max_concurrency=1, time_budget=0).run()
+        assert not first['complete'] and first['processed'] == 0
+
+        with patch('billing_run.time.monotonic', side_effect=[0, 0, 100, 100, 100]):
+            partial = BillingRun(db, date(2024, 3, 1), chunk_size=10, max_concurrency=1, time_budget=1).run()
+        assert not partial['complete']
+        assert partial['processed'] == 10
+        assert db.checkpoints['2024-03-01']['last_subscription_id'] == 'sub-0009'
+
+        rest = BillingRun(db, date(2024, 3, 1), chunk_size=10, max_concurrency=1).run()
+        assert rest['complete']
+        assert rest['processed'] == 15
+        assert rest['totals']['processed'] == 25
+        assert all(row['delivery_count'] == 1 for row in db.subscriptions)
+
+    def test_chunks_after_a_failure_are_reported_not_checkpointed(self):
+        """Writes that land after a failed chunk are counted but do not move the checkpoint"""
+        from datetime import date
+        from billing_run import BillingRun
+
+        db = FakeBillingDB(30)
+        apply_rpc = db.rpc
+        chunk_two_done = threading.Event()
+
+        def rpc(name, params):
+            if params['p_updates'][0]['subscription_id'] == 'sub-0000':
+                chunk_two_done.wait(2)
+                raise ConnectionError('statement timeout')
+            try:
+                return apply_rpc(name, params)
+            finally:
+                chunk_two_done.set()
+
+        db.rpc = rpc
+        report = BillingRun(db, date(2024, 3, 1), chunk_size=10, max_concurrency=2).run()
+
+        assert not report['complete']
+        assert report['error'].startswith('Chunk 1 failed')
+        assert (report['processed'], report['failed'], report['applied_after_failure']) == (0, 10, 10)
+        assert report['totals']['chunks'] == 0
+        assert '2024-03-01' not in db.checkpoints
+
+        db.rpc = apply_rpc
+        rest = BillingRun(db, date(2024, 3, 1), chunk_size=10, max_concurrency=2).run()
+        assert rest['complete']
+        # The rows advanced after the failure are no longer due
+        assert (rest['processed'], rest['skipped']) == (20, 0)
+        assert all(row['delivery_count'] == 1 for row in db.subscriptions)
+
+class TestAuditPipeline:
+    """Write-behind audit logger tests"""
+
+    def test_batches_by_size_and_flushes(self):
+        """Records are written as multi-row batches and flush() drains the queue"""
+        from audit_log import AuditPipeline
+
+        batches = []
+        pipeline = AuditPipeline(batches.append, batch_size=10, flush_interval=60)
+        for i in range(25):
+            assert pipeline.log({'action': 'pause_subscription', 'resource_id': i})
+
+        assert pipeline.flush(timeout=2)
+        assert sorted(len(batch) for batch in batches) == [5, 10, 10]
+        assert pipeline.stats()['written'] == 25
+        assert pipeline.close()
+
+    def test_drop_policies_count_losses(self):
+        """A full queue drops per policy and counts every dropped record"""
+        from audit_log import AuditPipeline
+
+        release = threading.Event()
+        written = []
+
+        def slow_sink(batch):
+            release.wait(2)
+            written.extend(record['n'] for record in batch)
+
+        pipeline = AuditPipeline(slow_sink, max_queue=3, batch_size=1, flush_interval=0, policy='drop_oldest')
+        pipeline.log({'n': 0})
+        time.sleep(0.1)  # first record is now held by the blocked sink
+        for n in range(1, 6):
+            pipeline.log({'n': n})
+        release.set()
+        pipeline.flush(timeout=2)
+
+        assert pipeline.stats()['dropped'] == 2
+        assert written == [0, 3, 4, 5]
+
+        newest = AuditPipeline(lambda batch: time.sleep(1), max_queue=1, batch_size=1, policy='drop_newest')
+        newest.log({'n': 0})
+        time.sleep(0.05)
+        newest.log({'n': 1})
+        assert newest.log({'n': 2}) is False
+
+    def test_sink_errors_are_retried_then_counted(self):
+        """A transient sink error is retried and the batch still written"""
+        from audit_log import AuditPipeline
+
+        calls = []
+
+        def flaky(batch):
+            calls.append(batch)
+            if len(calls) == 1:
+                raise RuntimeError('database unavailable')
+
+        pipeline = AuditPipeline(flaky, batch_size=1, flush_interval=0)
+        pipeline.log({'n': 0})
+        assert pipeline.flush(timeout=2)
+        stats = pipeline.stats()
+        assert (stats['written'], stats['sink_errors'], stats['failed']) == (1, 1, 0)
+
+    def test_failed_batch_drops_only_bad_rows(self):
+        """After its retries a batch is split until only the rejected rows are left"""
+        from audit_log import AuditPipeline
+
+        written = []
+        dead = []
+
+        def sink(batch):
+            if any(record['n'] in (3, 6) for record in batch):
+                raise ValueError('invalid row')
+            written.extend(record['n'] for record in batch)
+
+        pipeline = AuditPipeline(sink, batch_size=8, flush_interval=60, max_retries=1, dead_letter=dead.extend)
+        for n in range(8):
+            pipeline.log({'n': n})
+        assert pipeline.flush(timeout=5)
+
+        assert sorted(written) == [0, 1, 2, 4, 5, 7]
+        assert dead == [{'n': 3}, {'n': 6}]
+        stats = pipeline.stats()
+        assert (stats['written'], stats['failed']) == (6, 2)
+
+    def test_block_policy_waits_then_drops(self):
+        """The block policy waits up to block_timeout for queue space"""
+        from audit_log import AuditPipeline
+
+        release = threading.Event()
+        pipeline = AuditPipeline(lambda batch: release.wait(2), max_queue=1, batch_size=1,
+                                 flush_interval=0, policy='block', block_timeout=0.05)
+        pipeline.log({'n': 0})
+        time.sleep(0.05)
+        assert pipeline.log({'n': 1})
+        assert not pipeline.log({'n': 2})
+        release.set()
+        assert pipeline.flush(timeout=2)
+        assert pipeline.stats()['dropped'] == 1
+
+    def test_forked_child_starts_its_own_flusher(self):
+        """A child process writes only its own records with its own thread"""
+        from audit_log import AuditPipeline
+
+        written = []
+        pipeline = AuditPipeline(written.extend, batch_size=100, flush_interval=60)
+        parent_thread = pipeline._thread if pipeline.log({'n': 0}) else None
+        # As seen from a child right after fork: inherited queue, no flusher thread
+        with patch('write_behind.os.getpid', return_value=os.getpid() + 1):
+            assert not pipeline.flush(timeout=0.1)
+            pipeline.log({'n': 1})
+            assert pipeline._thread is not parent_thread
+            assert pipeline.flush(timeout=2)
+        assert written == [{'n': 1}]
+
+    def test_pipeline_from_env(self):
+        """AUDIT_* settings configure the pipeline, which is closed at exit"""
+        from audit_log import AuditPipeline, pipeline_from_env
+
+        env = {'AUDIT_QUEUE_SIZE': '5', 'AUDIT_BATCH_SIZE': '2', 'AUDIT_QUEUE_POLICY': 'drop_newest'}
+        with patch.dict(os.environ, env), patch('write_behind.atexit.register') as register:
+            pipeline = pipeline_from_env(lambda batch: None)
+        assert (pipeline.max_queue, pipeline.batch_size, pipeline.policy) == (5, 2, 'drop_newest')
+        register.assert_called_once_with(pipeline.close)
+        with pytest.raises(ValueError):
+            AuditPipeline(lambda batch: None, policy='spill')
+
+    def test_handler_does_not_write_on_request_path(self):
+        """log_audit_action enqueues instead of inserting"""
+        from index import handler as api_handler
+
+        instance = api_handler.__new__(api_handler)
+        instance.supabase = Mock()
+        instance.headers = {}
+        with patch.object(api_handler._audit_log, 'log') as log:
+            instance.log_audit_action('u1', 'pause_subscription', 'subscriptions', 's1')
+
+        assert log.call_args[0][0]['action'] == 'pause_subscription'
+        assert instance.supabase.table.call_count == 0
+
+class TestCatalogCache:
+    """Versioned product catalog cache and ETag tests"""
+
+    def fake_supabase(self):
+        supabase = Mock()
+        listing = Mock(data=[{'product_id': 'p1', 'name': 'Coffee', 'price': 299}])
+        supabase.table.return_value.select.return_value.execute.return_value = listing
+        supabase.table.return_value.select.return_value.ilike.return_value.execute.return_value = listing
+        supabase.table.return_value.insert.return_value.execute.return_value = Mock(
+            data=[{'product_id': 'p2', 'name': 'Tea', 'price': 199}])
+        return supabase
+
+    def test_etag_revalidation_skips_database(self):
+        """Repeat reads are served from memory and a matching ETag gets a bodyless 304"""
+        from index import handler as api_handler
+
+        api_handler._catalog_cache.bump()
+        supabase = self.fake_supabase()
+        with patch('index.get_supabase_client', return_value=supabase):
+            status, headers, payload = run_request('GET', '/api/products')
+            assert status == 200 and headers['X-Cache'] == 'MISS'
+            etag = headers['ETag']
+
+            status, headers, cached = run_request('GET', '/api/products')
+            assert status == 200 and headers['X-Cache'] == 'HIT'
+            assert cached == payload and headers['ETag'] == etag
+
+            status, headers, body = run_request('GET', '/api/products', {'If-None-Match': etag})
+            assert status == 304 and body == b''
+
+        assert supabase.table.return_value.select.call_count == 1
+
+    def test_product_write_bumps_version(self):
+        """Creating a product invalidates cached listings"""
+        from index import handler as api_handler
+
+        api_handler._catalog_cache.bump()
+        supabase = self.fake_supabase()
+        with patch('index.get_supabase_client', return_value=supabase):
+            run_request('GET', '/api/products?search=cof')
+            version = api_handler._catalog_cache.version
+            body = json.dumps({'name': 'Tea', 'price': 199}).encode()
+            status, _, _ = run_request('POST', '/api/products', admin_headers(), body)
+            assert status == 201
+            assert api_handler._catalog_cache.version == version + 1
+
+            status, headers, _ = run_request('GET', '/api/products?search=cof')
+            assert headers['X-Cache'] == 'MISS'
+
+    def test_result_from_older_version_is_not_stored(self):
+        """A listing read before a concurrent write is never cached"""
+        from catalog_cache import CatalogCache, etag_matches
+
+        cache = CatalogCache(ttl=60)
+        version = cache.version
+        cache.bump()
+        entry = cache.put(('products',), version, b'[]')
+        assert cache.get(('products',)) is None
+
+        assert etag_matches(f'W/{entry.etag}, "other"', entry.etag)
+        assert not etag_matches('"other"', entry.etag)
+
+        cache.put(('products',), cache.version, b'[]', now=0)
+        assert cache.get(('products',), now=61) is None
+
+class TestKeysetPagination:
+    """Cursor pagination over (created_at, id) for list endpoints"""
+
+    def rows(self, start, count):
+        return [{
+            'subscription_id': f'sub-{i:03d}',
+            'created_at': f'2024-01-01T00:{59 - i:02d}:00+00:00'
+        } for i in range(start, start + count)]
+
+    def fake_supabase(self, rows):
+        supabase = Mock()
+        query = Mock()
+        for method in ('select', 'eq', 'or_', 'order', 'limit'):
+            getattr(query, method).return_value = query
+        query.execute.return_value = Mock(data=rows)
+        supabase.table.return_value = query
+        return supabase, query
+
+    def test_pages_follow_cursor(self):
+        """A full page returns a cursor; the next request filters strictly after it"""
+        from pagination import decode_cursor
+
+        supabase, query = self.fake_supabase(self.rows(0, 3))
+        with patch('index.get_supabase_client', return_value=supabase):
+            status, _, payload = run_request('GET', '/api/subscriptions?limit=2', admin_headers())
+
+        body = json.loads(payload)
+        assert status == 200
+        assert body['total'] == 2 and body['has_more']
+        assert query.limit.call_args[0][0] == 3
+        assert [c[0][0] for c in query.order.call_args_list] == ['created_at', 'subscription_id']
+        assert query.or_.call_count == 0
+        assert decode_cursor(body['next_cursor']) == ['2024-01-01T00:58:00+00:00', 'sub-001']
+
+        supabase, query = self.fake_supabase(self.rows(2, 1))
+        with patch('index.get_supabase_client', return_value=supabase):
+            status, _, payload = run_request('GET', f"/api/subscriptions?limit=2&cursor={body['next_cursor']}",
+                                             admin_headers())
+
+        assert json.loads(payload)['next_cursor'] is None
+        assert query.or_.call_args[0][0] == (
+            'created_at.lt."2024-01-01T00:58:00+00:00",'
+            'and(created_at.eq."2024-01-01T00:58:00+00:00",subscription_id.lt."sub-001")'
+        )
+
+    def test_page_size_is_capped_and_bad_cursor_rejected(self):
+        """Oversized limits are clamped and undecodable cursors are client errors"""
+        import pagination
+
+        supabase, query = self.fake_supabase([])
+        with patch('index.get_supabase_client', return_value=supabase):
+            run_request('GET', '/api/users?limit=100000', admin_headers())
+            assert query.limit.call_args[0][0] == pagination.MAX_PAGE_SIZE + 1
+
+            status, _, _ = run_request('GET', '/api/users?cursor=not-a-cursor', admin_headers())
+            assert status == 400
+
+class TestCompression:
+    """Accept-Encoding negotiation and compressed response tests"""
+
+    def test_negotiation(self):
+        """q-values, wildcards and the size threshold pick the coding"""
+        from compression import negotiate
+
+        assert negotiate('gzip, deflate', size=4096) == 'gzip'
+        assert negotiate('gzip;q=0, identity', size=4096) is None
+        assert negotiate('*;q=0.5', size=4096, available=('gzip',)) == 'gzip'
+        assert negotiate('br;q=1.0, gzip;q=0.8', size=4096, available=('gzip',)) == 'gzip'
+        assert negotiate('br, gzip', size=4096, available=('br', 'gzip')) == 'br'
+        assert negotiate('gzip', size=10) is None
+        assert negotiate(None, size=4096) is None
+
+    def test_buffered_and_streamed_responses_are_gzipped(self):
+        """Both response writers honour Accept-Encoding and decode to the same JSON"""
+        import gzip
+        from index import handler as api_handler
+
+        rows = [{'subscription_id': f'sub-{i}', 'status': 'active', 'users': {'email': 'a@example.com'}}
+                for i in range(200)]
+        respond = lambda self: self.send_json_response({'items': rows})
+        with patch.object(api_handler, 'handle_health', respond):
+            status, headers, payload = run_request('GET', '/health', {'Accept-Encoding': 'gzip'})
+        assert headers['Content-Encoding'] == 'gzip'
+        assert headers['Vary'] == 'Accept-Encoding'
+        assert int(headers['Content-Length']) == len(payload)
+        assert json.loads(gzip.decompress(payload))['items'] == rows
+
+        with patch('serialization.STREAM_THRESHOLD', 10), patch('serialization.CHUNK_SIZE', 512), \
+                patch.object(api_handler, 'handle_health', respond):
+            status, headers, payload = run_request('GET', '/health', {'Accept-Encoding': 'gzip'})
+        assert 'Content-Length' not in headers
+        assert headers['Content-Encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(payload))['items'] == rows
+
+        with patch.object(api_handler, 'handle_health', respond):
+            _, headers, payload = run_request('GET', '/health')
+        assert 'Content-Encoding' not in headers
+        assert json.loads(payload)['items'] == rows
+
+    def test_catalog_variants_are_precompressed_once(self):
+        """Cached catalog bodies are compressed once per coding with a distinct ETag"""
+        import compression
+        from catalog_cache import CatalogCache, etag_matches
+
+        cache = CatalogCache(ttl=60)
+        entry = cache.put(('products',), cache.version, json.dumps([{'name': 'Coffee'}] * 200).encode())
+        with patch('compression.compress', wraps=compression.compress) as compress:
+            body, etag = entry.encoded('gzip', compression.compress)
+            assert entry.encoded('gzip', compression.compress) == (body, etag)
+        assert compress.call_count == 1
+        assert etag != entry.etag and etag.endswith('-gzip"')
+        assert etag_matches(entry.etag, etag)
+
+class TestRequestBody:
+    """Bounded request body reader tests"""
+
+    def test_oversized_body_rejected_before_read(self):
+        """A Content-Length above the route limit is answered with 413 unread"""
+        from request_body import BodyTooLarge, RequestBody
+
+        rfile = io.BytesIO(b'x' * 100)
+        with pytest.raises(BodyTooLarge):
+            RequestBody(rfile, {'Content-Length': '100'}, max_size=10)
+        assert rfile.tell() == 0
+
+        with patch('index.get_supabase_client', return_value=None):
+            status, headers, payload = run_request('POST', '/api/auth/login', body=b'{"email": "' + b'a' * 20000 + b'"}')
+        assert status == 413
+        assert 'exceeds' in json.loads(payload)['error']
+
+    def test_raw_bytes_read_once_and_chunked(self):
+        """raw() and json() share one read; chunked bodies are decoded and bounded"""
+        from request_body import BodyTooLarge, RequestBody
+
+        rfile = io.BytesIO(b'{"event_type": "order.created"}')
+        body = RequestBody(rfile, {'Content-Length': '31'})
+        assert bytes(body.raw()) == b'{"event_type": "order.created"}'
+        assert body.json() == {'event_type': 'order.created'}
+        assert rfile.read() == b''
+
+        chunked = io.BytesIO(b'5\r\n{"a":\r\n2\r\n1}\r\n0\r\n\r\n')
+        assert RequestBody(chunked, {'Transfer-Encoding': 'chunked'}).json() == {'a': 1}
+
+        chunked = io.BytesIO(b'8\r\n{"a": 12\r\n8\r\n34567890\r\n')
+        with pytest.raises(BodyTooLarge):
+            RequestBody(chunked, {'Transfer-Encoding': 'chunked'}, max_size=10).raw()
+
+    def test_webhook_signature(self):
+        """With SFCC_WEBHOOK_SECRET set, the webhook needs a valid HMAC of the raw body"""
+        import hashlib
+        import hmac
+
+        body = json.dumps({'event_type': 'unknown.event'}).encode()
+        signature = hmac.new(b'webhook-secret', body, hashlib.sha256).hexdigest()
+        with patch('index.SFCC_WEBHOOK_SECRET', 'webhook-secret'), \
+                patch('index.get_supabase_client', return_value=None):
+            status, _, _ = run_request('POST', '/api/sfcc/webhook', {'X-SFCC-Signature': 'sha256=' + '0' * 64}, body)
+            assert status == 401
+
+            status, _, payload = run_request('POST', '/api/sfcc/webhook', {'X-SFCC-Signature': signature}, body)
+            assert status == 200
+            assert json.loads(payload)['event_type'] == 'unknown.event'
+
+class TestRequestMetrics:
+    """Test latency histograms and the metrics endpoint"""
+
+    def test_histogram_quantiles_are_bounded(self):
+        """Quantiles from the log-linear buckets stay within one sub-bucket of the true value"""
+        from metrics import Histogram, bucket_bounds, bucket_index
+
+        for value in (0, 31, 32, 33, 1000, 123456, 59_999_999):
+            low, high = bucket_bounds(bucket_index(value))
+            assert low <= value <= high
+            assert high - low <= max(1, value // 16)
+
+        histogram = Histogram()
+        for value in range(1, 10001):
+            histogram.record(value)
+        assert abs(histogram.percentile(50) - 5000) <= 5000 / 16
+        assert abs(histogram.percentile(99) - 9900) <= 9900 / 16
+        assert histogram.percentile(100) == 10000
+
+    def test_rolling_window_drops_old_slices(self):
+        """Requests older than the window stop counting; cumulative totals keep them"""
+        from metrics import RequestMetrics
+
+        metrics = RequestMetrics(slice_seconds=10, window_seconds=60)
+        for _ in range(3):
+            metrics.begin('GET')
+            metrics.end('GET', '/users', 200, 0.050, now=1000.0)
+        metrics.begin('GET')
+        metrics.end('GET', '/users', 500, 0.200, now=1055.0)
+
+        snapshot = metrics.snapshot(now=1059.0)
+        route = snapshot['routes']['GET /users']
+        assert snapshot['in_flight'] == 0
+        assert route['total_requests'] == 4
+        assert route['status'] == {'200': 3, '500': 1}
+        assert route['error_rate_percent'] == 25.0
+        assert route['windows']['60s']['count'] == 4
+
+        snapshot = metrics.snapshot(now=1065.0)
+        assert snapshot['routes']['GET /users']['windows']['60s']['count'] == 1
+        assert snapshot['error_rates']['total_requests'] == 4
+        assert snapshot['error_rates']['window_error_rate_percent'] == 100.0
+
+    def test_dispatch_records_route_pattern_and_status(self):
+        """Requests are labelled by route pattern, unknown paths share one label"""
+        from index import handler as api_handler
+        from metrics import RequestMetrics
+
+        with patch.object(api_handler, '_metrics', RequestMetrics()), \
+                patch('index.get_supabase_client', return_value=None):
+            run_request('GET', '/api/subscriptions/abc-123/pause')
+            run_request('GET', '/api/no/such/path')
+            status, headers, payload = run_request('GET', '/api/monitoring/metrics')
+            assert status == 200
+            routes = json.loads(payload)['routes']
+            assert 'GET /subscriptions/{subscription_id}/pause' in routes
+            assert routes['GET <unmatched>']['status'] == {'404': 1}
+
+            status, headers, payload = run_request('GET', '/api/metrics?format=prometheus')
+            assert status == 200
+            assert headers['Content-Type'].startswith('text/plain')
+            text = payload.decode()
+            assert 'http_request_duration_seconds_bucket{method="GET",route="<unmatched>",status="404",le="+Inf"} 1' in text
+            assert '# TYPE http_requests_in_flight gauge' in text
+
+class TestTracing:
+    """Test request spans, Server-Timing and sampled profiling"""
+
+    def test_server_timing_and_otlp_export(self, tmp_path):
+        """Stages show up in Server-Timing and the trace file continues the caller's trace"""
+        import tracing
+
+        trace_file = tmp_path / 'traces.jsonl'
+        traceparent = '00-' + 'ab' * 16 + '-' + 'cd' * 8 + '-01'
+        with patch.object(tracing, 'exporter', tracing.TraceExporter(str(trace_file))), \
+                patch('index.get_supabase_client', return_value=None):
+            status, headers, _ = run_request('GET', '/api/health', {'traceparent': traceparent})
+
+        assert status == 200
+        timing = headers['Server-Timing']
+        assert 'rate_limit;dur=' in timing and 'serialize;dur=' in timing and 'total;dur=' in timing
+
+        exported = json.loads(trace_file.read_text().splitlines()[0])
+        spans = exported['resourceSpans'][0]['scopeSpans'][0]['spans']
+        root = spans[0]
+        assert root['name'] == 'GET /health'
+        assert root['traceId'] == 'ab' * 16 and root['parentSpanId'] == 'cd' * 8
+        assert {span['name'] for span in spans[1:]} >= {'rate_limit', 'serialize'}
+        assert all(span['parentSpanId'] == root['spanId'] for span in spans[1:])
+
+    def test_bound_work_keeps_parent_span(self):
+        """Spans opened on a pool thread through bind() join the request trace"""
+        from concurrent.futures import ThreadPoolExecutor
+        import tracing
+
+        trace = tracing.start_trace('GET')
+        with tracing.span('handler') as handler_span:
+            def query():
+                with tracing.span('supabase'):
+                    pass
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                pool.submit(tracing.bind(query)).result()
+        tracing.finish_trace(trace)
+
+        supabase_span = next(span for span in trace.spans if span.name == 'supabase')
+        assert supabase_span.parent_id == handler_span.span_id
+        assert tracing.current_trace() is None
+
+    def test_admin_requested_profile_is_dumped(self, tmp_path):
+        """X-Profile: 1 from an admin writes a .prof file; other callers are not profiled"""
+        import pstats
+        import tracing
+
+        with patch.object(tracing, 'PROFILE_DIR', str(tmp_path)), \
+                patch('index.get_supabase_client', return_value=None):
+            status, headers, _ = run_request('GET', '/api/health', {'X-Profile': '1'})
+            assert 'X-Profile-Id' not in headers
+            assert not list(tmp_path.iterdir())
+
+            status, headers, _ = run_request('GET', '/api/health', dict(admin_headers(), **{'X-Profile': '1'}))
+        assert status == 200
+        profile_path = tmp_path / (headers['X-Profile-Id'] + '.prof')
+        assert pstats.Stats(str(profile_path)).total_calls > 0
+
+class TestSubscriptionTransitions:
+    """Test single round-trip pause/resume/skip/cancel"""
+
+    def customer_headers(self):
+        import jwt
+        import index
+
+        token = jwt.encode({'user_id': 'u1', 'role': 'customer', 'exp': int(time.time()) + 3600},
+                           index.JWT_SECRET, algorithm='HS256')
+        return {'Authorization': f'Bearer {token}'}
+
+    def supabase(self, row):
+        supabase = Mock()
+        supabase.rpc.return_value.execute.return_value = Mock(data=[row])
+        return supabase
+
+    def test_transition_is_one_rpc_call(self):
+        """Skip is a single call scoped to the caller and returns the updated row"""
+        supabase = self.supabase({
+            'outcome': 'applied',
+            'previous_status': 'active',
+            'subscription': {'subscription_id': 's1', 'status': 'active', 'next_delivery_date': '2024-02-08'}
+        })
+        with patch('index.get_supabase_client', return_value=supabase), \
+                patch('index.handler.log_audit_action') as log:
+            status, _, payload = run_request('GET', '/api/subscriptions/s1/skip', self.customer_headers())
+
+        assert status == 200
+        assert json.loads(payload)['new_delivery_date'] == '2024-02-08'
+        assert supabase.rpc.call_count == 1 and supabase.table.call_count == 0
+        assert supabase.rpc.call_args[0] == ('transition_subscription', {
+            'p_subscription_id': 's1', 'p_action': 'skip', 'p_user_id': 'u1'
+        })
+        assert log.call_args[0][1] == 'skip_subscription'
+
+    def test_rejections_are_typed(self):
+        """An invalid transition is a 409 naming the current status; a missing row is a 404"""
+        supabase = self.supabase({'outcome': 'invalid_transition', 'previous_status': 'canceled', 'subscription': None})
+        with patch('index.get_supabase_client', return_value=supabase):
+            status, headers, payload = run_request('GET', '/api/subscriptions/s1/resume', admin_headers())
+        assert status == 409
+        assert headers['X-Subscription-Status'] == 'canceled'
+        assert 'Cannot resume a canceled subscription' in json.loads(payload)['error']
+        assert supabase.rpc.call_args[0][1]['p_user_id'] is None
+
+        supabase = self.supabase({'outcome': 'not_found', 'previous_status': None, 'subscription': None})
+        with patch('index.get_supabase_client', return_value=supabase):
+            status, _, _ = run_request('DELETE', '/api/subscriptions/s1', self.customer_headers())
+        assert status == 404
+
+class TestKeepAliveServer:
+    """Self-hosted HTTP/1.1 server tests (server.py)"""
+
+    @pytest.fixture
+    def server(self):
+        import server as api_server
+
+        srv = api_server.PooledHTTPServer(('127.0.0.1', 0), api_server.KeepAliveHandler, threads=4)
+        thread = threading.Thread(target=srv.serve_forever, daemon=True)
+        thread.start()
+        yield srv
+        srv.begin_drain()
+        thread.join(5)
+        srv.server_close()
+
+    @staticmethod
+    def closed_by_server(sock):
+        sock.settimeout(2)
+        try:
+            return sock.recv(1) == b''
+        except ConnectionResetError:
+            return True
+
+    def test_connection_reused_without_nagle_stall(self, server):
+        """Requests on one connection share the socket and skip the delayed-ACK wait"""
+        import http.client
+        from server import KeepAliveHandler
+
+        assert KeepAliveHandler.disable_nagle_algorithm
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=5)
+        timings = []
+        for _ in range(8):
+            start = time.perf_counter()
+            conn.request('GET', '/health')
+            response = conn.getresponse()
+            response.read()
+            timings.append(time.perf_counter() - start)
+            assert response.status == 200
+        sock = conn.sock
+        # With Nagle on, every request after the second took ~40ms
+        assert sum(timings[2:]) / len(timings[2:]) < 0.03
+        conn.request('GET', '/health')
+        conn.getresponse().read()
+        assert conn.sock is sock
+        conn.close()
+
+    def test_invalid_content_length_rejected(self, server):
+        """A non-numeric or negative Content-Length gets a 400 and the connection is closed"""
+        import socket
+
+        for value in (b'abc', b'-5'):
+            sock = socket.create_connection(server.server_address, timeout=5)
+            sock.sendall(b'POST /api/auth/login HTTP/1.1\r\nHost: test\r\nContent-Length: ' + value + b'\r\n\r\n')
+            # The server closes the connection after the error, so read to EOF
+            response = b''
+            while True:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                response += chunk
+            assert response.startswith(b'HTTP/1.1 400 ')
+            assert b'Invalid Content-Length' in response
+            sock.close()
+
+    def test_unread_body_drained_or_connection_closed(self, server):
+        """A small unread body is discarded and the connection reused; a large one closes it"""
+        import http.client
+        from server import BODY_DRAIN_LIMIT
+
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=5)
+        conn.request('POST', '/health', body=b'x' * 1000)
+        first = conn.getresponse()
+        first.read()
+        sock = conn.sock
+        conn.request('GET', '/health')
+        second = conn.getresponse()
+        assert second.status == 200
+        assert json.loads(second.read())['status'] == 'healthy'
+        assert conn.sock is sock
+
+        conn.request('POST', '/health', body=b'x' * (BODY_DRAIN_LIMIT + 1))
+        response = conn.getresponse()
+        response.read()
+        assert self.closed_by_server(conn.sock)
+        conn.close()
+
+    def test_sigterm_drains_and_exits(self):
+        """SIGTERM stops accepting, finishes requests on open connections and exits cleanly"""
+        import http.client
+        import signal
+        import socket
+        import subprocess
+
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        env = dict(os.environ, KEEPALIVE_TIMEOUT='1')
+        proc = subprocess.Popen(
+            [sys.executable, 'server.py', '--host', '127.0.0.1', '--port', str(port), '--threads', '2'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+        )
+        try:
+            deadline = time.monotonic() + 20
+            while True:
+                try:
+                    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                    conn.request('GET', '/health')
+                    break
+                except ConnectionRefusedError:
+                    assert time.monotonic() < deadline, "server did not start"
+                    time.sleep(0.1)
+            assert conn.getresponse().read()
+            # Let the worker go idle waiting for the next request on this connection
+            time.sleep(0.2)
+
+            proc.send_signal(signal.SIGTERM)
+            # The open keep-alive connection is still served while draining...
+            conn.request('GET', '/health')
+            response = conn.getresponse()
+            assert response.status == 200
+            response.read()
+            # ...and then closed by the server
+            assert self.closed_by_server(conn.sock)
+
+            output, _ = proc.communicate(timeout=20)
+            assert proc.returncode == 0
+            assert b'Drained' in output
+            with pytest.raises(ConnectionRefusedError):
+                socket.create_connection(('127.0.0.1', port), timeout=2)
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+
+
 if __name__ == "__main__":
     # Run tests
     pytest.main([__file__, "-v", "--tb=short"])
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Verified JWT cache
+Binds the shared token_core cache to PyJWT: a token missing from the cache is
+checked with jwt.decode against the handler's secret, and only valid claims
+are cached.
+"""
+
+from typing import Dict, Optional
+
+import jwt
+
+from token_core import ClaimsCache
+
+
+class VerifiedTokenCache(ClaimsCache):
+    """ClaimsCache that verifies tokens with PyJWT"""
+
+    def __init__(self, secret, algorithms=('HS256',), max_entries=10000, default_ttl=300):
+        super().__init__(max_entries=max_entries, default_ttl=default_ttl)
+        self.secret = secret
+        self.algorithms = list(algorithms)
+
+    def decode(self, token) -> Optional[Dict]:
+        try:
+            return jwt.decode(token, self.secret, algorithms=self.algorithms)
+        except jwt.InvalidTokenError:
+            # Also covers ExpiredSignatureError
+            return None
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Verified token cache core shared by the SubscriptionPro APIs
+Remembers the claims of tokens whose signature has already been checked, so a
+token polled many times a minute is decoded once per process. Entries are
+keyed by a SHA-256 digest of the token, bounded by an LRU, expire at the
+token's own `exp` and can be revoked explicitly.
+
+This module is framework-free and stdlib-only. backend/core/token_core.py is
+the source; api/ carries a byte-identical copy (tests/test_shared_modules.py
+fails on drift). Signature checking (the jwt.decode call) and secret loading
+live in each app's token_cache.py.
+"""
+
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+def unverified_expiry(token) -> Optional[float]:
+    """The `exp` claim of a JWT without checking its signature, or None"""
+    try:
+        payload = token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return float(claims['exp'])
+    except (IndexError, KeyError, TypeError, ValueError, AttributeError):
+        return None
+
+
+class ClaimsCache:
+    """Bounded LRU of verified claims; subclasses supply decode()"""
+
+    def __init__(self, max_entries=10000, default_ttl=300):
+        self.max_entries = max_entries
+        # Lifetime for tokens that carry no `exp` claim
+        self.default_ttl = default_ttl
+
+        self._entries = OrderedDict()
+        self._revoked = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def decode(self, token) -> Optional[Dict]:
+        """Verified claims of token, or None if its signature or expiry is invalid"""
+        raise NotImplementedError
+
+    @staticmethod
+    def _digest(token):
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def verify(self, token) -> Optional[Dict]:
+        """Return the token's claims, or None if it is invalid, expired or revoked"""
+        if not token:
+            return None
+
+        digest = self._digest(token)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                claims, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(digest)
+                    self.hits += 1
+                    return dict(claims)
+                del self._entries[digest]
+
+            revoked_until = self._revoked.get(digest)
+            if revoked_until is not None:
+                if revoked_until > now:
+                    self.rejected += 1
+                    return None
+                del self._revoked[digest]
+
+            self.misses += 1
+
+        claims = self.decode(token)
+        if claims is None:
+            with self._lock:
+                self.rejected += 1
+            return None
+
+        expires_at = float(claims['exp']) if 'exp' in claims else now + self.default_ttl
+
+        with self._lock:
+            if digest not in self._revoked:
+                self._entries[digest] = (claims, expires_at)
+                self._entries.move_to_end(digest)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        return dict(claims)
+
+    def revoke(self, token, until=None):
+        """Reject token from now on; the deny entry lasts until the token expires"""
+        digest = self._digest(token)
+
+        if until is None:
+            until = unverified_expiry(token)
+            if until is None:
+                until = time.time() + self.default_ttl
+
+        with self._lock:
+            self._entries.pop(digest, None)
+            self._revoked[digest] = until
+            self._prune_revoked()
+
+    def _prune_revoked(self):
+        now = time.time()
+        for digest in [d for d, until in self._revoked.items() if until <= now]:
+            del self._revoked[digest]
+
+    def clear(self):
+        """Drop all cached claims (e.g. after rotating the signing secret)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'rejected': self.rejected,
+            'revoked': len(self._revoked),
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Request tracing and sampled profiling for the SubscriptionPro API
+Each request gets a Trace whose root span covers the whole dispatch; code on
+the request path opens child spans with `span(name)` (rate limiting, token
+verification, body parsing, Supabase calls, serialization). Span durations
+are summed per name into a Server-Timing header, and sampled traces are
+appended to TRACE_FILE as one OTLP/JSON `resourceSpans` document per line,
+which OpenTelemetry collectors and viewers can import. The current trace and
+span live in context variables; work handed to a thread pool keeps its
+parent span when submitted through `bind()`.
+
+Profiling is opt-in: a request is run under cProfile when an admin sends
+`X-Profile: 1` or with probability PROFILE_SAMPLE_RATE, and the stats are
+written to PROFILE_DIR as a .prof file (pstats format, readable by
+snakeviz, flameprof or `python -m pstats`).
+"""
+
+import contextvars
+import cProfile
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import serialization
+
+SERVICE_NAME = os.environ.get('TRACE_SERVICE_NAME', 'subscriptionpro-api')
+SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'true').lower() == 'true'
+# OTLP/JSON lines file; unset disables export
+TRACE_FILE = os.environ.get('TRACE_FILE')
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 1.0))
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.0))
+PROFILE_DIR = os.environ.get('PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'subscriptionpro-profiles')
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+_trace = contextvars.ContextVar('trace', default=None)
+_span = contextvars.ContextVar('span', default=None)
+
+
+def _new_id(bits=64) -> str:
+    return '%0*x' % (bits // 4, random.getrandbits(bits) or 1)
+
+
+class Span:
+    __slots__ = ('name', 'span_id', 'parent_id', 'kind', 'start', 'end', 'attributes', 'error')
+
+    def __init__(self, name, parent_id=None, kind=KIND_INTERNAL, attributes=None):
+        self.name = name
+        self.span_id = _new_id()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.error = None
+        self.start = time.perf_counter_ns()
+        self.end = None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter_ns()
+        return (end - self.start) / 1_000_000
+
+
+class Trace:
+    """Spans of one request, rooted at the server span"""
+
+    def __init__(self, name, traceparent=None):
+        self.trace_id = None
+        remote_parent = None
+        self.sampled = random.random() < TRACE_SAMPLE_RATE
+        # W3C traceparent: version-traceid-parentid-flags
+        parts = (traceparent or '').strip().split('-')
+        if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+            try:
+                int(parts[1], 16), int(parts[2], 16)
+                self.sampled = bool(int(parts[3], 16) & 1) or self.sampled
+                self.trace_id, remote_parent = parts[1], parts[2]
+            except ValueError:
+                pass
+        self.trace_id = self.trace_id or _new_id(128)
+
+        # Wall-clock anchor for converting perf_counter_ns readings
+        self._wall_ns = time.time_ns()
+        self.root = Span(name, remote_parent, KIND_SERVER)
+        self._perf_ns = self.root.start
+        self.spans = [self.root]
+        self.profile_id = None
+        self.tokens = None
+
+    def unix_nano(self, perf_ns) -> int:
+        return self._wall_ns + (perf_ns - self._perf_ns)
+
+    def server_timing(self) -> str:
+        """Server-Timing header value: summed duration per span name plus the total so far"""
+        totals: Dict[str, list] = {}
+        for span in self.spans[1:]:
+            entry = totals.setdefault(span.name, [0.0, 0])
+            entry[0] += span.duration_ms
+            entry[1] += 1
+        metrics = []
+        for name, (duration, count) in totals.items():
+            metric = f'{name};dur={duration:.3f}'
+            if count > 1:
+                metric += f';desc="{count} calls"'
+            metrics.append(metric)
+        metrics.append(f'total;dur={self.root.duration_ms:.3f}')
+        return ', '.join(metrics)
+
+    def to_otlp(self) -> Dict:
+        """The trace as an OTLP/JSON ExportTraceServiceRequest"""
+        spans = []
+        for span in self.spans:
+            end = span.end if span.end is not None else time.perf_counter_ns()
+            otlp_span = {
+                'traceId': self.trace_id,
+                'spanId': span.span_id,
+                'name': span.name,
+                'kind': span.kind,
+                'startTimeUnixNano': str(self.unix_nano(span.start)),
+                'endTimeUnixNano': str(self.unix_nano(end)),
+                'attributes': [_attribute(key, value) for key, value in span.attributes.items()],
+                'status': {'code': 2, 'message': span.error} if span.error else {'code': 1 if span is self.root else 0}
+            }
+            if span.parent_id:
+                otlp_span['parentSpanId'] = span.parent_id
+            spans.append(otlp_span)
+        return {
+            'resourceSpans': [{
+                'resource': {'attributes': [_attribute('service.name', SERVICE_NAME)]},
+                'scopeSpans': [{'scope': {'name': 'subscriptionpro.tracing'}, 'spans': spans}]
+            }]
+        }
+
+
+def _attribute(key, value) -> Dict:
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+class TraceExporter:
+    """Appends traces to a file as OTLP/JSON lines"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self.exported = 0
+        self.errors = 0
+
+    def export(self, trace: Trace):
+        if not self.path:
+            return
+        line = serialization.dumps(trace.to_otlp()) + b'\n'
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._file = open(self.path, 'ab')
+                self._file.write(line)
+                self._file.flush()
+                self.exported += 1
+            except OSError as e:
+                self.errors += 1
+                print(f"Trace export failed: {e}")
+
+
+exporter = TraceExporter(TRACE_FILE)
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+def start_trace(name, traceparent=None) -> Trace:
+    """Begin a trace for the current request and make it current"""
+    trace = Trace(name, traceparent)
+    trace.tokens = (_trace.set(trace), _span.set(trace.root))
+    return trace
+
+
+def finish_trace(trace: Trace, name=None, **attributes):
+    """Close the root span, export the trace if sampled, and clear the context"""
+    trace.root.end = time.perf_counter_ns()
+    if name:
+        trace.root.name = name
+    trace.root.attributes.update(attributes)
+    trace_token, span_token = trace.tokens
+    _span.reset(span_token)
+    _trace.reset(trace_token)
+    if trace.sampled:
+        exporter.export(trace)
+
+
+@contextmanager
+def span(name, kind=KIND_INTERNAL, **attributes):
+    """Time a stage of the current request; a no-op outside a trace"""
+    trace = _trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _span.get()
+    current = Span(name, parent.span_id if parent else None, kind, attributes)
+    token = _span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.error = f'{type(e).__name__}: {e}'
+        raise
+    finally:
+        current.end = time.perf_counter_ns()
+        _span.reset(token)
+        trace.spans.append(current)
+
+
+def bind(fn):
+    """fn wrapped to run in the caller's trace context on another thread"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(fn, *args, **kwargs)
+
+
+def should_profile(requested: bool) -> bool:
+    """True for an admin-requested profile or a sampled request"""
+    return requested or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE)
+
+
+@contextmanager
+def profiled(trace: Trace, label: str):
+    """Run the block under cProfile and dump the stats to PROFILE_DIR"""
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active on this thread
+        yield None
+        return
+    trace.profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{label}-{trace.trace_id[:16]}"
+    try:
+        yield trace.profile_id
+    finally:
+        profiler.disable()
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profiler.dump_stats(os.path.join(PROFILE_DIR, trace.profile_id + '.prof'))
+        except OSError as e:
+            print(f"Profile dump failed: {e}")
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Write-behind queue shared by the SubscriptionPro audit logs
+Audit records are put on a bounded in-process queue and handed to a sink by a
+background thread in batches, either when `batch_size` records are waiting or
+`flush_interval` seconds after the first one arrived. When the queue is full
+the configured policy decides whether to drop the newest record, drop the
+oldest, or block the caller for a short time. After a fork the child starts
+its own flusher with an empty queue.
+
+A batch that still fails after its retries is split in half and written
+again, down to single rows, so one bad record costs only itself: rows that
+no write accepts are counted as failed and handed to the optional
+`dead_letter` callback.
+
+This module is stdlib-only and storage-agnostic. api/write_behind.py is the
+source; backend/subscription-api/src/ carries a byte-identical copy
+(tests/test_shared_modules.py fails on drift). The root Flask apps keep no
+audit log, so backend/core/ has no copy. Sinks live in each app's audit
+module.
+"""
+
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+
+class AuditPipeline:
+    """Bounded queue of audit records flushed in batches by a daemon thread"""
+
+    def __init__(self, sink: Callable[[List[Dict]], None], max_queue=10000, batch_size=100,
+                 flush_interval=1.0, policy='drop_oldest', block_timeout=0.05, max_retries=3,
+                 dead_letter: Optional[Callable[[List[Dict]], None]] = None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown audit queue policy: {policy}")
+        self.sink = sink
+        self.dead_letter = dead_letter
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.max_retries = max_retries
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self._writing = 0
+        self._flush_waiters = 0
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.sink_errors = 0
+        self.last_flush_ms = 0.0
+
+    def _ensure_thread(self):
+        # A forked child inherits the queue but not the flusher thread
+        if self._pid != os.getpid():
+            self._queue.clear()
+            self._writing = 0
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='audit-flusher', daemon=True)
+            self._thread.start()
+
+    def log(self, record: Dict) -> bool:
+        """Queue one record; False if it was dropped"""
+        with self._cond:
+            if self._closed:
+                self.dropped += 1
+                return False
+            self._ensure_thread()
+
+            if len(self._queue) >= self.max_queue:
+                if self.policy == 'drop_newest':
+                    self.dropped += 1
+                    return False
+                if self.policy == 'drop_oldest':
+                    self._queue.popleft()
+                    self.dropped += 1
+                else:
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self._queue) >= self.max_queue:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self.dropped += 1
+                            return False
+                        self._cond.wait(remaining)
+
+            self._queue.append(record)
+            self.enqueued += 1
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+            return True
+
+    def _next_batch(self):
+        """Wait for a full batch, the flush interval, or close"""
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return None
+
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._queue) < self.batch_size and not self._closed and not self._flush_waiters:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            self._writing += len(batch)
+            # Wake producers blocked on a full queue
+            self._cond.notify_all()
+            return batch
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        rejected = []
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.sink(batch)
+                break
+            except Exception as e:
+                self.sink_errors += 1
+                if attempt == self.max_retries:
+                    print(f"Failed to write {len(batch)} audit records, retrying in parts: {e}")
+                    rejected = self._isolate(batch)
+                    break
+                time.sleep(min(0.1 * 2 ** attempt, 2.0))
+
+        if rejected:
+            print(f"Dropping {len(rejected)} audit records no write accepted")
+            self._dead_letter(rejected)
+
+        with self._cond:
+            self.failed += len(rejected)
+            if len(rejected) < len(batch):
+                self.written += len(batch) - len(rejected)
+                self.batches += 1
+                self.last_flush_ms = round((time.perf_counter() - started) * 1000, 3)
+
+    def _isolate(self, batch) -> List[Dict]:
+        """Write the halves of a failed batch once each; the rows that still fail"""
+        if len(batch) == 1:
+            return batch
+        middle = len(batch) // 2
+        rejected = []
+        for part in (batch[:middle], batch[middle:]):
+            try:
+                self.sink(part)
+            except Exception:
+                self.sink_errors += 1
+                rejected.extend(self._isolate(part))
+        return rejected
+
+    def _dead_letter(self, rows):
+        if self.dead_letter is None:
+            return
+        try:
+            self.dead_letter(rows)
+        except Exception as e:
+            print(f"Audit dead-letter sink failed: {e}")
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._write(batch)
+            finally:
+                with self._cond:
+                    self._writing -= len(batch)
+                    self._cond.notify_all()
+
+    def flush(self, timeout=5.0) -> bool:
+        """Wait until every queued record has been written; False on timeout"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            if self._thread is None or self._pid != os.getpid():
+                return not self._queue
+            self._flush_waiters += 1
+            self._cond.notify_all()
+            try:
+                while self._queue or self._writing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._flush_waiters -= 1
+        return True
+
+    def close(self, timeout=5.0) -> bool:
+        """Flush what is queued and stop the flusher thread"""
+        with self._cond:
+            if self._closed:
+                return True
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread if self._pid == os.getpid() else None
+
+        if thread is None:
+            return True
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def stats(self) -> Dict:
+        return {
+            'policy': self.policy,
+            'queued': len(self._queue),
+            'max_queue': self.max_queue,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'batches': self.batches,
+            'sink_errors': self.sink_errors,
+            'last_flush_ms': self.last_flush_ms
+        }
+
+
+def pipeline_from_env(sink: Callable[[List[Dict]], None],
+                      dead_letter: Optional[Callable[[List[Dict]], None]] = None) -> AuditPipeline:
+    """Pipeline configured from the AUDIT_* environment variables; closed at exit"""
+    pipeline = AuditPipeline(
+        sink,
+        max_queue=int(os.environ.get('AUDIT_QUEUE_SIZE', 10000)),
+        batch_size=int(os.environ.get('AUDIT_BATCH_SIZE', 100)),
+        flush_interval=float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1.0)),
+        policy=os.environ.get('AUDIT_QUEUE_POLICY', 'drop_oldest'),
+        dead_letter=dead_letter
+    )
+    atexit.register(pipeline.close)
+    return pipeline
@@ -2,8 +2,13 @@ from flask import Flask, request, jsonify
 from backend.models.subscription import Subscription
 from backend.services.billing_service import BillingService
 from backend.core.database import db
+from backend.core.compression import init_compression
+from backend.core.metrics import init_metrics, metrics_response
+from backend.core.statements import registry as statements
 
 app = Flask(__name__)
+init_compression(app)
+init_metrics(app)
 billing_service = BillingService()
 
 @app.route('/api/customer/subscriptions', methods=['GET'])
@@ -81,4 +86,8 @@ def cancel_subscription(subscription_id):
         cursor.execute("UPDATE subscriptions SET status='canceled' WHERE subscription_id=%s", (subscription_id,))
         conn.commit()
     
-    return jsonify({'status': 'canceled'})
\ No newline at end of file
+    return jsonify({'status': 'canceled'})
+
+@app.route('/api/monitoring/metrics', methods=['GET'])
+def request_metrics():
+    return metrics_response(database_pool=db.stats(), prepared_statements=statements.stats())
@@ -1,9 +1,21 @@
+import io
+
 from flask import Flask, request, jsonify
+from backend.core.auth import require_auth
 from backend.core.database import db
+from backend.core.catalog_cache import catalog_cache
+from backend.core.pagination import InvalidCursor, KeysetPage
+from backend.core.compression import init_compression
+from backend.core.metrics import init_metrics, metrics_response
+from backend.core.statements import registry as statements
+from backend.services.bulk_import import KINDS, detect_format, error_file_path, import_rows
 
 app = Flask(__name__)
+init_compression(app)
+init_metrics(app)
 
 @app.route('/api/merchant/dashboard', methods=['GET'])
+@db.read_only
 def merchant_dashboard():
     with db.get_cursor() as (cursor, conn):
         # Get subscription metrics
@@ -29,10 +41,12 @@ def merchant_dashboard():
 
 @app.route('/api/merchant/products', methods=['GET'])
 def get_products():
-    with db.get_cursor() as (cursor, conn):
-        cursor.execute("SELECT * FROM products WHERE is_active=true")
-        products = cursor.fetchall()
-        return jsonify([dict(product) for product in products])
+    def load_products():
+        with db.get_cursor() as (cursor, conn):
+            cursor.execute("SELECT * FROM products WHERE is_active=true")
+            return [dict(product) for product in cursor.fetchall()]
+
+    return catalog_cache.response(('active_products',), load_products)
 
 @app.route('/api/merchant/products', methods=['POST'])
 def create_product():
@@ -45,36 +59,48 @@ def create_product():
         
         product_id = cursor.fetchone()['product_id']
         conn.commit()
+        catalog_cache.bump()
         
         return jsonify({'product_id': product_id, 'status': 'created'})
 
 @app.route('/api/merchant/subscriptions', methods=['GET'])
+@db.read_only
 def get_merchant_subscriptions():
     status_filter = request.args.get('status', 'all')
+    try:
+        page = KeysetPage(request.args, 's.created_at', 's.subscription_id')
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    
+    conditions, params = [], []
+    if status_filter != 'all':
+        conditions.append("s.status = %s")
+        params.append(status_filter)
+    keyset, keyset_params = page.where()
+    if keyset:
+        conditions.append(keyset)
+        params.extend(keyset_params)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    order_by, limit_params = page.order_by()
     
     with db.get_cursor() as (cursor, conn):
-        if status_filter == 'all':
-            cursor.execute("""
-                SELECT s.*, p.name as product_name, u.email as customer_email
-                FROM subscriptions s
-                JOIN products p ON s.product_id = p.product_id
-                JOIN users u ON s.user_id = u.user_id
-                ORDER BY s.created_at DESC
-            """)
-        else:
-            cursor.execute("""
-                SELECT s.*, p.name as product_name, u.email as customer_email
-                FROM subscriptions s
-                JOIN products p ON s.product_id = p.product_id
-                JOIN users u ON s.user_id = u.user_id
-                WHERE s.status = %s
-                ORDER BY s.created_at DESC
-            """, (status_filter,))
+        cursor.execute(f"""
+            SELECT s.*, p.name as product_name, u.email as customer_email
+            FROM subscriptions s
+            JOIN products p ON s.product_id = p.product_id
+            JOIN users u ON s.user_id = u.user_id
+            {where}
+            {order_by}
+        """, (*params, *limit_params))
         
-        subscriptions = cursor.fetchall()
-        return jsonify([dict(sub) for sub in subscriptions])
+        subscriptions, next_cursor = page.split(cursor.fetchall(), 'created_at', 'subscription_id')
+        response = jsonify([dict(sub) for sub in subscriptions])
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
 
 @app.route('/api/merchant/analytics/revenue', methods=['GET'])
+@db.read_only
 def revenue_analytics():
     period = request.args.get('period', '30')  # days
     
@@ -92,6 +118,7 @@ def revenue_analytics():
         return jsonify([dict(row) for row in revenue_data])
 
 @app.route('/api/merchant/analytics/churn', methods=['GET'])
+@db.read_only
 def churn_analytics():
     with db.get_cursor() as (cursor, conn):
         cursor.execute("""
@@ -106,4 +133,31 @@ def churn_analytics():
         """)
         
         churn_data = cursor.fetchall()
-        return jsonify([dict(row) for row in churn_data])
\ No newline at end of file
+        return jsonify([dict(row) for row in churn_data])
+
+@app.route('/api/merchant/import/<kind>', methods=['POST'])
+@require_auth(['admin'])
+def bulk_import(kind):
+    # Body is the raw CSV/NDJSON stream, or a multipart upload in the 'file' field
+    if kind not in KINDS:
+        return jsonify({'error': f"Unknown import kind (expected {', '.join(KINDS)})"}), 404
+
+    upload = request.files.get('file')
+    if upload:
+        fmt = request.args.get('format') or detect_format(upload.filename, upload.content_type)
+        body = upload.stream
+    else:
+        fmt = request.args.get('format') or detect_format(content_type=request.content_type)
+        body = request.stream
+    stream = io.TextIOWrapper(body, encoding='utf-8-sig', newline='')
+
+    try:
+        report = import_rows(kind, stream, fmt, on_conflict=request.args.get('on_conflict', 'update'),
+                             error_file=error_file_path(kind))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(report.to_dict())
+
+@app.route('/api/monitoring/metrics', methods=['GET'])
+def request_metrics():
+    return metrics_response(database_pool=db.stats(), prepared_statements=statements.stats())
@@ -0,0 +1,72 @@
+import argparse
+import gc
+import json
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from backend.models.subscription import Subscription
+from backend.models.subscription_batch import FREQUENCIES, SubscriptionBatch, SubscriptionRow
+
+# Run with: python -m backend.benchmarks.subscription_memory --rows 1000000
+# (allocations are traced, so 1M rows takes several minutes)
+
+
+def generate_rows(count):
+    # Shaped like RealDictCursor rows from the subscriptions table
+    start = datetime(2025, 1, 1)
+    for i in range(count):
+        yield {
+            'subscription_id': str(uuid.UUID(int=i + 1)),
+            'user_id': str(uuid.UUID(int=(i % 50000) + 1)),
+            'product_id': str(uuid.UUID(int=(i % 40) + 1)),
+            'status': 'active',
+            'frequency': FREQUENCIES[i % len(FREQUENCIES)],
+            'amount': Decimal(299 + i % 1000) / 100 + 10,
+            'next_billing_date': start + timedelta(minutes=i)
+        }
+
+
+def measure(build, count):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        held = build(generate_rows(count))
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del held
+    return {
+        'bytes': current,
+        'peak_bytes': peak,
+        'bytes_per_row': round(current / count, 1),
+        'mb_per_million_rows': round(current / count * 1_000_000 / (1024 * 1024), 1)
+    }
+
+
+CANDIDATES = {
+    'Subscription': lambda rows: [Subscription(**row) for row in rows],
+    'SubscriptionRow': lambda rows: [SubscriptionRow(**row) for row in rows],
+    'SubscriptionBatch': SubscriptionBatch.from_rows,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Memory held per subscription representation')
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--only', choices=sorted(CANDIDATES), action='append')
+    args = parser.parse_args(argv)
+
+    results = {name: measure(CANDIDATES[name], args.rows) for name in args.only or CANDIDATES}
+    baseline = results.get('Subscription')
+    if baseline:
+        for result in results.values():
+            result['vs_subscription'] = round(result['bytes'] / baseline['bytes'], 3)
+    print(json.dumps({'rows': args.rows, 'results': results}, indent=2))
+    return results
+
+
+if __name__ == '__main__':
+    main()
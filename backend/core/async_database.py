@@ -0,0 +1,78 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+try:
+    from psycopg.rows import dict_row
+    from psycopg_pool import AsyncConnectionPool
+except ImportError:
+    dict_row = None
+    AsyncConnectionPool = None
+
+
+class AsyncDatabase:
+    # asyncio counterpart of Database: psycopg 3 (same %s placeholders as psycopg2)
+    # behind an AsyncConnectionPool, with the same get_cursor() -> (cursor, conn) shape
+
+    def __init__(self, connection_string=None, **pool_options):
+        self.connection_string = connection_string or os.environ.get('DATABASE_URL', 'postgresql://localhost/subscriptionpro')
+        self.pool_options = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+            'max_size': int(os.environ.get('ASYNC_DB_POOL_MAX_SIZE', 20)),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+            'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+            'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+        }
+        self.pool_options.update(pool_options)
+        self._pool = None
+        self._loop = None
+        self._lock = None
+
+    def _create_pool(self):
+        if AsyncConnectionPool is None:
+            raise RuntimeError('AsyncDatabase requires psycopg[pool] (psycopg 3)')
+        return AsyncConnectionPool(self.connection_string, open=False, **self.pool_options)
+
+    async def get_pool(self):
+        # A pool belongs to the event loop that opened it
+        loop = asyncio.get_running_loop()
+        if self._pool is not None and self._loop is loop:
+            return self._pool
+        if self._lock is None or self._loop is not loop:
+            self._lock, self._loop, self._pool = asyncio.Lock(), loop, None
+        async with self._lock:
+            if self._pool is None:
+                pool = self._create_pool()
+                await pool.open()
+                self._pool = pool
+        return self._pool
+
+    @asynccontextmanager
+    async def get_connection(self):
+        pool = await self.get_pool()
+        conn = await pool.getconn()
+        try:
+            yield conn
+        finally:
+            # Like Database, uncommitted work is rolled back when the connection goes back
+            await pool.putconn(conn)
+
+    @asynccontextmanager
+    async def get_cursor(self):
+        async with self.get_connection() as conn:
+            cursor = conn.cursor(row_factory=dict_row)
+            try:
+                yield cursor, conn
+            finally:
+                await cursor.close()
+
+    def stats(self):
+        return self._pool.get_stats() if self._pool is not None else {}
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+async_db = AsyncDatabase()
@@ -5,12 +5,19 @@ from datetime import datetime, timedelta
 from functools import wraps
 from flask import request, jsonify
 from backend.core.database import db
+from backend.core.statements import registry
+from backend.core.token_cache import VerifiedTokenCache
+
+USER_BY_EMAIL = registry.register(
+    'user_login_by_email', "SELECT user_id, password_hash, user_role FROM users WHERE email=%s")
 
 class AuthService:
     def __init__(self):
         self.secret_key = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
         self.algorithm = 'HS256'
         self.token_expiry = timedelta(hours=24)
+        self.token_cache = VerifiedTokenCache(self.secret_key, [self.algorithm],
+                                              max_entries=int(os.environ.get('JWT_CACHE_SIZE', 10000)))
     
     def hash_password(self, password):
         return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
@@ -28,17 +35,14 @@ class AuthService:
         return jwt.encode(payload, self.secret_key, algorithm=self.algorithm)
     
     def verify_token(self, token):
-        try:
-            payload = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
-            return payload
-        except jwt.ExpiredSignatureError:
-            return None
-        except jwt.InvalidTokenError:
-            return None
+        return self.token_cache.verify(token)
+
+    def revoke_token(self, token):
+        self.token_cache.revoke(token)
     
     def authenticate_user(self, email, password):
         with db.get_cursor() as (cursor, conn):
-            cursor.execute("SELECT user_id, password_hash, user_role FROM users WHERE email=%s", (email,))
+            USER_BY_EMAIL.execute(cursor, (email,))
             user = cursor.fetchone()
             
             if user and self.verify_password(password, user['password_hash']):
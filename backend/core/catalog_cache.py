@@ -0,0 +1,39 @@
+from flask import current_app, jsonify, request
+
+from backend.core import catalog_core, compression
+from backend.core.catalog_core import CatalogEntry, etag_matches, strong_etag
+
+# Flask side of the shared catalog_core cache; backend/subscription-api/src/catalog_cache.py
+# is the same adapter for that app and must keep the same interface
+
+
+class CatalogCache(catalog_core.CatalogCache):
+    """Serialized product listings keyed by filters; any product write bumps the version and empties it."""
+
+    def response(self, key, loader):
+        entry = self.get(key)
+        cache_state = 'HIT'
+        if entry is None:
+            cache_state = 'MISS'
+            version = self.version
+            entry = self.put(key, version, jsonify(loader()).get_data())
+
+        # Compressed once per entry and coding, reused until the next bump
+        coding = compression.negotiate(request.headers.get('Accept-Encoding'), len(entry.body))
+        body, etag = entry.encoded(coding, compression.compress)
+
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            self.not_modified += 1
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.response_class(body, mimetype='application/json')
+            if coding:
+                response.headers['Content-Encoding'] = coding
+        response.vary.add('Accept-Encoding')
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Cache'] = cache_state
+        return response
+
+
+catalog_cache = CatalogCache()
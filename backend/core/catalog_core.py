@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Product catalog cache core shared by the SubscriptionPro APIs
+Serialized catalog responses are kept per filter key together with a strong
+ETag (a hash of the body). Every product write bumps the catalog version,
+which drops all cached responses; a response computed under an older version
+is never stored. Entries also expire after `ttl` seconds, which bounds how
+long another process can serve a catalog that was changed elsewhere.
+Compressed variants are produced once per coding and kept with the entry.
+
+This module is framework-free and stdlib-only. backend/core/catalog_core.py is
+the source; api/ and backend/subscription-api/src/ carry byte-identical copies
+(tests/test_shared_modules.py fails on drift). Serving a cached listing with
+304 revalidation lives in each app's handler or Flask adapter.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+CATALOG_CACHE_TTL = float(os.environ.get('CATALOG_CACHE_TTL', 60))
+CATALOG_CACHE_SIZE = int(os.environ.get('CATALOG_CACHE_SIZE', 256))
+
+
+def strong_etag(body: bytes) -> str:
+    """Strong ETag for a response body"""
+    return '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+
+
+def _base_etag(tag: str) -> str:
+    """Strip the weak prefix and any content-coding suffix from an ETag"""
+    tag = tag.strip()
+    if tag.startswith('W/'):
+        tag = tag[2:]
+    if tag.endswith('"') and '-' in tag:
+        tag = tag[:tag.rindex('-')] + '"'
+    return tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True if an If-None-Match header matches etag in any content coding"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    etag = _base_etag(etag)
+    return any(_base_etag(candidate) == etag for candidate in if_none_match.split(','))
+
+
+class CatalogEntry:
+    """One cached response body and its compressed variants"""
+
+    __slots__ = ('body', 'etag', 'version', 'created', 'variants')
+
+    def __init__(self, body, version, created):
+        self.body = body
+        self.etag = strong_etag(body)
+        self.version = version
+        self.created = created
+        self.variants = {}
+
+    def encoded(self, coding: Optional[str], compress: Callable[[bytes, str], bytes]) -> Tuple[bytes, str]:
+        """(body, etag) in the given content coding, compressed with compress on first use"""
+        if coding is None:
+            return self.body, self.etag
+        variant = self.variants.get(coding)
+        if variant is None:
+            # Each coding is a separate representation with its own strong ETag
+            variant = (compress(self.body, coding), f'{self.etag[:-1]}-{coding}"')
+            self.variants[coding] = variant
+        return variant
+
+
+class CatalogCache:
+    """Versioned LRU of serialized catalog responses"""
+
+    def __init__(self, ttl=CATALOG_CACHE_TTL, max_entries=CATALOG_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.bumps = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self, key, now=None) -> Optional[CatalogEntry]:
+        """Cached entry for key, or None when missing, expired or outdated"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.version != self._version or now - entry.created >= self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, version, body: bytes, now=None) -> CatalogEntry:
+        """Store body computed under version; not cached if a write happened since"""
+        now = time.monotonic() if now is None else now
+        entry = CatalogEntry(body, version, now)
+        with self._lock:
+            if version != self._version:
+                return entry
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def bump(self) -> int:
+        """Invalidate every cached response after a catalog write"""
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self.bumps += 1
+            return self._version
+
+    def stats(self) -> Dict:
+        return {
+            'version': self._version,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'not_modified': self.not_modified,
+            'bumps': self.bumps
+        }
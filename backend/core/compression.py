@@ -0,0 +1,37 @@
+from flask import request
+
+from backend.core.content_coding import COMPRESSION_ENABLED, compress, compress_stream, negotiate
+
+# Flask hook over the shared content_coding core; backend/subscription-api/src/compression.py
+# is the same adapter for that app and must keep the same functions and signatures
+COMPRESSIBLE_TYPES = ('application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript')
+
+
+def compress_response(response):
+    if not COMPRESSION_ENABLED or response.status_code < 200 or response.status_code in (204, 304):
+        return response
+    if response.direct_passthrough or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    accept_encoding = request.headers.get('Accept-Encoding')
+
+    if response.is_streamed:
+        coding = negotiate(accept_encoding)
+        if coding:
+            response.response = compress_stream(response.response, coding)
+            response.headers['Content-Encoding'] = coding
+            response.headers.pop('Content-Length', None)
+        return response
+
+    body = response.get_data()
+    coding = negotiate(accept_encoding, len(body))
+    if coding:
+        response.set_data(compress(body, coding))
+        response.headers['Content-Encoding'] = coding
+    return response
+
+
+def init_compression(app):
+    app.after_request(compress_response)
+    return app
@@ -1,27 +1,232 @@
+import contextvars
+import itertools
 import os
+import threading
+import time
 import psycopg2
+from psycopg2.extensions import parse_dsn
 from psycopg2.extras import RealDictCursor
 from contextlib import contextmanager
+from functools import wraps
+
+from backend.core.pool import ConnectionPool, PoolTimeout
+
+# Seconds of replay lag after which a replica stops taking reads
+REPLICA_MAX_LAG = float(os.environ.get('DB_REPLICA_MAX_LAG', 10))
+REPLICA_CHECK_INTERVAL = float(os.environ.get('DB_REPLICA_CHECK_INTERVAL', 5))
+
+# 0 when the server is not a standby (e.g. a plain second Postgres standing in locally)
+REPLICA_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+# Set by Database.read_only for the duration of a read-only endpoint
+_read_only = contextvars.ContextVar('database_read_only', default=False)
+
+
+def _target_name(connection_string):
+    # host:port/dbname, never the credentials
+    try:
+        dsn = parse_dsn(connection_string)
+    except psycopg2.ProgrammingError:
+        return 'replica'
+    return f"{dsn.get('host', 'localhost')}:{dsn.get('port', 5432)}/{dsn.get('dbname', '')}"
+
+
+class Replica:
+    def __init__(self, connection_string, pool):
+        self.connection_string = connection_string
+        self.name = _target_name(connection_string)
+        self.pool = pool
+        self.lag = None
+        self.healthy = True
+        self.checked = None
+        self.reads = 0
+        self.errors = 0
+        self._check_lock = threading.Lock()
+
+    def available(self, max_lag):
+        return self.healthy and self.lag is not None and self.lag <= max_lag
+
+    def mark_failed(self):
+        # Out of rotation until the next lag check succeeds
+        self.healthy = False
+        self.errors += 1
+
+    def stats(self):
+        return dict(self.pool.stats(), name=self.name, healthy=self.healthy, reads=self.reads, errors=self.errors,
+                    lag_seconds=round(self.lag, 3) if self.lag is not None else None)
+
 
 class Database:
-    def __init__(self):
-        self.connection_string = os.environ.get('DATABASE_URL', 'postgresql://localhost/subscriptionpro')
+    def __init__(self, connection_string=None, replica_urls=None, max_replica_lag=REPLICA_MAX_LAG,
+                 replica_check_interval=REPLICA_CHECK_INTERVAL, **pool_options):
+        self.connection_string = connection_string or os.environ.get('DATABASE_URL', 'postgresql://localhost/subscriptionpro')
+        options = {
+            'min_size': int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+            'max_size': int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 5)),
+            'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+            'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+        }
+        options.update(pool_options)
+        self.pool = ConnectionPool(self._connect, **options)
+
+        if replica_urls is None:
+            replica_urls = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+        self.replicas = [
+            Replica(url, ConnectionPool(lambda url=url: self._connect_replica(url), **options))
+            for url in replica_urls
+        ]
+        self.max_replica_lag = max_replica_lag
+        self.replica_check_interval = replica_check_interval
+        self._next_replica = itertools.count()
+        self.primary_reads = 0
+        self.fallbacks = 0
+        # Rows fetched per round trip when iterating a server-side cursor
+        self.itersize = int(os.environ.get('DB_ITERSIZE', 2000))
+        self._cursor_names = itertools.count(1)
+
+    def _connect(self):
+        return psycopg2.connect(self.connection_string)
+
+    def _connect_replica(self, connection_string):
+        conn = psycopg2.connect(connection_string)
+        # Writes routed here by mistake fail instead of diverging from the primary
+        conn.set_session(readonly=True)
+        return conn
+
+    def _check_lag(self, replica):
+        now = time.monotonic()
+        if replica.checked is not None and now - replica.checked < self.replica_check_interval:
+            return
+        # One thread measures; the rest keep using the last reading
+        if not replica._check_lock.acquire(blocking=False):
+            return
+        try:
+            replica.checked = now
+            conn = replica.pool.getconn(timeout=1.0)
+            discard = False
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(REPLICA_LAG_SQL)
+                    replica.lag = float(cursor.fetchone()[0])
+                conn.rollback()
+                replica.healthy = True
+            except psycopg2.Error:
+                discard = True
+                raise
+            finally:
+                replica.pool.putconn(conn, discard=discard)
+        except (psycopg2.Error, PoolTimeout):
+            replica.mark_failed()
+        finally:
+            replica._check_lock.release()
+
+    def _pick_replica(self):
+        for replica in self.replicas:
+            self._check_lag(replica)
+        candidates = [replica for replica in self.replicas if replica.available(self.max_replica_lag)]
+        if not candidates:
+            return None
+        return candidates[next(self._next_replica) % len(candidates)]
+
+    def _checkout(self, readonly):
+        # Reads go to a replica within the lag budget, anything else to the primary
+        if readonly and self.replicas:
+            replica = self._pick_replica()
+            if replica is not None:
+                try:
+                    conn = replica.pool.getconn()
+                    replica.reads += 1
+                    return replica, conn
+                except (psycopg2.Error, PoolTimeout):
+                    replica.mark_failed()
+            self.fallbacks += 1
+        if readonly:
+            self.primary_reads += 1
+        return None, self.pool.getconn()
     
     @contextmanager
-    def get_connection(self):
-        conn = psycopg2.connect(self.connection_string)
+    def get_connection(self, readonly=None):
+        # readonly=None follows the enclosing read_only endpoint, if any
+        replica, conn = self._checkout(_read_only.get() if readonly is None else readonly)
+        pool = replica.pool if replica else self.pool
+        discard = False
         try:
             yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # The connection itself may be broken; never hand it out again
+            discard = True
+            if replica:
+                replica.mark_failed()
+            raise
         finally:
-            conn.close()
+            # Uncommitted work is rolled back when the connection is returned
+            pool.putconn(conn, discard=discard)
+
+    def read_only(self, fn):
+        # Cursors opened inside fn without an explicit readonly= go to a replica
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = _read_only.set(True)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _read_only.reset(token)
+        return wrapper
     
     @contextmanager
-    def get_cursor(self):
-        with self.get_connection() as conn:
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
+    def get_cursor(self, name=None, itersize=None, readonly=None):
+        with self.get_connection(readonly) as conn:
+            if name:
+                # Named cursors are server-side: rows are fetched itersize at a time
+                cursor = conn.cursor(name=name, cursor_factory=RealDictCursor)
+                cursor.itersize = itersize or self.itersize
+            else:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
             try:
                 yield cursor, conn
             finally:
                 cursor.close()
 
-db = Database()
\ No newline at end of file
+    def _cursor_name(self):
+        return f'stream_{os.getpid()}_{next(self._cursor_names)}'
+
+    def iter_rows(self, sql, params=None, itersize=None):
+        # Holds a pooled connection until the generator is exhausted or closed
+        with self.get_cursor(self._cursor_name(), itersize) as (cursor, conn):
+            cursor.execute(sql, params)
+            yield from cursor
+
+    def iter_batches(self, sql, params=None, size=1000):
+        with self.get_cursor(self._cursor_name()) as (cursor, conn):
+            cursor.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(size)
+                if not rows:
+                    break
+                yield rows
+
+    def stats(self):
+        # Primary pool figures at the top level, one entry per replica next to them
+        stats = self.pool.stats()
+        if self.replicas:
+            stats['replicas'] = [replica.stats() for replica in self.replicas]
+            stats['routing'] = {
+                'replica_reads': sum(replica.reads for replica in self.replicas),
+                'primary_reads': self.primary_reads,
+                'fallbacks': self.fallbacks,
+                'max_lag_seconds': self.max_replica_lag
+            }
+        return stats
+
+    def close(self):
+        self.pool.close()
+        for replica in self.replicas:
+            replica.pool.close()
+
+db = Database()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Keyset pagination core shared by the SubscriptionPro APIs
+A cursor is the sort key of the last row on a page, encoded as an opaque
+URL-safe token. The next page starts strictly after that key, so fetching
+page N costs the same as fetching page 1. Pages are read with one extra row
+to tell whether another page exists.
+
+This module is framework-free and stdlib-only. backend/core/keyset.py is the
+source; api/ and backend/subscription-api/src/ carry byte-identical copies
+(tests/test_shared_modules.py fails on drift). Query building for PostgREST,
+SQL and SQLAlchemy lives in each app's pagination.py.
+"""
+
+import base64
+import json
+import os
+
+DEFAULT_PAGE_SIZE = 50
+# Upper bound for client-supplied page sizes
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 200))
+
+
+class InvalidCursor(ValueError):
+    """Cursor could not be decoded or does not fit the requested ordering"""
+
+
+def _json_default(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def encode_cursor(*values) -> str:
+    """Encode the sort key of the last row on a page"""
+    raw = json.dumps(list(values), separators=(',', ':'), default=_json_default).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor, size=None) -> list:
+    """Decode a cursor produced by encode_cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}")
+
+    if not isinstance(values, list) or (size is not None and len(values) != size):
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+def query_value(args, name, default=None):
+    """First value of a query parameter, from parse_qs output or a Flask MultiDict"""
+    value = args.get(name)
+    if isinstance(value, list):
+        value = value[0] if value else None
+    return default if value is None else value
+
+
+def page_size(args, default=DEFAULT_PAGE_SIZE, maximum=None) -> int:
+    """Requested page size (`limit` or `per_page`), clamped to 1..maximum"""
+    maximum = MAX_PAGE_SIZE if maximum is None else maximum
+    raw = query_value(args, 'limit') or query_value(args, 'per_page')
+    try:
+        size = int(raw) if raw is not None else default
+    except ValueError:
+        size = default
+    return max(1, min(size, maximum))
+
+
+def split_page(rows, limit, key):
+    """(rows, next_cursor) from `limit + 1` fetched rows; key(row) is the row's sort key"""
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
@@ -0,0 +1,29 @@
+from backend.core.keyset import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, decode_cursor, encode_cursor, page_size, query_value, split_page
+)
+
+# SQL side of the shared keyset core; api/pagination.py (PostgREST) and
+# backend/subscription-api/src/pagination.py (SQLAlchemy) build the same pages
+
+
+class KeysetPage:
+    """Newest-first page over (sort_column, id_column); the cursor is the last row's key pair."""
+
+    def __init__(self, args, sort_column, id_column):
+        self.sort_column = sort_column
+        self.id_column = id_column
+        self.limit = page_size(args)
+        cursor = query_value(args, 'cursor')
+        self.after = decode_cursor(cursor, size=2) if cursor else None
+
+    def where(self):
+        # Row comparison lets Postgres walk the (sort, id) index from the cursor
+        if self.after is None:
+            return None, ()
+        return f"({self.sort_column}, {self.id_column}) < (%s, %s)", tuple(self.after)
+
+    def order_by(self):
+        return f"ORDER BY {self.sort_column} DESC, {self.id_column} DESC LIMIT %s", (self.limit + 1,)
+
+    def split(self, rows, sort_key, id_key):
+        return split_page(rows, self.limit, lambda row: (row[sort_key], row[id_key]))
@@ -0,0 +1,207 @@
+import os
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class _Slot:
+    __slots__ = ('conn', 'created', 'last_used')
+
+    def __init__(self, conn, now):
+        self.conn = conn
+        self.created = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    # Idle connections are reused newest-first, so surplus ones age out and get reaped
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=5.0, max_lifetime=1800.0,
+                 max_idle=300.0, ping_after=30.0):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError('Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1')
+        self.connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        # Connections idle longer than this are pinged before being handed out
+        self.ping_after = ping_after
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._reset_state()
+
+    def _reset_state(self):
+        self._pid = os.getpid()
+        self._idle = deque()
+        self._in_use = {}
+        self._size = 0
+        self._waiting = 0
+        self.created = 0
+        self.closed = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.failed_checks = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _check_fork(self):
+        # Sockets inherited from a parent process must not be shared with it
+        if self._pid != os.getpid():
+            self._lock = threading.Lock()
+            self._available = threading.Condition(self._lock)
+            self._reset_state()
+
+    def getconn(self, timeout=None):
+        self._check_fork()
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            slot = None
+            with self._available:
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(f'No database connection available within {timeout}s '
+                                          f'({self._size}/{self.max_size} in use)')
+                    self._waiting += 1
+                    try:
+                        self._available.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+                if self._idle:
+                    slot = self._idle.pop()
+                else:
+                    # Reserve the slot now, connect outside the lock
+                    self._size += 1
+
+            if slot is None:
+                try:
+                    slot = _Slot(self.connect(), time.monotonic())
+                except Exception:
+                    with self._available:
+                        self._size -= 1
+                        self._available.notify()
+                    raise
+                self.created += 1
+            elif not self._usable(slot):
+                self._discard(slot)
+                continue
+
+            waited = time.monotonic() - start
+            with self._lock:
+                self._in_use[id(slot.conn)] = slot
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+            return slot.conn
+
+    def putconn(self, conn, discard=False):
+        self._check_fork()
+        now = time.monotonic()
+        with self._lock:
+            slot = self._in_use.pop(id(conn), None)
+        if slot is None:
+            # Checked out before a fork; closing it would end the parent's session
+            return
+
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        if discard or conn.closed or now - slot.created >= self.max_lifetime:
+            self._discard(slot)
+            return
+
+        slot.last_used = now
+        with self._available:
+            self._idle.append(slot)
+            self._available.notify()
+        self.reap(now)
+
+    def _usable(self, slot):
+        now = time.monotonic()
+        conn = slot.conn
+        if conn.closed or now - slot.created >= self.max_lifetime:
+            return False
+        if now - slot.last_used < self.ping_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            self.failed_checks += 1
+            return False
+
+    def _discard(self, slot):
+        try:
+            slot.conn.close()
+        except psycopg2.Error:
+            pass
+        with self._available:
+            self._size -= 1
+            self.closed += 1
+            self._available.notify()
+
+    def reap(self, now=None):
+        # Close connections idle past max_idle, keeping min_size open
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self._lock:
+            while self._idle and self._size - len(expired) > self.min_size:
+                oldest = self._idle[0]
+                if now - oldest.last_used < self.max_idle and now - oldest.created < self.max_lifetime:
+                    break
+                expired.append(self._idle.popleft())
+        for slot in expired:
+            self._discard(slot)
+        return len(expired)
+
+    def warm(self):
+        # Open connections up to min_size ahead of the first request
+        conns = [self.getconn() for _ in range(self.min_size)]
+        for conn in conns:
+            self.putconn(conn)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for slot in idle:
+            self._discard(slot)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'waiting': self._waiting,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'created': self.created,
+                'closed': self.closed,
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'failed_checks': self.failed_checks,
+                'wait_ms': {
+                    'total': round(self.wait_total * 1000, 3),
+                    'max': round(self.wait_max * 1000, 3),
+                    'avg': round(self.wait_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0
+                }
+            }
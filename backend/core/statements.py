@@ -0,0 +1,164 @@
+import os
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from psycopg2 import errors, extensions
+
+PREPARED_STATEMENTS_ENABLED = os.environ.get('PREPARED_STATEMENTS_ENABLED', 'true').lower() == 'true'
+# Statements kept prepared per connection; the least recently used is deallocated
+PREPARED_STATEMENT_CACHE_SIZE = int(os.environ.get('PREPARED_STATEMENT_CACHE_SIZE', 32))
+
+_PLACEHOLDER = re.compile(r'%(%|s|\()')
+
+
+def to_server_params(sql):
+    # psycopg2 %s placeholders -> $1..$n for PREPARE; returns (sql, parameter count)
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        if match.group(1) == '%':
+            return '%'
+        if match.group(1) == '(':
+            raise ValueError('Prepared statements take positional %s parameters only')
+        count += 1
+        return f'${count}'
+
+    return _PLACEHOLDER.sub(replace, sql), count
+
+
+class Statement:
+    __slots__ = ('registry', 'name', 'sql', 'server_sql', 'param_count',
+                 'calls', 'prepares', 'total_time', 'max_time')
+
+    def __init__(self, registry, name, sql):
+        self.registry = registry
+        self.name = name
+        self.sql = sql
+        self.server_sql, self.param_count = to_server_params(sql)
+        self.calls = 0
+        self.prepares = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def execute(self, cursor, params=()):
+        return self.registry.execute(cursor, self, params)
+
+
+class StatementRegistry:
+    # Named statements are prepared lazily on each connection that runs them and
+    # then sent as EXECUTE, so Postgres parses and plans them once per session
+
+    def __init__(self, max_per_connection=PREPARED_STATEMENT_CACHE_SIZE, enabled=PREPARED_STATEMENTS_ENABLED):
+        self.max_per_connection = max_per_connection
+        self.enabled = enabled
+        self._statements = {}
+        # connection -> OrderedDict of prepared names; a reconnect is a new key
+        self._prepared = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.reprepares = 0
+
+    def register(self, name, sql):
+        with self._lock:
+            existing = self._statements.get(name)
+            if existing is not None:
+                if existing.sql != sql:
+                    raise ValueError(f'Statement {name!r} is already registered with different SQL')
+                return existing
+            statement = self._statements[name] = Statement(self, name, sql)
+            return statement
+
+    def _cache(self, conn):
+        with self._lock:
+            cache = self._prepared.get(conn)
+            if cache is None:
+                cache = self._prepared[conn] = OrderedDict()
+            return cache
+
+    def _prepare(self, cursor, statement, cache):
+        cursor.execute(f'PREPARE {statement.name} AS {statement.server_sql}')
+        statement.prepares += 1
+        cache[statement.name] = True
+        while len(cache) > self.max_per_connection:
+            oldest, _ = cache.popitem(last=False)
+            cursor.execute(f'DEALLOCATE {oldest}')
+            self.evictions += 1
+
+    def _execute_prepared(self, cursor, statement, params):
+        conn = cursor.connection
+        cache = self._cache(conn)
+        if statement.name in cache:
+            cache.move_to_end(statement.name)
+        else:
+            self._prepare(cursor, statement, cache)
+
+        if statement.param_count:
+            placeholders = ', '.join(['%s'] * statement.param_count)
+            cursor.execute(f'EXECUTE {statement.name} ({placeholders})', params)
+        else:
+            cursor.execute(f'EXECUTE {statement.name}')
+
+    def execute(self, cursor, statement, params=()):
+        if len(params) != statement.param_count:
+            raise ValueError(f'Statement {statement.name!r} takes {statement.param_count} parameters, got {len(params)}')
+
+        start = time.perf_counter()
+        try:
+            if not self.enabled:
+                cursor.execute(statement.sql, params)
+                return cursor
+            conn = cursor.connection
+            idle = conn.get_transaction_status() == extensions.TRANSACTION_STATUS_IDLE
+            try:
+                self._execute_prepared(cursor, statement, params)
+            except (errors.InvalidSqlStatementName, errors.DuplicatePreparedStatement):
+                # The session lost or already holds our statements (e.g. DISCARD ALL
+                # behind a proxy); forget what we knew about this connection
+                self.forget(conn)
+                if not idle:
+                    raise
+                # Nothing else ran in the aborted transaction, so it is safe to retry
+                conn.rollback()
+                cursor.execute('DEALLOCATE ALL')
+                self.reprepares += 1
+                self._execute_prepared(cursor, statement, params)
+            return cursor
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                statement.calls += 1
+                statement.total_time += elapsed
+                statement.max_time = max(statement.max_time, elapsed)
+
+    def forget(self, conn):
+        # For connections whose session state was reset outside the registry
+        with self._lock:
+            self._prepared.pop(conn, None)
+
+    def stats(self):
+        with self._lock:
+            statements = {
+                name: {
+                    'calls': s.calls,
+                    'prepares': s.prepares,
+                    'total_ms': round(s.total_time * 1000, 3),
+                    'avg_ms': round(s.total_time * 1000 / s.calls, 3) if s.calls else 0.0,
+                    'max_ms': round(s.max_time * 1000, 3)
+                }
+                for name, s in sorted(self._statements.items())
+            }
+            return {
+                'enabled': self.enabled,
+                'max_per_connection': self.max_per_connection,
+                'connections': len(self._prepared),
+                'evictions': self.evictions,
+                'reprepares': self.reprepares,
+                'statements': statements
+            }
+
+
+registry = StatementRegistry()
@@ -0,0 +1,21 @@
+import jwt
+
+from backend.core.token_core import ClaimsCache
+
+
+class VerifiedTokenCache(ClaimsCache):
+    """Verified JWT claims keyed by token hash; each token is decoded once per process.
+
+    PyJWT binding of the shared token_core cache, same as api/token_cache.py.
+    """
+
+    def __init__(self, secret, algorithms=('HS256',), max_entries=10000, default_ttl=300):
+        super().__init__(max_entries=max_entries, default_ttl=default_ttl)
+        self.secret = secret
+        self.algorithms = list(algorithms)
+
+    def decode(self, token):
+        try:
+            return jwt.decode(token, self.secret, algorithms=self.algorithms)
+        except jwt.InvalidTokenError:
+            return None
@@ -1,5 +1,25 @@
 from datetime import datetime, timedelta
 from backend.core.database import db
+from backend.core.async_database import async_db
+from backend.core.statements import registry
+
+UPDATE_SQL = """
+    UPDATE subscriptions SET status=%s, frequency=%s, amount=%s, 
+    next_billing_date=%s WHERE subscription_id=%s
+"""
+INSERT_SQL = """
+    INSERT INTO subscriptions (user_id, product_id, status, frequency, amount, next_billing_date)
+    VALUES (%s, %s, %s, %s, %s, %s) RETURNING subscription_id
+"""
+BY_USER_SQL = "SELECT * FROM subscriptions WHERE user_id=%s"
+ACTIVE_SQL = "SELECT * FROM subscriptions WHERE status='active'"
+NEXT_BILLING_SQL = "UPDATE subscriptions SET next_billing_date=%s WHERE subscription_id=%s"
+
+# Hot paths run as prepared statements on the sync pool
+UPDATE_STATEMENT = registry.register('subscription_update', UPDATE_SQL)
+INSERT_STATEMENT = registry.register('subscription_insert', INSERT_SQL)
+BY_USER_STATEMENT = registry.register('subscriptions_by_user', BY_USER_SQL)
+NEXT_BILLING_STATEMENT = registry.register('subscription_next_billing', NEXT_BILLING_SQL)
 
 class Subscription:
     def __init__(self, subscription_id=None, user_id=None, product_id=None, 
@@ -20,30 +40,70 @@ class Subscription:
         elif self.frequency == 'quarterly':
             return datetime.now() + timedelta(days=90)
         return datetime.now() + timedelta(days=365)
+
+    def _update_params(self):
+        return (self.status, self.frequency, self.amount, self.next_billing_date, self.subscription_id)
+
+    def _insert_params(self):
+        return (self.user_id, self.product_id, self.status, self.frequency, self.amount, self.next_billing_date)
     
     def save(self):
         with db.get_cursor() as (cursor, conn):
             if self.subscription_id:
-                cursor.execute("""
-                    UPDATE subscriptions SET status=%s, frequency=%s, amount=%s, 
-                    next_billing_date=%s WHERE subscription_id=%s
-                """, (self.status, self.frequency, self.amount, self.next_billing_date, self.subscription_id))
+                UPDATE_STATEMENT.execute(cursor, self._update_params())
             else:
-                cursor.execute("""
-                    INSERT INTO subscriptions (user_id, product_id, status, frequency, amount, next_billing_date)
-                    VALUES (%s, %s, %s, %s, %s, %s) RETURNING subscription_id
-                """, (self.user_id, self.product_id, self.status, self.frequency, self.amount, self.next_billing_date))
+                INSERT_STATEMENT.execute(cursor, self._insert_params())
                 self.subscription_id = cursor.fetchone()['subscription_id']
             conn.commit()
     
+    @classmethod
+    def set_next_billing_date(cls, subscription_id, next_billing_date):
+        # For bulk jobs that hold rows in a SubscriptionBatch rather than as objects
+        with db.get_cursor() as (cursor, conn):
+            NEXT_BILLING_STATEMENT.execute(cursor, (next_billing_date, subscription_id))
+            conn.commit()
+    
     @classmethod
     def get_by_user(cls, user_id):
         with db.get_cursor() as (cursor, conn):
-            cursor.execute("SELECT * FROM subscriptions WHERE user_id=%s", (user_id,))
+            BY_USER_STATEMENT.execute(cursor, (user_id,))
             return [cls(**row) for row in cursor.fetchall()]
     
     @classmethod
     def get_active_subscriptions(cls):
-        with db.get_cursor() as (cursor, conn):
-            cursor.execute("SELECT * FROM subscriptions WHERE status='active'")
-            return [cls(**row) for row in cursor.fetchall()]
\ No newline at end of file
+        return list(cls.iter_active())
+
+    # Streamed through a server-side cursor, so memory stays flat however many rows match
+
+    @classmethod
+    def iter_active(cls, itersize=None):
+        for row in db.iter_rows(ACTIVE_SQL, itersize=itersize):
+            yield cls(**row)
+
+    @classmethod
+    def iter_batches(cls, n=1000):
+        for rows in db.iter_batches(ACTIVE_SQL, size=n):
+            yield [cls(**row) for row in rows]
+
+    # asyncio variants on async_db, for paths that run many queries concurrently
+
+    async def save_async(self):
+        async with async_db.get_cursor() as (cursor, conn):
+            if self.subscription_id:
+                await cursor.execute(UPDATE_SQL, self._update_params())
+            else:
+                await cursor.execute(INSERT_SQL, self._insert_params())
+                self.subscription_id = (await cursor.fetchone())['subscription_id']
+            await conn.commit()
+
+    @classmethod
+    async def get_by_user_async(cls, user_id):
+        async with async_db.get_cursor() as (cursor, conn):
+            await cursor.execute(BY_USER_SQL, (user_id,))
+            return [cls(**row) for row in await cursor.fetchall()]
+
+    @classmethod
+    async def get_active_subscriptions_async(cls):
+        async with async_db.get_cursor() as (cursor, conn):
+            await cursor.execute(ACTIVE_SQL)
+            return [cls(**row) for row in await cursor.fetchall()]
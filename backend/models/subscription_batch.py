@@ -0,0 +1,213 @@
+import uuid
+from array import array
+from datetime import datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+STATUSES = ('active', 'paused', 'canceled')
+# Same periods as Subscription._calculate_next_billing
+FREQUENCIES = ('weekly', 'monthly', 'quarterly', 'yearly')
+PERIOD_DAYS = array('q', [7, 30, 90, 365])
+
+DAY_MICROS = 86_400_000_000
+# next_billing_date is stored as microseconds since this (naive) epoch
+EPOCH = datetime(1970, 1, 1)
+NO_DATE = -(1 << 63)
+CENTS = Decimal('0.01')
+
+
+def to_micros(value):
+    if value is None:
+        return NO_DATE
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    elif not isinstance(value, datetime):
+        value = datetime(value.year, value.month, value.day)
+    if value.tzinfo is not None:
+        value = value.replace(tzinfo=None) - value.utcoffset()
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(micros):
+    return None if micros == NO_DATE else EPOCH + timedelta(microseconds=micros)
+
+
+def to_minor(amount):
+    # Amounts are kept as integer paise so sums stay exact
+    return int((Decimal(str(amount)) * 100).quantize(Decimal(1), ROUND_HALF_UP))
+
+
+def from_minor(minor):
+    return (Decimal(minor) / 100).quantize(CENTS)
+
+
+class SubscriptionRow:
+    # Read-only view of one subscription without a per-instance __dict__
+    __slots__ = ('subscription_id', 'user_id', 'product_id', 'status', 'frequency', 'amount', 'next_billing_date')
+
+    def __init__(self, subscription_id=None, user_id=None, product_id=None,
+                 status='active', frequency='monthly', amount=0, next_billing_date=None):
+        self.subscription_id = subscription_id
+        self.user_id = user_id
+        self.product_id = product_id
+        self.status = status
+        self.frequency = frequency
+        self.amount = amount
+        self.next_billing_date = next_billing_date
+
+    def __repr__(self):
+        return f'SubscriptionRow({self.subscription_id!r}, status={self.status!r}, frequency={self.frequency!r})'
+
+
+def _uuid_bytes(value):
+    return (value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))).bytes
+
+
+class _UuidColumn:
+    # UUIDs packed as 16 bytes each
+    __slots__ = ('data',)
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('batch index out of range')
+        return str(uuid.UUID(bytes=bytes(self.data[index * 16:index * 16 + 16])))
+
+    def __len__(self):
+        return len(self.data) // 16
+
+    def take(self, indexes):
+        column = _UuidColumn()
+        column.data = bytearray().join(self.data[i * 16:i * 16 + 16] for i in indexes)
+        return column
+
+
+class SubscriptionBatch:
+    # Column-oriented subscriptions: ids as packed UUIDs, status/frequency as codes,
+    # amounts in paise and next_billing_date as microseconds, all in typed arrays
+
+    def __init__(self):
+        self.subscription_ids = _UuidColumn()
+        self.user_ids = _UuidColumn()
+        self.product_ids = _UuidColumn()
+        self.statuses = array('B')
+        self.frequencies = array('B')
+        self.amounts = array('q')
+        self.next_billing = array('q')
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build a batch from dict rows (e.g. a RealDictCursor) or objects with the same attributes"""
+        batch = cls()
+        for row in rows:
+            batch.append(row)
+        return batch
+
+    def append(self, row):
+        get = row.get if isinstance(row, dict) else lambda name: getattr(row, name)
+        try:
+            status = STATUSES.index(get('status') or 'active')
+            frequency = FREQUENCIES.index(get('frequency') or 'monthly')
+        except ValueError:
+            raise ValueError(f"Unsupported status/frequency for subscription {get('subscription_id')}")
+        # Convert everything before appending so a bad row leaves the columns aligned
+        ids = [_uuid_bytes(get(name)) for name in ('subscription_id', 'user_id', 'product_id')]
+        amount = to_minor(get('amount') or 0)
+        next_billing = to_micros(get('next_billing_date'))
+        self.subscription_ids.data += ids[0]
+        self.user_ids.data += ids[1]
+        self.product_ids.data += ids[2]
+        self.statuses.append(status)
+        self.frequencies.append(frequency)
+        self.amounts.append(amount)
+        self.next_billing.append(next_billing)
+
+    def __len__(self):
+        return len(self.amounts)
+
+    @property
+    def nbytes(self):
+        arrays = (self.statuses, self.frequencies, self.amounts, self.next_billing)
+        ids = (self.subscription_ids, self.user_ids, self.product_ids)
+        return sum(a.itemsize * len(a) for a in arrays) + sum(len(c.data) for c in ids)
+
+    def row(self, index):
+        return SubscriptionRow(
+            self.subscription_ids[index], self.user_ids[index], self.product_ids[index],
+            STATUSES[self.statuses[index]], FREQUENCIES[self.frequencies[index]],
+            from_minor(self.amounts[index]), from_micros(self.next_billing[index])
+        )
+
+    def __iter__(self):
+        return (self.row(i) for i in range(len(self)))
+
+    def take(self, indexes):
+        """New batch holding the rows at indexes"""
+        indexes = list(indexes)
+        batch = SubscriptionBatch()
+        batch.subscription_ids = self.subscription_ids.take(indexes)
+        batch.user_ids = self.user_ids.take(indexes)
+        batch.product_ids = self.product_ids.take(indexes)
+        for name in ('statuses', 'frequencies', 'amounts', 'next_billing'):
+            source = getattr(self, name)
+            setattr(batch, name, array(source.typecode, [source[i] for i in indexes]))
+        return batch
+
+    # Whole-batch operations
+
+    def where_status(self, status):
+        code = STATUSES.index(status)
+        return [i for i, value in enumerate(self.statuses) if value == code]
+
+    def due(self, now=None):
+        """Indexes of rows whose next_billing_date has passed"""
+        cutoff = to_micros(now or datetime.now())
+        return [i for i, when in enumerate(self.next_billing) if NO_DATE != when <= cutoff]
+
+    def next_billing_dates(self, now=None):
+        """Next billing date per row counted from now, in microseconds"""
+        start = to_micros(now or datetime.now())
+        offsets = [days * DAY_MICROS for days in PERIOD_DAYS]
+        return array('q', [start + offsets[code] for code in self.frequencies])
+
+    def total_amount(self, indexes=None):
+        amounts = self.amounts if indexes is None else (self.amounts[i] for i in indexes)
+        return from_minor(sum(amounts))
+
+    def revenue_by_frequency(self, status='active'):
+        totals = [0] * len(FREQUENCIES)
+        code = STATUSES.index(status)
+        for state, frequency, amount in zip(self.statuses, self.frequencies, self.amounts):
+            if state == code:
+                totals[frequency] += amount
+        return {name: from_minor(total) for name, total in zip(FREQUENCIES, totals)}
+
+    def monthly_recurring_revenue(self):
+        """Active amounts normalised to a 30-day month"""
+        code = STATUSES.index('active')
+        total = sum(
+            Decimal(amount) * 30 / PERIOD_DAYS[frequency]
+            for state, frequency, amount in zip(self.statuses, self.frequencies, self.amounts)
+            if state == code
+        )
+        return (total / 100).quantize(CENTS)
+
+    def forecast(self, days, now=None):
+        """Billing count and amount expected for active rows within the next `days` days"""
+        start = to_micros(now or datetime.now())
+        end = start + days * DAY_MICROS
+        code = STATUSES.index('active')
+        count = revenue = 0
+        for state, frequency, amount, when in zip(self.statuses, self.frequencies, self.amounts, self.next_billing):
+            if state != code or when == NO_DATE or when > end:
+                continue
+            period = PERIOD_DAYS[frequency] * DAY_MICROS
+            # Overdue rows bill now, then every period from then on
+            first = max(when, start)
+            charges = (end - first) // period + 1
+            count += charges
+            revenue += charges * amount
+        return {'billings': count, 'amount': from_minor(revenue)}
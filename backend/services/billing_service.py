@@ -2,8 +2,16 @@ import razorpay
 import os
 from datetime import datetime
 from backend.models.subscription import Subscription
+from backend.models.subscription_batch import SubscriptionBatch, from_micros, from_minor
 from backend.core.database import db
 
+DUE_SQL = """
+    SELECT * FROM subscriptions 
+    WHERE status='active' AND next_billing_date <= NOW()
+"""
+# Due subscriptions are streamed from a server-side cursor this many at a time
+BILLING_BATCH_SIZE = int(os.environ.get('BILLING_BATCH_SIZE', 500))
+
 class BillingService:
     def __init__(self):
         self.razorpay_client = razorpay.Client(
@@ -20,30 +28,32 @@ class BillingService:
         }
         return self.razorpay_client.order.create(data=order_data)
     
-    def process_recurring_billing(self):
+    def process_recurring_billing(self, batch_size=BILLING_BATCH_SIZE):
         """Process all due subscriptions"""
-        with db.get_cursor() as (cursor, conn):
-            cursor.execute("""
-                SELECT * FROM subscriptions 
-                WHERE status='active' AND next_billing_date <= NOW()
-            """)
-            due_subscriptions = cursor.fetchall()
+        for rows in db.iter_batches(DUE_SQL, size=batch_size):
+            # Held column-wise instead of one Subscription object per row
+            batch = SubscriptionBatch()
+            for row in rows:
+                try:
+                    batch.append(row)
+                except ValueError as e:
+                    self._log_billing_event(row.get('subscription_id'), 'failed', str(e))
+            next_billing = batch.next_billing_dates()
             
-            for sub_data in due_subscriptions:
-                subscription = Subscription(**sub_data)
+            for i in range(len(batch)):
+                subscription_id = batch.subscription_ids[i]
                 try:
                     # Create order for billing
-                    order = self.create_subscription_order(subscription.subscription_id, subscription.amount)
+                    order = self.create_subscription_order(subscription_id, from_minor(batch.amounts[i]))
                     
                     # Update next billing date
-                    subscription.next_billing_date = subscription._calculate_next_billing()
-                    subscription.save()
+                    Subscription.set_next_billing_date(subscription_id, from_micros(next_billing[i]))
                     
                     # Log billing event
-                    self._log_billing_event(subscription.subscription_id, 'success', order['id'])
+                    self._log_billing_event(subscription_id, 'success', order['id'])
                     
                 except Exception as e:
-                    self._log_billing_event(subscription.subscription_id, 'failed', str(e))
+                    self._log_billing_event(subscription_id, 'failed', str(e))
     
     def _log_billing_event(self, subscription_id, status, details):
         with db.get_cursor() as (cursor, conn):
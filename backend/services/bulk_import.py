@@ -0,0 +1,455 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+import psycopg2
+
+from backend.core.database import db
+
+IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 5000))
+# Where the HTTP endpoint writes per-row error files
+IMPORT_ERROR_DIR = os.environ.get('IMPORT_ERROR_DIR') or os.path.join(tempfile.gettempdir(), 'subscriptionpro-imports')
+ON_CONFLICT_MODES = ('update', 'skip')
+FORMATS = ('csv', 'ndjson')
+
+STATUSES = ('active', 'paused', 'canceled')
+FREQUENCIES = {'weekly': 7, 'monthly': 30, 'quarterly': 90, 'yearly': 365}
+# Must match the users.user_role CHECK constraint (database/init.sql)
+USER_ROLES = ('user', 'admin')
+
+
+class RowError(ValueError):
+    pass
+
+
+def _text(max_length, required=True, lower=False):
+    def parse(value):
+        value = (value or '').strip() if isinstance(value, str) or value is None else str(value)
+        if not value:
+            if required:
+                raise RowError('is required')
+            return None
+        if len(value) > max_length:
+            raise RowError(f'is longer than {max_length} characters')
+        return value.lower() if lower else value
+    return parse
+
+
+def _uuid(required=True):
+    def parse(value):
+        if value in (None, ''):
+            if required:
+                raise RowError('is required')
+            return None
+        try:
+            return str(uuid.UUID(str(value)))
+        except ValueError:
+            raise RowError('is not a valid UUID')
+    return parse
+
+
+def _amount(value):
+    try:
+        amount = Decimal(str(value).strip())
+    except (InvalidOperation, AttributeError):
+        raise RowError('is not a number')
+    if not amount.is_finite() or amount < 0 or amount >= Decimal('1e8'):
+        raise RowError('must be between 0 and 99999999.99')
+    return amount.quantize(Decimal('0.01'))
+
+
+def _choice(values, default=None):
+    def parse(value):
+        value = str(value).strip().lower() if value not in (None, '') else default
+        if value not in values:
+            raise RowError(f"must be one of {', '.join(values)}")
+        return value
+    return parse
+
+
+def _timestamp(value):
+    if value in (None, ''):
+        return None
+    try:
+        return datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+    except ValueError:
+        raise RowError('is not an ISO 8601 date')
+
+
+def _email(value):
+    value = _text(255, lower=True)(value)
+    if '@' not in value or value.startswith('@') or value.endswith('@'):
+        raise RowError('is not a valid email address')
+    return value
+
+
+class ImportKind:
+    # fields: column -> parser; staging holds the validated columns plus the input line
+
+    def __init__(self, table, fields, staging_types, merge_sql):
+        self.table = table
+        self.fields = fields
+        self.columns = ('line',) + tuple(fields)
+        self.staging_sql = (
+            f'CREATE TEMP TABLE IF NOT EXISTS import_{table} ('
+            + ', '.join(f'{column} {staging_types[column]}' for column in self.columns)
+            + ') ON COMMIT DELETE ROWS'
+        )
+        self.copy_sql = f"COPY import_{table} ({', '.join(self.columns)}) FROM STDIN WITH (FORMAT csv)"
+        self.merge_sql = merge_sql
+
+    def validate(self, row):
+        values = []
+        for column, parse in self.fields.items():
+            try:
+                values.append(parse(row.get(column)))
+            except RowError as e:
+                raise RowError(f'{column} {e}')
+        return self.complete(values)
+
+    def complete(self, values):
+        return values
+
+    def unresolved(self, cursor):
+        # Staged rows that reference missing records: [(line, message)]
+        return []
+
+
+class UserImport(ImportKind):
+    def complete(self, values):
+        if not values[1].startswith('$2'):
+            raise RowError('password_hash must be a bcrypt hash')
+        return values
+
+
+class ProductImport(ImportKind):
+    def complete(self, values):
+        values[0] = values[0] or str(uuid.uuid4())
+        return values
+
+
+class SubscriptionImport(ImportKind):
+    def complete(self, values):
+        subscription_id, user_id, user_email, product_id, status, frequency, amount, next_billing_date = values
+        if not user_id and not user_email:
+            raise RowError('user_id or user_email is required')
+        return [
+            subscription_id or str(uuid.uuid4()), user_id, user_email, product_id, status, frequency, amount,
+            next_billing_date or datetime.now() + timedelta(days=FREQUENCIES[frequency])
+        ]
+
+    def unresolved(self, cursor):
+        cursor.execute("""
+            UPDATE import_subscriptions s SET user_id = u.user_id
+            FROM users u WHERE s.user_id IS NULL AND u.email = s.user_email
+        """)
+        cursor.execute("""
+            SELECT s.line,
+                   NOT EXISTS (SELECT 1 FROM users u WHERE u.user_id = s.user_id) AS missing_user,
+                   NOT EXISTS (SELECT 1 FROM products p WHERE p.product_id = s.product_id) AS missing_product
+            FROM import_subscriptions s
+            WHERE s.user_id IS NULL
+               OR NOT EXISTS (SELECT 1 FROM users u WHERE u.user_id = s.user_id)
+               OR NOT EXISTS (SELECT 1 FROM products p WHERE p.product_id = s.product_id)
+        """)
+        problems = []
+        for row in cursor.fetchall():
+            missing = [name for name in ('user', 'product') if row[f'missing_{name}']]
+            problems.append((row['line'], f"unknown {' and '.join(missing)}"))
+        return problems
+
+
+# Later rows win when a batch repeats a key; RETURNING (xmax = 0) tells inserts from updates
+KINDS = {
+    'users': UserImport(
+        'users',
+        {
+            'email': _email,
+            'password_hash': _text(255),
+            'first_name': _text(100),
+            'last_name': _text(100),
+            'user_role': _choice(USER_ROLES, default='user'),
+        },
+        {'line': 'integer', 'email': 'varchar(255)', 'password_hash': 'varchar(255)',
+         'first_name': 'varchar(100)', 'last_name': 'varchar(100)', 'user_role': 'varchar(20)'},
+        """
+            INSERT INTO users (email, password_hash, first_name, last_name, user_role)
+            SELECT DISTINCT ON (email) email, password_hash, first_name, last_name, user_role
+            FROM import_users ORDER BY email, line DESC
+            ON CONFLICT (email) DO {action}
+            RETURNING (xmax = 0) AS inserted
+        """
+    ),
+    'products': ProductImport(
+        'products',
+        {
+            'product_id': _uuid(required=False),
+            'name': _text(255),
+            'description': _text(10000, required=False),
+            'price': _amount,
+            'currency': _text(3, required=False),
+        },
+        {'line': 'integer', 'product_id': 'uuid', 'name': 'varchar(255)', 'description': 'text',
+         'price': 'numeric(10, 2)', 'currency': 'varchar(3)'},
+        """
+            INSERT INTO products (product_id, name, description, price, currency)
+            SELECT DISTINCT ON (product_id) product_id, name, description, price, COALESCE(currency, 'INR')
+            FROM import_products ORDER BY product_id, line DESC
+            ON CONFLICT (product_id) DO {action}
+            RETURNING (xmax = 0) AS inserted
+        """
+    ),
+    'subscriptions': SubscriptionImport(
+        'subscriptions',
+        {
+            'subscription_id': _uuid(required=False),
+            'user_id': _uuid(required=False),
+            'user_email': lambda value: _email(value) if value not in (None, '') else None,
+            'product_id': _uuid(),
+            'status': _choice(STATUSES, default='active'),
+            'frequency': _choice(tuple(FREQUENCIES), default='monthly'),
+            'amount': _amount,
+            'next_billing_date': _timestamp,
+        },
+        {'line': 'integer', 'subscription_id': 'uuid', 'user_id': 'uuid', 'user_email': 'varchar(255)',
+         'product_id': 'uuid', 'status': 'varchar(20)', 'frequency': 'varchar(20)',
+         'amount': 'numeric(10, 2)', 'next_billing_date': 'timestamp'},
+        """
+            INSERT INTO subscriptions (subscription_id, user_id, product_id, status, frequency, amount, next_billing_date)
+            SELECT DISTINCT ON (s.subscription_id)
+                   s.subscription_id, s.user_id, s.product_id, s.status, s.frequency, s.amount, s.next_billing_date
+            FROM import_subscriptions s
+            JOIN users u ON u.user_id = s.user_id
+            JOIN products p ON p.product_id = s.product_id
+            ORDER BY s.subscription_id, s.line DESC
+            ON CONFLICT (subscription_id) DO {action}
+            RETURNING (xmax = 0) AS inserted
+        """
+    ),
+}
+
+# Columns left alone when an existing row is updated; an import never changes
+# the credentials or role of an account that already exists
+_KEEP_ON_UPDATE = {'line', 'email', 'product_id', 'subscription_id', 'user_email', 'password_hash', 'user_role'}
+
+
+def _merge_sql(kind, on_conflict):
+    if on_conflict == 'skip':
+        return kind.merge_sql.format(action='NOTHING')
+    target_columns = [c for c in kind.fields if c not in _KEEP_ON_UPDATE]
+    assignments = ', '.join(f'{c} = EXCLUDED.{c}' for c in target_columns)
+    return kind.merge_sql.format(action=f'UPDATE SET {assignments}')
+
+
+def read_rows(stream, fmt):
+    """Yield (line, row dict or None, parse error or None) from a text stream"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            if None in row:
+                yield reader.line_num, row, 'row has more fields than the header'
+            else:
+                yield reader.line_num, row, None
+        return
+
+    for line, text in enumerate(stream, 1):
+        if not text.strip():
+            continue
+        try:
+            row = json.loads(text)
+        except ValueError as e:
+            yield line, {'raw': text.rstrip('\n')}, f'invalid JSON: {e}'
+            continue
+        if isinstance(row, dict):
+            yield line, row, None
+        else:
+            yield line, {'raw': row}, 'row is not a JSON object'
+
+
+def detect_format(name=None, content_type=None):
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in ('text/csv', 'application/csv'):
+        return 'csv'
+    if content_type in ('application/x-ndjson', 'application/ndjson', 'application/jsonl'):
+        return 'ndjson'
+    if name and name.lower().endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    return 'csv'
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+class ImportReport:
+    def __init__(self, kind, on_conflict, error_file=None, max_errors_kept=100):
+        self.kind = kind
+        self.on_conflict = on_conflict
+        self.error_file = error_file
+        self.max_errors_kept = max_errors_kept
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.skipped = 0
+        self.failed = 0
+        self.batches = 0
+        self.errors = []
+        self._errors_out = None
+        self._start = time.perf_counter()
+        self.elapsed = 0.0
+
+    def error(self, line, message, row=None):
+        self.failed += 1
+        entry = {'line': line, 'error': message, 'row': row}
+        if len(self.errors) < self.max_errors_kept:
+            self.errors.append(entry)
+        if self.error_file:
+            if self._errors_out is None:
+                self._errors_out = open(self.error_file, 'w', encoding='utf-8')
+            self._errors_out.write(json.dumps(entry, default=str) + '\n')
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self._start
+        if self._errors_out is not None:
+            self._errors_out.close()
+            self._errors_out = None
+        return self
+
+    @property
+    def rows_per_second(self):
+        return round(self.rows / self.elapsed, 1) if self.elapsed else 0.0
+
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'on_conflict': self.on_conflict,
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'batches': self.batches,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': self.rows_per_second,
+            'error_file': self.error_file if self.failed else None,
+            'errors': self.errors
+        }
+
+
+def _load_batch(database, kind, merge_sql, batch, report):
+    # batch: [(line, raw row, validated values)], committed as one transaction
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for line, _, values in batch:
+        writer.writerow([line] + [_csv_value(v) for v in values])
+    buffer.seek(0)
+    raw = {line: row for line, row, _ in batch}
+
+    try:
+        with database.get_cursor() as (cursor, conn):
+            cursor.execute(kind.staging_sql)
+            cursor.copy_expert(kind.copy_sql, buffer)
+            unresolved = kind.unresolved(cursor)
+            cursor.execute(merge_sql)
+            outcomes = cursor.fetchall()
+            conn.commit()
+    except (psycopg2.DataError, psycopg2.IntegrityError) as e:
+        # A constraint the validators do not know about; the whole batch is rolled back
+        message = str(e).strip().splitlines()[0]
+        for line, row, _ in batch:
+            report.error(line, f'batch rejected by database: {message}', row)
+        return
+
+    for line, message in unresolved:
+        report.error(line, message, raw.get(line))
+    inserted = sum(1 for outcome in outcomes if outcome['inserted'])
+    report.inserted += inserted
+    report.updated += len(outcomes) - inserted
+    # Duplicates within the batch and ON CONFLICT DO NOTHING rows
+    report.skipped += len(batch) - len(unresolved) - len(outcomes)
+    report.batches += 1
+
+
+def import_rows(kind_name, stream, fmt='csv', on_conflict='update', error_file=None,
+                batch_size=IMPORT_BATCH_SIZE, database=None):
+    """Validate, COPY and merge rows from a text stream; returns an ImportReport"""
+    if kind_name not in KINDS:
+        raise ValueError(f"Unknown import kind: {kind_name} (expected {', '.join(KINDS)})")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown import format: {fmt} (expected {', '.join(FORMATS)})")
+    if on_conflict not in ON_CONFLICT_MODES:
+        raise ValueError(f"on_conflict must be one of {', '.join(ON_CONFLICT_MODES)}")
+
+    kind = KINDS[kind_name]
+    database = database or db
+    merge_sql = _merge_sql(kind, on_conflict)
+    report = ImportReport(kind_name, on_conflict, error_file)
+    batch = []
+    try:
+        for line, row, parse_error in read_rows(stream, fmt):
+            report.rows += 1
+            if parse_error:
+                report.error(line, parse_error, row)
+                continue
+            try:
+                batch.append((line, row, kind.validate(row)))
+            except RowError as e:
+                report.error(line, str(e), row)
+                continue
+            if len(batch) >= batch_size:
+                _load_batch(database, kind, merge_sql, batch, report)
+                batch = []
+        if batch:
+            _load_batch(database, kind, merge_sql, batch, report)
+    finally:
+        report.finish()
+    return report
+
+
+def error_file_path(kind_name):
+    os.makedirs(IMPORT_ERROR_DIR, exist_ok=True)
+    name = f"{kind_name}-{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.errors.ndjson"
+    return os.path.join(IMPORT_ERROR_DIR, name)
+
+
+def import_file(kind_name, path, fmt=None, **options):
+    fmt = fmt or detect_format(path)
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        return import_rows(kind_name, stream, fmt, **options)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk import users, products or subscriptions')
+    parser.add_argument('kind', choices=sorted(KINDS))
+    parser.add_argument('path', help="CSV or NDJSON file, or '-' for stdin")
+    parser.add_argument('--format', choices=FORMATS, help='default: from the file extension')
+    parser.add_argument('--on-conflict', choices=ON_CONFLICT_MODES, default='update')
+    parser.add_argument('--errors', help='write rejected rows to this NDJSON file')
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    options = {'on_conflict': args.on_conflict, 'error_file': args.errors, 'batch_size': args.batch_size}
+    if args.path == '-':
+        stream = io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8-sig', newline='')
+        report = import_rows(args.kind, stream, args.format or 'csv', **options)
+    else:
+        report = import_file(args.kind, args.path, args.format, **options)
+
+    summary = report.to_dict()
+    summary.pop('errors')
+    print(json.dumps(summary, indent=2))
+    return 1 if report.failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
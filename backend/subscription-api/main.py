@@ -51,6 +51,18 @@ app.register_blueprint(payment_bp, url_prefix='/api')
 app.register_blueprint(admin_bp, url_prefix='/api')
 app.register_blueprint(razorpay_bp, url_prefix='/api')
 
+# Negotiated gzip/brotli/zstd response compression
+from src.compression import init_compression
+init_compression(app)
+
+# Per-route latency histograms, served at /api/monitoring/metrics
+from src.metrics import init_metrics, process_stats
+init_metrics(app, '/api/monitoring/metrics')
+
+# Batched, write-behind audit logging (flushed at exit)
+from src.audit import init_audit_log
+init_audit_log(app)
+
 # Health check endpoint
 @app.route('/health')
 @app.route('/api/health')
@@ -58,7 +70,8 @@ def health_check():
     return {
         'status': 'healthy',
         'service': 'SubscriptionPro API',
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'process': process_stats()
     }
 
 # Database initialization
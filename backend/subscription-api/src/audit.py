@@ -0,0 +1,68 @@
+"""
+Batched audit logging for the subscription API
+Route handlers call record_action(), which only appends to the shared
+write_behind queue. Its daemon thread inserts queued rows into audit_logs in
+multi-row statements once `batch_size` rows are waiting or `flush_interval`
+has passed. The queue is flushed when the process exits.
+"""
+
+import uuid
+from datetime import datetime
+
+from flask import has_request_context, request
+
+from .models.user import AuditLog, db
+from .write_behind import AuditPipeline, pipeline_from_env
+
+
+def sqlalchemy_sink(app):
+    """Sink that bulk-inserts rows into AuditLog inside an app context"""
+    def write(rows):
+        with app.app_context():
+            try:
+                db.session.execute(AuditLog.__table__.insert(), rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+    return write
+
+
+audit_log = None
+
+
+def init_audit_log(app):
+    """Create the app's audit pipeline; records are written through SQLAlchemy"""
+    global audit_log
+    audit_log = pipeline_from_env(sqlalchemy_sink(app))
+    app.extensions['audit_log'] = audit_log
+    return audit_log
+
+
+def _as_uuid(value):
+    if value is None or isinstance(value, uuid.UUID):
+        return value
+    return uuid.UUID(str(value))
+
+
+def record_action(user_id, action_type, entity_type, entity_id, old_value=None, new_value=None):
+    """Queue an audit row for the current request"""
+    if audit_log is None:
+        return False
+
+    ip_address = None
+    if has_request_context():
+        forwarded = request.headers.get('X-Forwarded-For')
+        ip_address = forwarded.split(',')[0].strip() if forwarded else request.remote_addr
+
+    return audit_log.log({
+        'log_id': uuid.uuid4(),
+        'user_id': _as_uuid(user_id),
+        'action_type': action_type,
+        'entity_type': entity_type,
+        'entity_id': _as_uuid(entity_id),
+        'old_value': old_value,
+        'new_value': new_value,
+        'ip_address': ip_address,
+        'timestamp': datetime.utcnow()
+    })
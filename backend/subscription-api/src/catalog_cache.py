@@ -0,0 +1,45 @@
+"""
+Product catalog response cache for the subscription API
+GET /products responses are serialized once per filter combination and
+served from memory with a strong ETag until a product is created or changed.
+Writes call bump(), which advances the catalog version and empties the cache;
+clients revalidating with If-None-Match get a 304 without a database query.
+Entries, ETags and versioning come from the shared catalog_core module.
+"""
+
+from flask import current_app, jsonify, request
+
+from . import catalog_core, compression
+from .catalog_core import CatalogEntry, etag_matches, strong_etag
+
+
+class CatalogCache(catalog_core.CatalogCache):
+    """Per-process, version-stamped LRU of product listing bodies"""
+
+    def response(self, key, loader):
+        """Flask response for key, built with loader() on a miss"""
+        entry = self.get(key)
+        cache_state = 'HIT'
+        if entry is None:
+            cache_state = 'MISS'
+            version = self.version
+            entry = self.put(key, version, jsonify(loader()).get_data())
+
+        coding = compression.negotiate(request.headers.get('Accept-Encoding'), len(entry.body))
+        body, etag = entry.encoded(coding, compression.compress)
+
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            self.not_modified += 1
+            response = current_app.response_class(status=304)
+        else:
+            response = current_app.response_class(body, mimetype='application/json')
+            if coding:
+                response.headers['Content-Encoding'] = coding
+        response.vary.add('Accept-Encoding')
+        response.headers['ETag'] = etag
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Cache'] = cache_state
+        return response
+
+
+catalog_cache = CatalogCache()
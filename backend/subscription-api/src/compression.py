@@ -0,0 +1,47 @@
+"""
+Response compression for the subscription API
+An after_request hook compresses JSON and text responses with the coding the
+shared content_coding core negotiates from Accept-Encoding. Small bodies are
+left alone, generator responses are compressed block by block, and responses
+that already carry a Content-Encoding (such as precompressed catalog
+listings) pass through. backend/core/compression.py is the same adapter for
+the root apps.
+"""
+
+from flask import request
+
+from .content_coding import COMPRESSION_ENABLED, compress, compress_stream, negotiate
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/html', 'text/plain', 'text/css', 'application/javascript')
+
+
+def compress_response(response):
+    """after_request hook applying the negotiated content coding"""
+    if not COMPRESSION_ENABLED or response.status_code < 200 or response.status_code in (204, 304):
+        return response
+    if response.direct_passthrough or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    accept_encoding = request.headers.get('Accept-Encoding')
+
+    if response.is_streamed:
+        coding = negotiate(accept_encoding)
+        if coding:
+            response.response = compress_stream(response.response, coding)
+            response.headers['Content-Encoding'] = coding
+            response.headers.pop('Content-Length', None)
+        return response
+
+    body = response.get_data()
+    coding = negotiate(accept_encoding, len(body))
+    if coding:
+        response.set_data(compress(body, coding))
+        response.headers['Content-Encoding'] = coding
+    return response
+
+
+def init_compression(app):
+    """Register response compression on a Flask app"""
+    app.after_request(compress_response)
+    return app
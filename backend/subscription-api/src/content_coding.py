@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Content-coding core shared by the SubscriptionPro APIs
+Picks a content coding from the request's Accept-Encoding header: gzip is
+always available, brotli and zstd are used when their packages are
+installed. Bodies below `MIN_SIZE` bytes are sent as-is, and streamed
+responses are compressed incrementally, one flushed block per chunk.
+
+This module is framework-free. backend/core/content_coding.py is the source;
+api/ and backend/subscription-api/src/ carry byte-identical copies
+(tests/test_shared_modules.py fails on drift). Response hooks live in each
+app's compression.py.
+"""
+
+import os
+import zlib
+from typing import Optional
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+# Smaller bodies gain little and cost a round of CPU per request
+MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))
+ZSTD_LEVEL = int(os.environ.get('ZSTD_LEVEL', 3))
+
+# Server preference when the client accepts several codings equally
+PREFERENCE = tuple(coding for coding, available in (
+    ('br', BROTLI_AVAILABLE),
+    ('zstd', ZSTD_AVAILABLE),
+    ('gzip', True),
+) if available)
+
+
+def parse_accept_encoding(header) -> dict:
+    """Map of coding -> q-value from an Accept-Encoding header"""
+    weights = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+    return weights
+
+
+def negotiate(accept_encoding, size=None, available=None) -> Optional[str]:
+    """Coding to use for a body of `size` bytes, or None for identity"""
+    if not COMPRESSION_ENABLED or not accept_encoding:
+        return None
+    if size is not None and size < MIN_SIZE:
+        return None
+
+    weights = parse_accept_encoding(accept_encoding)
+    wildcard = weights.get('*', 0.0)
+    best, best_q = None, 0.0
+    for coding in available or PREFERENCE:
+        q = weights.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compress(body: bytes, coding: str) -> bytes:
+    """Compress a complete body with the given coding"""
+    if coding == 'gzip':
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        return compressor.compress(body) + compressor.flush()
+    if coding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if coding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    raise ValueError(f"Unsupported content coding: {coding}")
+
+
+class StreamCompressor:
+    """Incremental compressor; each chunk is flushed so the client can decode it on arrival"""
+
+    def __init__(self, coding: str):
+        self.coding = coding
+        if coding == 'gzip':
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        elif coding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        elif coding == 'zstd':
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        else:
+            raise ValueError(f"Unsupported content coding: {coding}")
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.coding == 'gzip':
+            return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        if self.coding == 'br':
+            return self._compressor.process(chunk) + self._compressor.flush()
+        return self._compressor.compress(chunk) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self) -> bytes:
+        if self.coding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+def compress_stream(chunks, coding: str):
+    """Compress an iterable of str/bytes chunks, yielding each flushed block"""
+    compressor = StreamCompressor(coding)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
@@ -32,6 +32,18 @@ app.register_blueprint(payment_bp, url_prefix="/api/payments")
 app.register_blueprint(admin_bp, url_prefix="/api/admin")
 app.register_blueprint(razorpay_bp, url_prefix="/api/razorpay")
 
+# Negotiated gzip/brotli/zstd response compression
+from .compression import init_compression
+init_compression(app)
+
+# Per-route latency histograms, served at /api/monitoring/metrics
+from .metrics import init_metrics
+init_metrics(app, '/api/monitoring/metrics')
+
+# Batched, write-behind audit logging (flushed at exit)
+from .audit import init_audit_log
+init_audit_log(app)
+
 # Database Initialization (for Cloud Functions, this might be handled by a separate migration script)
 with app.app_context():
     db.create_all()
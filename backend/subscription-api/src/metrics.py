@@ -0,0 +1,66 @@
+"""
+Request metrics for the subscription API
+Flask hooks over the shared request_metrics core: every request's latency is
+recorded by (method, URL rule, status), and metrics_response() serves the
+snapshot as JSON, or as Prometheus text with ?format=prometheus.
+backend/core/metrics.py is the same adapter for the root apps and keeps the
+same functions and signatures.
+"""
+
+import time
+
+from flask import current_app, jsonify, request
+
+from . import request_metrics
+from .request_metrics import UNMATCHED_ROUTE, RequestMetrics
+
+metrics = RequestMetrics()
+
+
+def _registry():
+    return current_app.extensions.get('request_metrics', metrics)
+
+
+def _begin_request():
+    # Kept in the WSGI environ rather than g, which may be gone by teardown
+    request.environ['metrics.start'] = time.perf_counter()
+    _registry().begin(request.method)
+
+
+def _record_status(response):
+    request.environ['metrics.status'] = response.status_code
+    return response
+
+
+def _end_request(exc):
+    start = request.environ.pop('metrics.start', None)
+    if start is None:
+        return
+    # Routes are labelled by their rule so path parameters do not add series
+    route = request.url_rule.rule if request.url_rule else UNMATCHED_ROUTE
+    status = request.environ.pop('metrics.status', 500)
+    _registry().end(request.method, route, status, time.perf_counter() - start)
+
+
+def metrics_response(**extra):
+    """Current metrics plus any extra JSON sections, or Prometheus text with ?format=prometheus"""
+    registry = _registry()
+    if request.args.get('format') == 'prometheus':
+        return current_app.response_class(registry.prometheus(), mimetype='text/plain; version=0.0.4')
+    return jsonify(dict(registry.snapshot(), **extra))
+
+
+def init_metrics(app, path=None, registry=None):
+    """Record every request of app (into registry, default the module-wide one) and serve the metrics at path"""
+    app.extensions['request_metrics'] = metrics if registry is None else registry
+    app.before_request(_begin_request)
+    app.after_request(_record_status)
+    app.teardown_request(_end_request)
+    if path:
+        app.add_url_rule(path, 'request_metrics', metrics_response, methods=['GET'])
+    return app
+
+
+def process_stats():
+    """CPU use since the previous call, current RSS and in-flight requests"""
+    return request_metrics.process_stats(metrics)
@@ -7,6 +7,8 @@ db = SQLAlchemy()
 
 class User(db.Model):
     __tablename__ = 'users'
+    # Keyset pagination order (see pagination.py)
+    __table_args__ = (db.Index('idx_users_created_keyset', 'created_at', 'user_id'),)
     
     user_id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     email = db.Column(db.String(255), unique=True, nullable=False)
@@ -125,6 +127,7 @@ class SubscriptionPlan(db.Model):
 
 class Subscription(db.Model):
     __tablename__ = 'subscriptions'
+    __table_args__ = (db.Index('idx_subscriptions_created_keyset', 'created_at', 'subscription_id'),)
     
     subscription_id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.user_id'), nullable=False)
@@ -196,6 +199,7 @@ class Order(db.Model):
 
 class Payment(db.Model):
     __tablename__ = 'payments'
+    __table_args__ = (db.Index('idx_payments_created_keyset', 'created_at', 'payment_id'),)
     
     payment_id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.user_id'), nullable=False)
@@ -231,6 +235,7 @@ class Payment(db.Model):
 
 class AuditLog(db.Model):
     __tablename__ = 'audit_logs'
+    __table_args__ = (db.Index('idx_audit_logs_timestamp_keyset', 'timestamp', 'log_id'),)
     
     log_id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = db.Column(UUID(as_uuid=True), db.ForeignKey('users.user_id'))
@@ -0,0 +1,44 @@
+"""
+Keyset pagination for the subscription API blueprints
+List endpoints return rows newest first, ordered by (created_at, primary key).
+The opaque cursor from the shared keyset core carries that pair for the last
+row on the page, and the next page filters with a row comparison against it,
+so every page is an index range scan of the same size instead of an OFFSET
+over everything before it.
+"""
+
+import uuid
+from datetime import datetime
+
+from flask import jsonify
+from sqlalchemy import tuple_
+
+from . import keyset
+from .keyset import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, encode_cursor, page_size, query_value, split_page
+
+
+def decode_cursor(cursor):
+    """(datetime, UUID) from a token made by encode_cursor"""
+    sort_value, id_value = keyset.decode_cursor(cursor, size=2)
+    try:
+        return datetime.fromisoformat(sort_value), uuid.UUID(id_value)
+    except (ValueError, TypeError, AttributeError) as e:
+        raise InvalidCursor(f'Invalid cursor: {e}')
+
+
+def keyset_paginate(query, sort_column, id_column, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Run one page of query; returns (items, next_cursor or None)"""
+    if cursor:
+        after_sort, after_id = decode_cursor(cursor)
+        query = query.filter(tuple_(sort_column, id_column) < tuple_(after_sort, after_id))
+
+    items = query.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1).all()
+    return split_page(items, limit, lambda item: (getattr(item, sort_column.key), getattr(item, id_column.key)))
+
+
+def list_response(items, next_cursor):
+    """Bare JSON list with the next page's cursor in X-Next-Cursor"""
+    response = jsonify([item.to_dict() for item in items])
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Request metrics core shared by the SubscriptionPro APIs
+Every request's latency is recorded in microseconds into a log-linear
+(HDR-style) histogram per (method, route pattern, status): values below 32us
+are exact and larger values land in one of 16 sub-buckets per power of two,
+so any reported quantile is within ~6% of the true value. Each series keeps a
+cumulative histogram for Prometheus plus a ring of `SLICE_SECONDS` slices
+covering `WINDOW_SECONDS`, from which rolling-window quantiles are merged.
+Route labels are route patterns, never raw paths, so cardinality is bounded
+by the route table.
+
+This module is framework-free and stdlib-only. backend/core/request_metrics.py
+is the source; api/ and backend/subscription-api/src/ deploy on their own and
+carry byte-identical copies (tests/test_shared_modules.py fails on drift).
+Framework hooks live in each app's metrics.py.
+"""
+
+import math
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+SLICE_SECONDS = int(os.environ.get('METRICS_SLICE_SECONDS', 10))
+WINDOW_SECONDS = int(os.environ.get('METRICS_WINDOW_SECONDS', 300))
+# Rolling windows reported in JSON and as Prometheus quantile gauges
+REPORT_WINDOWS = (60, WINDOW_SECONDS)
+# Per-minute request counts kept for peak_rpm
+RPM_HISTORY_MINUTES = 60
+
+# Label for requests that matched no route (404/405)
+UNMATCHED_ROUTE = '<unmatched>'
+
+SUB_BITS = 5
+SUB_COUNT = 1 << SUB_BITS
+HALF_COUNT = SUB_COUNT >> 1
+
+# Cumulative `le` bounds for the Prometheus histogram, in seconds
+PROMETHEUS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+def bucket_index(value: int) -> int:
+    """Histogram bucket for a non-negative integer value"""
+    if value < SUB_COUNT:
+        return value
+    shift = value.bit_length() - SUB_BITS
+    return shift * HALF_COUNT + (value >> shift)
+
+
+def bucket_bounds(index: int):
+    """(lowest, highest) value counted in a bucket"""
+    if index < SUB_COUNT:
+        return index, index
+    shift = index // HALF_COUNT - 1
+    sub = index - shift * HALF_COUNT
+    return sub << shift, ((sub + 1) << shift) - 1
+
+
+class Histogram:
+    """Sparse log-linear histogram of integer values"""
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value: int):
+        index = bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: 'Histogram'):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.max > self.max:
+            self.max = other.max
+
+    def percentile(self, q: float) -> int:
+        """Upper bound of the bucket holding the q-th percentile (0-100)"""
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil(q / 100 * self.count))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(bucket_bounds(index)[1], self.max)
+        return self.max
+
+    def cumulative(self, bounds):
+        """Counts of values <= each bound, bucketed by the bucket's highest value"""
+        result = [0] * len(bounds)
+        for index, count in self.counts.items():
+            highest = bucket_bounds(index)[1]
+            for i, bound in enumerate(bounds):
+                if highest <= bound:
+                    result[i] += count
+        return result
+
+
+class RollingHistogram:
+    """Ring of per-slice histograms covering the last `slices * slice_seconds`"""
+
+    __slots__ = ('slice_seconds', '_slices')
+
+    def __init__(self, slice_seconds=SLICE_SECONDS, window_seconds=WINDOW_SECONDS):
+        self.slice_seconds = slice_seconds
+        self._slices = [None] * max(1, math.ceil(window_seconds / slice_seconds))
+
+    def record(self, value: int, now: float):
+        epoch = int(now // self.slice_seconds)
+        slot = epoch % len(self._slices)
+        entry = self._slices[slot]
+        if entry is None or entry[0] != epoch:
+            entry = (epoch, Histogram())
+            self._slices[slot] = entry
+        entry[1].record(value)
+
+    def window(self, seconds: float, now: float) -> Histogram:
+        """Merged histogram of the slices that overlap the last `seconds`"""
+        epoch = int(now // self.slice_seconds)
+        oldest = epoch - max(1, math.ceil(seconds / self.slice_seconds)) + 1
+        merged = Histogram()
+        for entry in self._slices:
+            if entry is not None and oldest <= entry[0] <= epoch:
+                merged.merge(entry[1])
+        return merged
+
+
+class _Series:
+    __slots__ = ('total', 'rolling')
+
+    def __init__(self, slice_seconds, window_seconds):
+        self.total = Histogram()
+        self.rolling = RollingHistogram(slice_seconds, window_seconds)
+
+
+def _ms(micros) -> float:
+    return round(micros / 1000, 3)
+
+
+def _summary(histogram: Histogram) -> Dict:
+    return {
+        'count': histogram.count,
+        'avg_ms': _ms(histogram.total / histogram.count) if histogram.count else 0.0,
+        'p50_ms': _ms(histogram.percentile(50)),
+        'p95_ms': _ms(histogram.percentile(95)),
+        'p99_ms': _ms(histogram.percentile(99)),
+        'max_ms': _ms(histogram.max)
+    }
+
+
+def _labels(**labels) -> str:
+    escaped = (
+        '%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels.items()
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class RequestMetrics:
+    """Latency histograms, in-flight counts and error rates for one process"""
+
+    def __init__(self, slice_seconds=SLICE_SECONDS, window_seconds=WINDOW_SECONDS):
+        self.slice_seconds = slice_seconds
+        self.window_seconds = window_seconds
+        self.started = time.time()
+        self._series = {}
+        self._in_flight = {}
+        self._minutes = {}
+        self._lock = threading.Lock()
+
+    def begin(self, method: str):
+        """Count a request as in flight"""
+        with self._lock:
+            self._in_flight[method] = self._in_flight.get(method, 0) + 1
+
+    def end(self, method: str, route: str, status: int, elapsed: float, now: Optional[float] = None):
+        """Record a finished request that took `elapsed` seconds"""
+        now = time.monotonic() if now is None else now
+        micros = max(0, int(elapsed * 1_000_000))
+        key = (method, route, int(status))
+        minute = int(now // 60)
+        with self._lock:
+            self._in_flight[method] = max(0, self._in_flight.get(method, 0) - 1)
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(self.slice_seconds, self.window_seconds)
+            series.total.record(micros)
+            series.rolling.record(micros, now)
+
+            self._minutes[minute] = self._minutes.get(minute, 0) + 1
+            if len(self._minutes) > RPM_HISTORY_MINUTES:
+                for old in [m for m in self._minutes if m <= minute - RPM_HISTORY_MINUTES]:
+                    del self._minutes[old]
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return sum(self._in_flight.values())
+
+    def snapshot(self, now: Optional[float] = None) -> Dict:
+        """Overall and per-route latency, error and throughput figures"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            series = list(self._series.items())
+            in_flight = dict(self._in_flight)
+            minutes = dict(self._minutes)
+
+            overall = {seconds: Histogram() for seconds in REPORT_WINDOWS}
+            routes = {}
+            total_requests = error_count = window_errors = 0
+            for (method, route, status), data in series:
+                entry = routes.setdefault(f"{method} {route}", {
+                    'total_requests': 0,
+                    'error_count': 0,
+                    'status': {},
+                    'windows': {seconds: Histogram() for seconds in REPORT_WINDOWS}
+                })
+                entry['total_requests'] += data.total.count
+                entry['status'][str(status)] = data.total.count
+                total_requests += data.total.count
+                for seconds, merged in entry['windows'].items():
+                    window = data.rolling.window(seconds, now)
+                    merged.merge(window)
+                    overall[seconds].merge(window)
+                    if status >= 500 and seconds == REPORT_WINDOWS[0]:
+                        window_errors += window.count
+                if status >= 500:
+                    entry['error_count'] += data.total.count
+                    error_count += data.total.count
+
+        for entry in routes.values():
+            entry['error_rate_percent'] = round(entry['error_count'] * 100 / entry['total_requests'], 3)
+            entry['windows'] = {f"{seconds}s": _summary(merged) for seconds, merged in entry['windows'].items()}
+
+        recent = overall[REPORT_WINDOWS[0]]
+        current_minute = int(now // 60)
+        return {
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'in_flight': sum(in_flight.values()),
+            'in_flight_by_method': in_flight,
+            'api_response_times': dict(_summary(recent), window_seconds=REPORT_WINDOWS[0]),
+            'error_rates': {
+                'total_requests': total_requests,
+                'error_count': error_count,
+                'error_rate_percent': round(error_count * 100 / total_requests, 3) if total_requests else 0.0,
+                'window_error_rate_percent': round(window_errors * 100 / recent.count, 3) if recent.count else 0.0
+            },
+            'throughput': {
+                'requests_per_minute': recent.count * 60 // REPORT_WINDOWS[0],
+                'current_minute': minutes.get(current_minute, 0),
+                'peak_rpm': max(minutes.values(), default=0)
+            },
+            'windows': {f"{seconds}s": _summary(merged) for seconds, merged in overall.items()},
+            'routes': routes
+        }
+
+    def prometheus(self, now: Optional[float] = None) -> str:
+        """Prometheus text exposition (format 0.0.4)"""
+        now = time.monotonic() if now is None else now
+        micro_bounds = [int(bound * 1_000_000) for bound in PROMETHEUS_BUCKETS]
+        with self._lock:
+            series = sorted(self._series.items())
+            in_flight = sorted(self._in_flight.items())
+            lines = [
+                '# HELP http_requests_in_flight Requests currently being handled',
+                '# TYPE http_requests_in_flight gauge'
+            ]
+            for method, count in in_flight:
+                lines.append(f'http_requests_in_flight{_labels(method=method)} {count}')
+
+            lines += [
+                '# HELP http_request_duration_seconds Request latency by route pattern and status',
+                '# TYPE http_request_duration_seconds histogram'
+            ]
+            for (method, route, status), data in series:
+                labels = {'method': method, 'route': route, 'status': status}
+                for bound, count in zip(PROMETHEUS_BUCKETS, data.total.cumulative(micro_bounds)):
+                    lines.append(f'http_request_duration_seconds_bucket{_labels(**labels, le=bound)} {count}')
+                lines.append(f'http_request_duration_seconds_bucket{_labels(**labels, le="+Inf")} {data.total.count}')
+                lines.append(f'http_request_duration_seconds_sum{_labels(**labels)} {_number(data.total.total / 1_000_000)}')
+                lines.append(f'http_request_duration_seconds_count{_labels(**labels)} {data.total.count}')
+
+            lines += [
+                '# HELP http_request_duration_window_seconds Latency quantiles over rolling windows',
+                '# TYPE http_request_duration_window_seconds gauge'
+            ]
+            for (method, route, status), data in series:
+                for seconds in REPORT_WINDOWS:
+                    window = data.rolling.window(seconds, now)
+                    for q in QUANTILES:
+                        labels = _labels(method=method, route=route, status=status, quantile=q, window=f"{seconds}s")
+                        lines.append(f'http_request_duration_window_seconds{labels} {_number(window.percentile(q * 100) / 1_000_000)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+_cpu_sample = (time.monotonic(), _cpu_time()) if resource else None
+_cpu_lock = threading.Lock()
+
+
+def process_stats(metrics: RequestMetrics) -> Dict:
+    """CPU use since the previous call, current RSS and in-flight requests"""
+    global _cpu_sample
+    stats = {'active_connections': metrics.in_flight()}
+    if resource is None:
+        return stats
+
+    now, cpu = time.monotonic(), _cpu_time()
+    with _cpu_lock:
+        last_wall, last_cpu = _cpu_sample
+        _cpu_sample = (now, cpu)
+    elapsed = now - last_wall
+    stats['cpu_usage_percent'] = round((cpu - last_cpu) * 100 / elapsed, 1) if elapsed > 0 else 0.0
+
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    stats['memory_usage_mb'] = round(rss / (1024 * 1024), 1)
+    return stats
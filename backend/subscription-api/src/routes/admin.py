@@ -1,9 +1,37 @@
 from flask import Blueprint, jsonify, request
 from ..models.user import User, Product, Subscription, Payment, AuditLog, db
 from sqlalchemy import func
+from ..pagination import MAX_PAGE_SIZE, InvalidCursor, keyset_paginate, page_size
 
 admin_bp = Blueprint('admin', __name__)
 
+def paged_response(name, query, sort_column, id_column, default_per_page):
+    """Keyset page by default; an explicit `page` without a cursor keeps the offset paging older clients use"""
+    if 'page' in request.args and 'cursor' not in request.args:
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', default_per_page, type=int), MAX_PAGE_SIZE)
+        result = query.order_by(sort_column.desc(), id_column.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        return jsonify({
+            name: [item.to_dict() for item in result.items],
+            'total': result.total,
+            'pages': result.pages,
+            'current_page': page
+        })
+    
+    try:
+        items, next_cursor = keyset_paginate(query, sort_column, id_column, request.args.get('cursor'),
+                                             page_size(request.args, default=default_per_page))
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        name: [item.to_dict() for item in items],
+        'count': len(items),
+        'has_more': next_cursor is not None,
+        'next_cursor': next_cursor
+    })
+
 @admin_bp.route('/admin/dashboard', methods=['GET'])
 def get_dashboard_stats():
     """Get admin dashboard statistics"""
@@ -22,90 +50,44 @@ def get_dashboard_stats():
 
 @admin_bp.route('/admin/users', methods=['GET'])
 def get_all_users():
-    """Get all users for admin"""
+    """Get a page of users for admin"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
-        
-        users = User.query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-        
-        return jsonify({
-            'users': [user.to_dict() for user in users.items],
-            'total': users.total,
-            'pages': users.pages,
-            'current_page': page
-        })
+        return paged_response('users', User.query, User.created_at, User.user_id, 20)
     except Exception as e:
         return jsonify({'error': f'Failed to fetch users: {str(e)}'}), 500
 
 @admin_bp.route('/admin/subscriptions', methods=['GET'])
 def get_all_subscriptions():
-    """Get all subscriptions for admin"""
+    """Get a page of subscriptions for admin"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
         status = request.args.get('status')
         
         query = Subscription.query
         if status:
             query = query.filter_by(status=status)
         
-        subscriptions = query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-        
-        return jsonify({
-            'subscriptions': [sub.to_dict() for sub in subscriptions.items],
-            'total': subscriptions.total,
-            'pages': subscriptions.pages,
-            'current_page': page
-        })
+        return paged_response('subscriptions', query, Subscription.created_at, Subscription.subscription_id, 20)
     except Exception as e:
         return jsonify({'error': f'Failed to fetch subscriptions: {str(e)}'}), 500
 
 @admin_bp.route('/admin/payments', methods=['GET'])
 def get_all_payments():
-    """Get all payments for admin"""
+    """Get a page of payments for admin"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 20, type=int)
         status = request.args.get('status')
         
         query = Payment.query
         if status:
             query = query.filter_by(status=status)
         
-        payments = query.paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-        
-        return jsonify({
-            'payments': [payment.to_dict() for payment in payments.items],
-            'total': payments.total,
-            'pages': payments.pages,
-            'current_page': page
-        })
+        return paged_response('payments', query, Payment.created_at, Payment.payment_id, 20)
     except Exception as e:
         return jsonify({'error': f'Failed to fetch payments: {str(e)}'}), 500
 
 @admin_bp.route('/admin/audit-logs', methods=['GET'])
 def get_audit_logs():
-    """Get audit logs for admin"""
+    """Get a page of audit logs for admin"""
     try:
-        page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 50, type=int)
-        
-        logs = AuditLog.query.order_by(AuditLog.timestamp.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-        
-        return jsonify({
-            'logs': [log.to_dict() for log in logs.items],
-            'total': logs.total,
-            'pages': logs.pages,
-            'current_page': page
-        })
+        return paged_response('logs', AuditLog.query, AuditLog.timestamp, AuditLog.log_id, 50)
     except Exception as e:
         return jsonify({'error': f'Failed to fetch audit logs: {str(e)}'}), 500
\ No newline at end of file
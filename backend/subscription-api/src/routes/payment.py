@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, request
 from ..models.user import Payment, db
+from ..pagination import InvalidCursor, keyset_paginate, list_response, page_size
 import uuid
 import razorpay
 import os
@@ -14,7 +15,7 @@ razorpay_client = razorpay.Client(auth=(
 
 @payment_bp.route('/payments', methods=['GET'])
 def get_payments():
-    """Get all payments with optional filtering"""
+    """Get a page of payments with optional filtering"""
     user_id = request.args.get('user_id')
     status = request.args.get('status')
     
@@ -29,8 +30,12 @@ def get_payments():
     if status:
         query = query.filter(Payment.status == status)
     
-    payments = query.all()
-    return jsonify([payment.to_dict() for payment in payments])
+    try:
+        payments, next_cursor = keyset_paginate(query, Payment.created_at, Payment.payment_id,
+                                                request.args.get('cursor'), page_size(request.args))
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    return list_response(payments, next_cursor)
 
 @payment_bp.route('/payments/create-order', methods=['POST'])
 def create_razorpay_order():
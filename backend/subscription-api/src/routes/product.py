@@ -1,5 +1,6 @@
 from flask import Blueprint, jsonify, request
 from ..models.user import Product, SubscriptionPlan, db
+from ..catalog_cache import catalog_cache
 import uuid
 
 product_bp = Blueprint('product', __name__)
@@ -9,12 +10,13 @@ def get_products():
     """Get all products with optional filtering"""
     is_subscription = request.args.get('subscription')
     
-    query = Product.query
-    if is_subscription:
-        query = query.filter(Product.is_subscription_product == (is_subscription.lower() == 'true'))
+    def load_products():
+        query = Product.query
+        if is_subscription:
+            query = query.filter(Product.is_subscription_product == (is_subscription.lower() == 'true'))
+        return [product.to_dict() for product in query.all()]
     
-    products = query.all()
-    return jsonify([product.to_dict() for product in products])
+    return catalog_cache.response(('products', (is_subscription or '').lower()), load_products)
 
 @product_bp.route('/products', methods=['POST'])
 def create_product():
@@ -37,6 +39,7 @@ def create_product():
     try:
         db.session.add(product)
         db.session.commit()
+        catalog_cache.bump()
         return jsonify(product.to_dict()), 201
     except Exception as e:
         db.session.rollback()
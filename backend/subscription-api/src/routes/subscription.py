@@ -1,12 +1,14 @@
 from flask import Blueprint, jsonify, request
 from ..models.user import Subscription, db
+from ..audit import record_action
+from ..pagination import InvalidCursor, keyset_paginate, list_response, page_size
 import uuid
 
 subscription_bp = Blueprint('subscription', __name__)
 
 @subscription_bp.route('/subscriptions', methods=['GET'])
 def get_subscriptions():
-    """Get all subscriptions with optional filtering"""
+    """Get a page of subscriptions with optional filtering"""
     user_id = request.args.get('user_id')
     status = request.args.get('status')
     
@@ -21,8 +23,12 @@ def get_subscriptions():
     if status:
         query = query.filter(Subscription.status == status)
     
-    subscriptions = query.all()
-    return jsonify([sub.to_dict() for sub in subscriptions])
+    try:
+        subscriptions, next_cursor = keyset_paginate(query, Subscription.created_at, Subscription.subscription_id,
+                                                     request.args.get('cursor'), page_size(request.args))
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    return list_response(subscriptions, next_cursor)
 
 @subscription_bp.route('/subscriptions', methods=['POST'])
 def create_subscription():
@@ -47,6 +53,8 @@ def create_subscription():
         
         db.session.add(subscription)
         db.session.commit()
+        record_action(subscription.user_id, 'create_subscription', 'subscriptions', subscription.subscription_id,
+                      new_value=subscription.to_dict())
         return jsonify(subscription.to_dict()), 201
     except ValueError:
         return jsonify({'error': 'Invalid UUID format'}), 400
@@ -66,6 +74,8 @@ def pause_subscription(subscription_id):
         
         subscription.status = 'paused'
         db.session.commit()
+        record_action(subscription.user_id, 'pause_subscription', 'subscriptions', subscription.subscription_id,
+                      old_value={'status': 'active'}, new_value={'status': 'paused'})
         return jsonify(subscription.to_dict())
     except ValueError:
         return jsonify({'error': 'Invalid subscription ID format'}), 400
@@ -85,6 +95,8 @@ def resume_subscription(subscription_id):
         
         subscription.status = 'active'
         db.session.commit()
+        record_action(subscription.user_id, 'resume_subscription', 'subscriptions', subscription.subscription_id,
+                      old_value={'status': 'paused'}, new_value={'status': 'active'})
         return jsonify(subscription.to_dict())
     except ValueError:
         return jsonify({'error': 'Invalid subscription ID format'}), 400
@@ -99,8 +111,11 @@ def cancel_subscription(subscription_id):
         sub_uuid = uuid.UUID(subscription_id)
         subscription = Subscription.query.filter_by(subscription_id=sub_uuid).first_or_404()
         
+        previous_status = subscription.status
         subscription.status = 'canceled'
         db.session.commit()
+        record_action(subscription.user_id, 'cancel_subscription', 'subscriptions', subscription.subscription_id,
+                      old_value={'status': previous_status}, new_value={'status': 'canceled'})
         return jsonify(subscription.to_dict())
     except ValueError:
         return jsonify({'error': 'Invalid subscription ID format'}), 400
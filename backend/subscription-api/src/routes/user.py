@@ -1,21 +1,26 @@
 from flask import Blueprint, jsonify, request
 from werkzeug.security import generate_password_hash, check_password_hash
 from ..models.user import User, db
+from ..pagination import InvalidCursor, keyset_paginate, list_response, page_size
 import uuid
 
 user_bp = Blueprint('user', __name__)
 
 @user_bp.route('/users', methods=['GET'])
 def get_users():
-    """Get all users with optional filtering"""
+    """Get a page of users with optional filtering"""
     role = request.args.get('role')
     
     query = User.query
     if role:
         query = query.filter(User.user_role == role)
     
-    users = query.all()
-    return jsonify([user.to_dict() for user in users])
+    try:
+        users, next_cursor = keyset_paginate(query, User.created_at, User.user_id,
+                                             request.args.get('cursor'), page_size(request.args))
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    return list_response(users, next_cursor)
 
 @user_bp.route('/users', methods=['POST'])
 def create_user():
@@ -794,6 +794,160 @@ class TestRateLimiting:
         assert response.status_code == 429
 
 
+class TestAuditLogging:
+    """Test the write-behind audit pipeline."""
+
+    def test_record_action_is_batched(self):
+        """Test that audit rows are queued and written in one batch."""
+        import uuid
+        from src import audit
+
+        batches = []
+        pipeline = audit.AuditPipeline(batches.append, batch_size=10, flush_interval=60)
+        subscription_id = uuid.uuid4()
+
+        with patch.object(audit, 'audit_log', pipeline):
+            with app.test_request_context('/', headers={'X-Forwarded-For': '203.0.113.7, 10.0.0.1'}):
+                for action in ('pause_subscription', 'resume_subscription'):
+                    audit.record_action(str(uuid.uuid4()), action, 'subscriptions', subscription_id)
+
+        assert pipeline.flush(timeout=2)
+        assert len(batches) == 1
+        assert [row['action_type'] for row in batches[0]] == ['pause_subscription', 'resume_subscription']
+        assert batches[0][0]['entity_id'] == subscription_id
+        assert batches[0][0]['ip_address'] == '203.0.113.7'
+        pipeline.close()
+
+
+class TestCatalogCache:
+    """Test the versioned product catalog cache."""
+
+    def test_etag_and_version_bump(self):
+        """Test that cached listings revalidate with 304 and writes invalidate them."""
+        from src.catalog_cache import CatalogCache
+
+        cache = CatalogCache(ttl=60)
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return [{'name': 'Coffee'}]
+
+        with app.test_request_context('/api/products/products'):
+            first = cache.response(('products', ''), loader)
+            etag = first.headers['ETag']
+            assert first.status_code == 200
+            assert json.loads(first.get_data()) == [{'name': 'Coffee'}]
+
+        with app.test_request_context('/api/products/products', headers={'If-None-Match': etag}):
+            revalidated = cache.response(('products', ''), loader)
+            assert revalidated.status_code == 304
+            assert revalidated.get_data() == b''
+
+        assert len(loads) == 1
+
+        cache.bump()
+        with app.test_request_context('/api/products/products'):
+            assert cache.response(('products', ''), loader).headers['X-Cache'] == 'MISS'
+        assert len(loads) == 2
+
+
+class TestKeysetPagination:
+    """Test cursor pagination over (created_at, id)."""
+
+    def test_pages_cover_all_rows_once(self):
+        """Test that following cursors returns every row once, newest first."""
+        from datetime import timedelta
+        from flask import Flask
+        from src.models.user import db as models_db
+        from src.pagination import InvalidCursor, decode_cursor, keyset_paginate
+
+        page_app = Flask(__name__)
+        page_app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        models_db.init_app(page_app)
+
+        with page_app.app_context():
+            models_db.create_all()
+            base = datetime(2024, 1, 1)
+            for i in range(5):
+                # Pairs of rows share a timestamp so the id breaks ties
+                models_db.session.add(User(email=f'user{i}@example.com', password_hash='x', country='India',
+                                           created_at=base + timedelta(minutes=i // 2)))
+            models_db.session.commit()
+
+            seen, cursor, pages = [], None, 0
+            while True:
+                users, cursor = keyset_paginate(User.query, User.created_at, User.user_id, cursor, limit=2)
+                seen.extend(user.email for user in users)
+                pages += 1
+                if cursor is None:
+                    break
+
+            assert pages == 3
+            assert sorted(seen) == [f'user{i}@example.com' for i in range(5)]
+            assert seen[0] == 'user4@example.com'
+
+        with pytest.raises(InvalidCursor):
+            decode_cursor('not-a-cursor')
+
+
+class TestCompression:
+    """Test Accept-Encoding negotiation and response compression."""
+
+    def test_large_json_is_gzipped(self):
+        """Test that large JSON bodies are compressed and small ones are not."""
+        import gzip
+        from flask import Flask, jsonify
+        from src.compression import init_compression
+
+        compressed_app = init_compression(Flask(__name__))
+        rows = [{'subscription_id': str(i), 'status': 'active'} for i in range(200)]
+        compressed_app.add_url_rule('/large', 'large', lambda: jsonify(rows))
+        compressed_app.add_url_rule('/small', 'small', lambda: jsonify({'ok': True}))
+
+        with compressed_app.test_client() as test_client:
+            response = test_client.get('/large', headers={'Accept-Encoding': 'gzip'})
+            assert response.headers['Content-Encoding'] == 'gzip'
+            assert 'Accept-Encoding' in response.headers['Vary']
+            assert json.loads(gzip.decompress(response.data)) == rows
+
+            response = test_client.get('/large', headers={'Accept-Encoding': 'gzip;q=0'})
+            assert 'Content-Encoding' not in response.headers
+
+            response = test_client.get('/small', headers={'Accept-Encoding': 'gzip'})
+            assert 'Content-Encoding' not in response.headers
+
+
+class TestRequestMetrics:
+    """Test per-route latency histograms."""
+
+    def test_requests_recorded_by_rule_and_status(self):
+        """Test that requests are labelled by URL rule and exposed as JSON and Prometheus text."""
+        from flask import Flask, abort
+        from src import metrics as metrics_module
+
+        metered_app = Flask(__name__)
+        metered_app.add_url_rule('/items/<item_id>', 'item', lambda item_id: {'id': item_id})
+        metered_app.add_url_rule('/boom', 'boom', lambda: abort(503))
+
+        with patch.object(metrics_module, 'metrics', metrics_module.RequestMetrics()):
+            metrics_module.init_metrics(metered_app, '/api/monitoring/metrics')
+            with metered_app.test_client() as test_client:
+                test_client.get('/items/1')
+                test_client.get('/items/2')
+                test_client.get('/boom')
+                test_client.get('/missing')
+
+                snapshot = test_client.get('/api/monitoring/metrics').get_json()
+                assert snapshot['routes']['GET /items/<item_id>']['status'] == {'200': 2}
+                assert snapshot['routes']['GET /boom']['error_rate_percent'] == 100.0
+                assert snapshot['routes']['GET <unmatched>']['status'] == {'404': 1}
+                assert snapshot['in_flight'] == 1
+
+                text = test_client.get('/api/monitoring/metrics?format=prometheus').get_data(as_text=True)
+                assert 'http_request_duration_seconds_count{method="GET",route="/items/<item_id>",status="200"} 2' in text
+
+
 if __name__ == '__main__':
     pytest.main(['-v', '--cov=src', '--cov-report=html'])
 
@@ -5,8 +5,14 @@ import json
 from datetime import datetime, timedelta
 import logging
 
+from backend.core.catalog_cache import catalog_cache
+from backend.core.compression import init_compression
+from backend.core.metrics import init_metrics, metrics_response
+
 app = Flask(__name__)
 CORS(app)
+init_compression(app)
+init_metrics(app)
 
 # Supabase configuration - REAL DATABASE
 SUPABASE_URL = os.environ.get('SUPABASE_URL')
@@ -142,8 +148,11 @@ def merchant_dashboard():
 def get_products():
     if supabase:
         try:
-            response = supabase.table('products').select('*').eq('is_active', True).execute()
-            return jsonify(response.data)
+            # Served from memory until a product write; If-None-Match gets a 304
+            return catalog_cache.response(
+                ('active_products',),
+                lambda: supabase.table('products').select('*').eq('is_active', True).execute().data
+            )
         except Exception as e:
             logger.error(f"Error fetching products: {e}")
             return jsonify({'error': 'Database error'}), 500
@@ -169,6 +178,7 @@ def create_product():
                 'is_subscription_product': True,
                 'is_active': True
             }).execute()
+            catalog_cache.bump()
             
             return jsonify({
                 'product_id': response.data[0]['product_id'],
@@ -273,6 +283,10 @@ def health_check():
         }
     })
 
+@app.route('/api/monitoring/metrics', methods=['GET'])
+def request_metrics():
+    return metrics_response()
+
 # PRODUCTION FRONTEND - No sample data
 @app.route('/')
 def production_portal():
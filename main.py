@@ -6,8 +6,14 @@ from datetime import datetime, timedelta
 from supabase import create_client, Client
 import logging
 
+from backend.core.catalog_cache import catalog_cache
+from backend.core.compression import init_compression
+from backend.core.metrics import init_metrics, metrics, metrics_response, process_stats
+
 app = Flask(__name__)
 CORS(app)
+init_compression(app)
+init_metrics(app)
 
 # Supabase configuration
 SUPABASE_URL = os.environ.get('SUPABASE_URL', 'https://your-project.supabase.co')
@@ -259,6 +265,7 @@ def sync_sfcc_products():
                     'price': product['price'],
                     'is_subscription_product': True
                 }).execute()
+            catalog_cache.bump()
         
         return jsonify({'synced_products': len(sfcc_products)})
     except Exception as e:
@@ -303,35 +310,18 @@ def detailed_health_check():
             'sfcc_integration': 'healthy',
             'analytics_engine': 'healthy'
         },
-        'metrics': {
-            'response_time_ms': 45,
-            'active_connections': 150,
-            'memory_usage_mb': 512,
-            'cpu_usage_percent': 25
-        }
+        'metrics': dict(
+            process_stats(),
+            response_time_ms=metrics.snapshot()['api_response_times']['avg_ms']
+        )
     }
     
     return jsonify(health_status)
 
 @app.route('/api/monitoring/metrics', methods=['GET'])
 def system_metrics():
-    """System performance metrics for APM"""
-    return jsonify({
-        'api_response_times': {
-            'avg_ms': 120,
-            'p95_ms': 250,
-            'p99_ms': 500
-        },
-        'error_rates': {
-            'total_requests': 10000,
-            'error_count': 25,
-            'error_rate_percent': 0.25
-        },
-        'throughput': {
-            'requests_per_minute': 500,
-            'peak_rpm': 1200
-        }
-    })
+    """System performance metrics for APM (?format=prometheus for text exposition)"""
+    return metrics_response()
 
 # Merchant Dashboard with Real Data
 @app.route('/api/merchant/dashboard', methods=['GET'])
@@ -132,6 +132,373 @@ CREATE INDEX IF NOT EXISTS idx_audit_logs_resource ON audit_logs(resource_type,
 CREATE INDEX IF NOT EXISTS idx_notifications_user_id ON notifications(user_id);
 CREATE INDEX IF NOT EXISTS idx_notifications_status ON notifications(status);
 
+-- Keyset pagination and search for the admin user listing
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_users_created_at_keyset ON users((COALESCE(created_at, '1970-01-01'::timestamp)), user_id);
+CREATE INDEX IF NOT EXISTS idx_users_email_keyset ON users(email, user_id);
+CREATE INDEX IF NOT EXISTS idx_users_name_keyset ON users((COALESCE(last_name, '') || ' ' || COALESCE(first_name, '')), user_id);
+CREATE INDEX IF NOT EXISTS idx_users_email_trgm ON users USING gin (email gin_trgm_ops);
+
+-- Admin user listing: one page of users with their subscription counts.
+-- Pages are keyset-paginated on (sort key, user_id) and subscriptions are
+-- counted only for the rows on the page, so the cost of a page does not
+-- grow with the size of the users table. p_offset is only for clients that
+-- still page by number.
+CREATE OR REPLACE FUNCTION admin_list_users(
+    p_limit INTEGER DEFAULT 50,
+    p_sort TEXT DEFAULT 'created_at',
+    p_descending BOOLEAN DEFAULT true,
+    p_after_key TEXT DEFAULT NULL,
+    p_after_id UUID DEFAULT NULL,
+    p_role TEXT DEFAULT NULL,
+    p_search TEXT DEFAULT NULL,
+    p_is_active BOOLEAN DEFAULT NULL,
+    p_offset INTEGER DEFAULT 0
+)
+RETURNS TABLE (
+    user_id UUID,
+    email VARCHAR,
+    first_name VARCHAR,
+    last_name VARCHAR,
+    user_role VARCHAR,
+    is_active BOOLEAN,
+    created_at TIMESTAMP,
+    sort_key TEXT,
+    subscription_count BIGINT,
+    active_subscription_count BIGINT
+) AS $$
+DECLARE
+    sort_expr TEXT;
+    sort_type TEXT;
+    direction TEXT := CASE WHEN p_descending THEN 'DESC' ELSE 'ASC' END;
+BEGIN
+    CASE p_sort
+        WHEN 'created_at' THEN
+            sort_expr := $e$COALESCE(u.created_at, '1970-01-01'::timestamp)$e$;
+            sort_type := 'timestamp';
+        WHEN 'email' THEN
+            sort_expr := 'u.email';
+            sort_type := 'text';
+        WHEN 'name' THEN
+            sort_expr := $e$(COALESCE(u.last_name, '') || ' ' || COALESCE(u.first_name, ''))$e$;
+            sort_type := 'text';
+        ELSE
+            RAISE EXCEPTION 'Unsupported sort column: %', p_sort;
+    END CASE;
+
+    RETURN QUERY EXECUTE format($q$
+        WITH page AS (
+            SELECT u.user_id, u.email, u.first_name, u.last_name, u.user_role, u.is_active, u.created_at,
+                   %1$s AS sort_value
+            FROM users u
+            WHERE ($1::text IS NULL OR u.user_role = $1)
+              AND ($2::text IS NULL
+                   OR u.email ILIKE '%%' || $2 || '%%'
+                   OR (COALESCE(u.first_name, '') || ' ' || COALESCE(u.last_name, '')) ILIKE '%%' || $2 || '%%')
+              AND ($3::boolean IS NULL OR u.is_active = $3)
+              AND ($4::text IS NULL OR (%1$s, u.user_id) %2$s ($4::%3$s, $5::uuid))
+            ORDER BY %1$s %4$s, u.user_id %4$s
+            LIMIT $6 OFFSET $7
+        )
+        SELECT p.user_id, p.email, p.first_name, p.last_name, p.user_role, p.is_active, p.created_at,
+               p.sort_value::text,
+               COALESCE(c.total, 0), COALESCE(c.active, 0)
+        FROM page p
+        LEFT JOIN LATERAL (
+            SELECT count(*) AS total, count(*) FILTER (WHERE s.status = 'active') AS active
+            FROM subscriptions s
+            WHERE s.user_id = p.user_id
+        ) c ON true
+        ORDER BY p.sort_value %4$s, p.user_id %4$s
+    $q$, sort_expr, CASE WHEN p_descending THEN '<' ELSE '>' END, sort_type, direction)
+    USING p_role, NULLIF(p_search, ''), p_is_active, p_after_key, p_after_id,
+          LEAST(GREATEST(p_limit, 1), 500), GREATEST(p_offset, 0);
+END;
+$$ LANGUAGE plpgsql STABLE;
+
+-- Only the API (service role) may list users
+REVOKE EXECUTE ON FUNCTION admin_list_users FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION admin_list_users TO service_role;
+
+-- Analytics rollups: subscription counts per status and successful payment
+-- revenue per month, maintained by triggers so /admin/analytics reads a
+-- handful of rows instead of the raw tables
+CREATE TABLE IF NOT EXISTS subscription_status_rollup (
+    status VARCHAR(20) PRIMARY KEY,
+    subscription_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS monthly_revenue_rollup (
+    month DATE PRIMARY KEY, -- first day of the month
+    revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+    payment_count BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION rollup_subscription_status()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE subscription_status_rollup
+        SET subscription_count = subscription_count - 1, updated_at = NOW()
+        WHERE status = COALESCE(OLD.status, 'unknown');
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO subscription_status_rollup (status, subscription_count)
+        VALUES (COALESCE(NEW.status, 'unknown'), 1)
+        ON CONFLICT (status) DO UPDATE
+        SET subscription_count = subscription_status_rollup.subscription_count + 1, updated_at = NOW();
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION rollup_monthly_revenue()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status = 'successful' AND OLD.payment_date IS NOT NULL THEN
+        UPDATE monthly_revenue_rollup
+        SET revenue = revenue - OLD.amount, payment_count = payment_count - 1, updated_at = NOW()
+        WHERE month = date_trunc('month', OLD.payment_date)::date;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = 'successful' AND NEW.payment_date IS NOT NULL THEN
+        INSERT INTO monthly_revenue_rollup (month, revenue, payment_count)
+        VALUES (date_trunc('month', NEW.payment_date)::date, NEW.amount, 1)
+        ON CONFLICT (month) DO UPDATE
+        SET revenue = monthly_revenue_rollup.revenue + EXCLUDED.revenue,
+            payment_count = monthly_revenue_rollup.payment_count + 1,
+            updated_at = NOW();
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+DROP TRIGGER IF EXISTS subscriptions_status_rollup ON subscriptions;
+CREATE TRIGGER subscriptions_status_rollup
+    AFTER INSERT OR DELETE OR UPDATE OF status ON subscriptions
+    FOR EACH ROW EXECUTE FUNCTION rollup_subscription_status();
+
+DROP TRIGGER IF EXISTS payments_revenue_rollup ON payments;
+CREATE TRIGGER payments_revenue_rollup
+    AFTER INSERT OR DELETE OR UPDATE OF status, amount, payment_date ON payments
+    FOR EACH ROW EXECUTE FUNCTION rollup_monthly_revenue();
+
+-- Backfill / rebuild both rollups from the raw tables. Writers are blocked
+-- for the duration so the rebuilt totals match the tables exactly.
+CREATE OR REPLACE FUNCTION rebuild_analytics_rollups()
+RETURNS TABLE (rollup TEXT, buckets BIGINT) AS $$
+BEGIN
+    LOCK TABLE subscriptions, payments IN SHARE MODE;
+
+    DELETE FROM subscription_status_rollup WHERE true;
+    INSERT INTO subscription_status_rollup (status, subscription_count)
+    SELECT COALESCE(s.status, 'unknown'), count(*)
+    FROM subscriptions s
+    GROUP BY 1;
+
+    DELETE FROM monthly_revenue_rollup WHERE true;
+    INSERT INTO monthly_revenue_rollup (month, revenue, payment_count)
+    SELECT date_trunc('month', p.payment_date)::date, sum(p.amount), count(*)
+    FROM payments p
+    WHERE p.status = 'successful' AND p.payment_date IS NOT NULL
+    GROUP BY 1;
+
+    RETURN QUERY
+    SELECT 'subscription_status'::text, count(*) FROM subscription_status_rollup
+    UNION ALL
+    SELECT 'monthly_revenue'::text, count(*) FROM monthly_revenue_rollup;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Consistency check: every bucket where the rollups disagree with the raw
+-- tables. An empty result means the rollups are exact.
+CREATE OR REPLACE FUNCTION check_analytics_rollups()
+RETURNS TABLE (rollup TEXT, bucket TEXT, expected NUMERIC, actual NUMERIC) AS $$
+    SELECT 'subscription_status', COALESCE(raw.status, r.status)::text,
+           COALESCE(raw.total, 0), COALESCE(r.subscription_count, 0)
+    FROM (
+        SELECT COALESCE(status, 'unknown') AS status, count(*) AS total
+        FROM subscriptions
+        GROUP BY 1
+    ) raw
+    FULL OUTER JOIN subscription_status_rollup r ON r.status = raw.status
+    WHERE COALESCE(raw.total, 0) <> COALESCE(r.subscription_count, 0)
+
+    UNION ALL
+
+    SELECT 'monthly_revenue', to_char(COALESCE(raw.month, r.month), 'YYYY-MM'),
+           COALESCE(raw.revenue, 0), COALESCE(r.revenue, 0)
+    FROM (
+        SELECT date_trunc('month', payment_date)::date AS month, sum(amount) AS revenue, count(*) AS payments
+        FROM payments
+        WHERE status = 'successful' AND payment_date IS NOT NULL
+        GROUP BY 1
+    ) raw
+    FULL OUTER JOIN monthly_revenue_rollup r ON r.month = raw.month
+    WHERE COALESCE(raw.revenue, 0) <> COALESCE(r.revenue, 0)
+       OR COALESCE(raw.payments, 0) <> COALESCE(r.payment_count, 0);
+$$ LANGUAGE sql STABLE;
+
+REVOKE EXECUTE ON FUNCTION rebuild_analytics_rollups, check_analytics_rollups FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION rebuild_analytics_rollups, check_analytics_rollups TO service_role;
+
+-- The triggers only see changes from here on; backfill rows that already
+-- exist so the rollups start out exact (safe to re-run with this script)
+SELECT rebuild_analytics_rollups();
+
+-- New subscriptions per calendar month for the last p_months months
+-- (current month included), zero-filled, in one grouped query
+CREATE INDEX IF NOT EXISTS idx_subscriptions_created_at ON subscriptions(created_at);
+
+CREATE OR REPLACE FUNCTION subscription_monthly_trends(p_months INTEGER DEFAULT 6)
+RETURNS TABLE (month DATE, subscriptions BIGINT) AS $$
+    WITH months AS (
+        SELECT generate_series(
+            date_trunc('month', NOW()) - make_interval(months => p_months - 1),
+            date_trunc('month', NOW()),
+            INTERVAL '1 month'
+        )::date AS month
+    )
+    SELECT m.month, count(s.subscription_id)
+    FROM months m
+    LEFT JOIN subscriptions s
+        ON s.created_at >= m.month
+       AND s.created_at < m.month + INTERVAL '1 month'
+    GROUP BY m.month
+    ORDER BY m.month;
+$$ LANGUAGE sql STABLE;
+
+REVOKE EXECUTE ON FUNCTION subscription_monthly_trends FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION subscription_monthly_trends TO service_role;
+
+-- Recurring billing runs: progress per run date so a run cut short by the
+-- function time limit resumes after its last completed chunk
+CREATE TABLE IF NOT EXISTS billing_run_checkpoints (
+    run_date DATE PRIMARY KEY,
+    last_subscription_id UUID,
+    processed INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    chunks INTEGER NOT NULL DEFAULT 0,
+    status VARCHAR(20) DEFAULT 'running' CHECK (status IN ('running', 'completed')),
+    started_at TIMESTAMP DEFAULT NOW(),
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Advance one chunk of due subscriptions in a single statement.
+-- p_updates: [{subscription_id, expected_delivery_date, next_delivery_date}]
+-- Rows that are no longer active, were changed since they were read, or
+-- were already billed for p_run_date are left alone, so retrying a chunk
+-- is safe. Returns the ids that were advanced.
+CREATE OR REPLACE FUNCTION apply_billing_advances(p_updates JSONB, p_run_date DATE)
+RETURNS TABLE (subscription_id UUID) AS $$
+    UPDATE subscriptions s
+    SET next_delivery_date = u.next_delivery_date,
+        delivery_count = COALESCE(s.delivery_count, 0) + 1,
+        last_delivery_date = p_run_date,
+        updated_at = NOW()
+    FROM jsonb_to_recordset(p_updates) AS u(subscription_id UUID, expected_delivery_date DATE, next_delivery_date DATE)
+    WHERE s.subscription_id = u.subscription_id
+      AND s.status = 'active'
+      AND s.next_delivery_date = u.expected_delivery_date
+      AND s.last_delivery_date IS DISTINCT FROM p_run_date
+    RETURNING s.subscription_id;
+$$ LANGUAGE sql;
+
+REVOKE EXECUTE ON FUNCTION apply_billing_advances FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION apply_billing_advances TO service_role;
+
+-- Subscription state transitions (pause, resume, skip, cancel) in one round
+-- trip. The transition is checked and applied by a single conditional UPDATE
+-- on a row locked by the same statement, so two concurrent requests cannot
+-- both act on the same prior state. p_user_id restricts the change to that
+-- user's subscription (NULL for admins). Returns one row: outcome 'applied'
+-- with the updated subscription, or 'not_found' / 'invalid_transition' with
+-- the status that blocked it.
+--   pause  active -> paused
+--   resume paused -> active; a next_delivery_date in the past moves forward
+--          by whole periods to the first date on or after today
+--   skip   active|paused; next_delivery_date moves one period later
+--   cancel active|paused -> canceled
+-- Periods are 7/30/90/365 days for weekly/monthly/quarterly/yearly and 7
+-- days otherwise, as in the billing run.
+CREATE OR REPLACE FUNCTION transition_subscription(
+    p_subscription_id UUID,
+    p_action TEXT,
+    p_user_id UUID DEFAULT NULL
+)
+RETURNS TABLE (outcome TEXT, previous_status TEXT, subscription JSONB) AS $$
+DECLARE
+    allowed_from TEXT[];
+    target_status TEXT;
+    old_status TEXT;
+    updated JSONB;
+BEGIN
+    CASE p_action
+        WHEN 'pause' THEN allowed_from := ARRAY['active']; target_status := 'paused';
+        WHEN 'resume' THEN allowed_from := ARRAY['paused']; target_status := 'active';
+        WHEN 'skip' THEN allowed_from := ARRAY['active', 'paused']; target_status := NULL;
+        WHEN 'cancel' THEN allowed_from := ARRAY['active', 'paused']; target_status := 'canceled';
+        ELSE RAISE EXCEPTION 'Unknown subscription action: %', p_action;
+    END CASE;
+
+    WITH locked AS (
+        SELECT c.subscription_id, c.status,
+               CASE c.frequency WHEN 'weekly' THEN 7 WHEN 'monthly' THEN 30
+                                WHEN 'quarterly' THEN 90 WHEN 'yearly' THEN 365 ELSE 7 END AS period
+        FROM subscriptions c
+        WHERE c.subscription_id = p_subscription_id
+          AND (p_user_id IS NULL OR c.user_id = p_user_id)
+        FOR UPDATE
+    )
+    UPDATE subscriptions s
+    SET status = COALESCE(target_status, s.status),
+        next_delivery_date = CASE p_action
+            WHEN 'skip' THEN COALESCE(s.next_delivery_date, CURRENT_DATE) + locked.period
+            WHEN 'resume' THEN s.next_delivery_date
+                + locked.period * CEIL(GREATEST(CURRENT_DATE - s.next_delivery_date, 0)::NUMERIC / locked.period)::INTEGER
+            ELSE s.next_delivery_date
+        END,
+        updated_at = NOW()
+    FROM locked
+    WHERE s.subscription_id = locked.subscription_id
+      AND locked.status = ANY(allowed_from)
+    RETURNING locked.status, to_jsonb(s) INTO old_status, updated;
+
+    IF FOUND THEN
+        RETURN QUERY SELECT 'applied'::TEXT, old_status, updated;
+        RETURN;
+    END IF;
+
+    SELECT c.status INTO old_status
+    FROM subscriptions c
+    WHERE c.subscription_id = p_subscription_id
+      AND (p_user_id IS NULL OR c.user_id = p_user_id);
+
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT 'not_found'::TEXT, NULL::TEXT, NULL::JSONB;
+    ELSE
+        RETURN QUERY SELECT 'invalid_transition'::TEXT, old_status, NULL::JSONB;
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Ownership is enforced through p_user_id by the API, so only the service
+-- role may call this directly
+REVOKE EXECUTE ON FUNCTION transition_subscription FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION transition_subscription TO service_role;
+
+-- Keyset pagination for list endpoints: newest first over (created_at, id),
+-- so every page is an index range scan starting at the cursor
+CREATE INDEX IF NOT EXISTS idx_users_created_id ON users(created_at, user_id);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_created_id ON subscriptions(created_at, subscription_id);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_user_created_id ON subscriptions(user_id, created_at, subscription_id);
+CREATE INDEX IF NOT EXISTS idx_payments_created_id ON payments(created_at, payment_id);
+
 -- Enable Row Level Security (RLS)
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
 ALTER TABLE products ENABLE ROW LEVEL SECURITY;
@@ -139,6 +506,9 @@ ALTER TABLE subscriptions ENABLE ROW LEVEL SECURITY;
 ALTER TABLE payments ENABLE ROW LEVEL SECURITY;
 ALTER TABLE audit_logs ENABLE ROW LEVEL SECURITY;
 ALTER TABLE notifications ENABLE ROW LEVEL SECURITY;
+ALTER TABLE subscription_status_rollup ENABLE ROW LEVEL SECURITY;
+ALTER TABLE monthly_revenue_rollup ENABLE ROW LEVEL SECURITY;
+ALTER TABLE billing_run_checkpoints ENABLE ROW LEVEL SECURITY;
 
 -- Create RLS policies
 -- Users can only see their own data
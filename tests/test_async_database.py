@@ -0,0 +1,99 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+
+from backend.core.async_database import AsyncDatabase
+from backend.models.subscription import Subscription
+
+
+class FakeAsyncCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.rows = []
+
+    async def execute(self, sql, params=None):
+        self.conn.queries.append((sql, params))
+        # Simulate a network round trip
+        await asyncio.sleep(0.01)
+        if sql.lstrip().startswith('INSERT'):
+            self.rows = [{'subscription_id': 'new-id'}]
+        else:
+            self.rows = [{'subscription_id': str(i), 'user_id': params[0] if params else 'u', 'status': 'active',
+                          'frequency': 'monthly', 'amount': 299} for i in range(2)]
+
+    async def fetchone(self):
+        return self.rows[0]
+
+    async def fetchall(self):
+        return self.rows
+
+    async def close(self):
+        pass
+
+
+class FakeAsyncConnection:
+    def __init__(self):
+        self.queries = []
+        self.commits = 0
+
+    def cursor(self, row_factory=None):
+        return FakeAsyncCursor(self)
+
+    async def commit(self):
+        self.commits += 1
+
+
+class FakeAsyncPool:
+    def __init__(self):
+        self.conn = FakeAsyncConnection()
+        self.opened = 0
+        self.checked_out = 0
+
+    async def open(self):
+        self.opened += 1
+
+    async def getconn(self):
+        self.checked_out += 1
+        return self.conn
+
+    async def putconn(self, conn):
+        self.checked_out -= 1
+
+
+class TestAsyncDatabase(unittest.TestCase):
+    def setUp(self):
+        self.pool = FakeAsyncPool()
+        self.database = AsyncDatabase('postgresql://test')
+        self.database._create_pool = lambda: self.pool
+
+    def test_concurrent_queries_share_one_pool(self):
+        async def run():
+            with patch('backend.models.subscription.async_db', self.database):
+                return await asyncio.gather(*(Subscription.get_by_user_async(f'user-{i}') for i in range(100)))
+
+        start = asyncio.get_event_loop_policy().new_event_loop()
+        try:
+            results = start.run_until_complete(run())
+        finally:
+            start.close()
+
+        self.assertEqual(len(results), 100)
+        self.assertEqual(results[5][0].user_id, 'user-5')
+        self.assertEqual(self.pool.opened, 1)
+        self.assertEqual(self.pool.checked_out, 0)
+        self.assertEqual(len(self.pool.conn.queries), 100)
+
+    def test_save_async_inserts_and_commits(self):
+        async def run():
+            with patch('backend.models.subscription.async_db', self.database):
+                subscription = Subscription(user_id='u1', product_id='p1', amount=299)
+                await subscription.save_async()
+                return subscription
+
+        subscription = asyncio.run(run())
+        self.assertEqual(subscription.subscription_id, 'new-id')
+        self.assertEqual(self.pool.conn.commits, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
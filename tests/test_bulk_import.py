@@ -0,0 +1,211 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import psycopg2
+
+from backend.api.merchant_api import app
+from backend.core.auth import auth_service
+from backend.services import bulk_import
+
+USER_ID = '11111111-1111-1111-1111-111111111111'
+PRODUCT_ID = '22222222-2222-2222-2222-222222222222'
+
+
+class FakeCursor:
+    def __init__(self, database):
+        self.database = database
+        self.result = []
+
+    def execute(self, sql, params=None):
+        self.database.executed.append(sql)
+        if 'missing_user' in sql:
+            self.result = self.database.unresolved
+        elif sql.lstrip().startswith('INSERT'):
+            if self.database.fail_merge:
+                raise psycopg2.IntegrityError('duplicate key value violates unique constraint')
+            copied = self.database.copied[-1]
+            lines = {int(row[0]) for row in copied} - {row['line'] for row in self.database.unresolved}
+            self.result = [{'inserted': True} for _ in lines]
+
+    def copy_expert(self, sql, buffer):
+        self.database.executed.append(sql)
+        self.database.copied.append(list(bulk_import.csv.reader(io.StringIO(buffer.read()))))
+
+    def fetchall(self):
+        return self.result
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.executed = []
+        self.copied = []
+        self.unresolved = []
+        self.commits = 0
+        self.fail_merge = False
+
+    @contextmanager
+    def get_cursor(self):
+        database = self
+
+        class Connection:
+            def commit(self):
+                database.commits += 1
+
+        yield FakeCursor(self), Connection()
+
+
+def subscription_csv(rows):
+    header = 'user_id,product_id,frequency,amount,status\n'
+    return header + ''.join(f'{row}\n' for row in rows)
+
+
+class TestBulkImport(unittest.TestCase):
+    def setUp(self):
+        self.database = FakeDatabase()
+        handle, self.error_file = tempfile.mkstemp(suffix='.ndjson')
+        os.close(handle)
+
+    def tearDown(self):
+        os.unlink(self.error_file)
+
+    def run_import(self, kind, text, fmt='csv', **options):
+        return bulk_import.import_rows(kind, io.StringIO(text), fmt, database=self.database,
+                                       error_file=self.error_file, **options)
+
+    def test_valid_rows_are_copied_and_merged_in_batches(self):
+        rows = [f'{USER_ID},{PRODUCT_ID},monthly,{100 + i},active' for i in range(5)]
+        report = self.run_import('subscriptions', subscription_csv(rows), batch_size=2)
+
+        self.assertEqual(report.rows, 5)
+        self.assertEqual(report.inserted, 5)
+        self.assertEqual(report.failed, 0)
+        self.assertEqual(report.batches, 3)
+        self.assertEqual(self.database.commits, 3)
+        self.assertEqual([len(batch) for batch in self.database.copied], [2, 2, 1])
+        self.assertIn('COPY import_subscriptions', '\n'.join(self.database.executed))
+        # line, subscription_id, user_id, user_email (NULL), product_id, status, frequency, amount, next_billing_date
+        first = self.database.copied[0][0]
+        self.assertEqual(first[0], '2')
+        self.assertEqual(first[2:8], [USER_ID, '', PRODUCT_ID, 'active', 'monthly', '100.00'])
+        self.assertGreater(report.rows_per_second, 0)
+
+    def test_invalid_rows_go_to_the_error_file(self):
+        rows = [
+            f'{USER_ID},{PRODUCT_ID},monthly,100,active',
+            f'{USER_ID},not-a-uuid,monthly,100,active',
+            f'{USER_ID},{PRODUCT_ID},daily,100,active',
+            f',{PRODUCT_ID},monthly,100,active',
+            f'{USER_ID},{PRODUCT_ID},monthly,-5,active',
+        ]
+        report = self.run_import('subscriptions', subscription_csv(rows))
+
+        self.assertEqual(report.inserted, 1)
+        self.assertEqual(report.failed, 4)
+        with open(self.error_file) as f:
+            errors = [json.loads(line) for line in f]
+        self.assertEqual([e['line'] for e in errors], [3, 4, 5, 6])
+        self.assertIn('product_id', errors[0]['error'])
+        self.assertIn('frequency', errors[1]['error'])
+        self.assertIn('user_id or user_email', errors[2]['error'])
+        self.assertEqual(errors[0]['row']['product_id'], 'not-a-uuid')
+
+    def test_unknown_references_are_reported(self):
+        self.database.unresolved = [{'line': 3, 'missing_user': False, 'missing_product': True}]
+        rows = [f'{USER_ID},{PRODUCT_ID},monthly,100,active'] * 2
+        report = self.run_import('subscriptions', subscription_csv(rows))
+
+        self.assertEqual(report.inserted, 1)
+        self.assertEqual(report.failed, 1)
+        self.assertEqual(report.errors[0]['line'], 3)
+        self.assertEqual(report.errors[0]['error'], 'unknown product')
+
+    def test_rejected_batch_fails_its_rows_only(self):
+        self.database.fail_merge = True
+        report = self.run_import('subscriptions', subscription_csv([f'{USER_ID},{PRODUCT_ID},weekly,1,paused']))
+        self.assertEqual(report.failed, 1)
+        self.assertIn('batch rejected by database', report.errors[0]['error'])
+        self.assertEqual(self.database.commits, 0)
+
+    def test_ndjson_users_with_skip_on_conflict(self):
+        text = '\n'.join([
+            json.dumps({'email': 'A@Example.com', 'password_hash': '$2b$12$abc', 'first_name': 'A', 'last_name': 'B'}),
+            '{not json',
+            json.dumps({'email': 'c@example.com', 'password_hash': 'plain', 'first_name': 'C', 'last_name': 'D'}),
+        ])
+        report = self.run_import('users', text, 'ndjson', on_conflict='skip')
+
+        self.assertEqual(report.inserted, 1)
+        self.assertEqual(report.failed, 2)
+        self.assertIn('ON CONFLICT (email) DO NOTHING', self.database.executed[-1])
+        self.assertEqual(self.database.copied[0][0][1:], ['a@example.com', '$2b$12$abc', 'A', 'B', 'user'])
+
+    def test_user_roles_match_the_schema(self):
+        text = '\n'.join([
+            'email,password_hash,first_name,last_name,user_role',
+            'a@example.com,$2b$12$abc,A,B,',
+            'b@example.com,$2b$12$abc,B,C,admin',
+            'c@example.com,$2b$12$abc,C,D,merchant',
+        ])
+        report = self.run_import('users', text)
+
+        self.assertEqual(report.inserted, 2)
+        self.assertEqual([row[-1] for row in self.database.copied[0]], ['user', 'admin'])
+        self.assertEqual(report.errors[0]['line'], 4)
+        self.assertIn('user_role must be one of user, admin', report.errors[0]['error'])
+
+    def test_update_on_conflict_keeps_keys(self):
+        sql = bulk_import._merge_sql(bulk_import.KINDS['products'], 'update')
+        self.assertIn('name = EXCLUDED.name', sql)
+        self.assertNotIn('product_id = EXCLUDED', sql)
+
+    def test_update_on_conflict_never_changes_credentials_or_role(self):
+        sql = bulk_import._merge_sql(bulk_import.KINDS['users'], 'update')
+        self.assertIn('first_name = EXCLUDED.first_name', sql)
+        self.assertNotIn('password_hash = EXCLUDED', sql)
+        self.assertNotIn('user_role = EXCLUDED', sql)
+
+    def test_rejects_unknown_options(self):
+        with self.assertRaises(ValueError):
+            self.run_import('orders', '')
+        with self.assertRaises(ValueError):
+            self.run_import('users', '', on_conflict='replace')
+
+
+class TestBulkImportEndpoint(unittest.TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        self.database = FakeDatabase()
+
+    def headers(self, role='admin'):
+        return {'Authorization': f"Bearer {auth_service.generate_token('u1', role)}"}
+
+    def test_streams_request_body(self):
+        body = subscription_csv([f'{USER_ID},{PRODUCT_ID},monthly,100,active'])
+        with patch('backend.services.bulk_import.db', self.database):
+            response = self.client.post('/api/merchant/import/subscriptions', data=body,
+                                        content_type='text/csv', headers=self.headers())
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['inserted'], 1)
+
+    def test_requires_admin(self):
+        body = subscription_csv([f'{USER_ID},{PRODUCT_ID},monthly,100,active'])
+        with patch('backend.services.bulk_import.db', self.database):
+            anonymous = self.client.post('/api/merchant/import/users', data=body, content_type='text/csv')
+            customer = self.client.post('/api/merchant/import/users', data=body, content_type='text/csv',
+                                        headers=self.headers('user'))
+        self.assertEqual(anonymous.status_code, 401)
+        self.assertEqual(customer.status_code, 403)
+        self.assertEqual(self.database.executed, [])
+
+    def test_unknown_kind(self):
+        response = self.client.post('/api/merchant/import/orders', data='', headers=self.headers())
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
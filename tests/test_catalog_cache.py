@@ -0,0 +1,65 @@
+import gzip
+import json
+import unittest
+
+from flask import Flask
+
+from backend.core.catalog_cache import CatalogCache, CatalogEntry, etag_matches
+
+app = Flask(__name__)
+PRODUCTS = [{'name': 'Coffee'}] * 200
+
+
+class CatalogCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = CatalogCache(ttl=60, max_entries=2)
+        self.loads = 0
+
+    def loader(self):
+        self.loads += 1
+        return PRODUCTS
+
+    def respond(self, **headers):
+        with app.test_request_context('/products', headers=headers):
+            return self.cache.response(('products',), self.loader)
+
+    def test_entries_expire_and_stay_bounded(self):
+        entry = self.cache.put('a', self.cache.version, b'[]', now=0)
+        self.assertIsInstance(entry, CatalogEntry)
+        self.assertIs(self.cache.get('a', now=59), entry)
+        self.assertIsNone(self.cache.get('a', now=60))
+
+        for key in ('a', 'b', 'c'):
+            self.cache.put(key, self.cache.version, key.encode(), now=0)
+        self.assertIsNone(self.cache.get('a', now=1))
+        self.assertEqual(self.cache.get('c', now=1).body, b'c')
+        self.assertEqual(self.cache.stats()['entries'], 2)
+
+    def test_put_under_old_version_is_not_cached(self):
+        version = self.cache.version
+        self.assertEqual(self.cache.bump(), version + 1)
+        self.cache.put('a', version, b'[]')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_revalidation_and_compressed_variant(self):
+        first = self.respond()
+        self.assertEqual(first.headers['X-Cache'], 'MISS')
+        self.assertEqual(json.loads(first.get_data()), PRODUCTS)
+
+        compressed = self.respond(**{'Accept-Encoding': 'gzip'})
+        self.assertEqual(compressed.headers['Content-Encoding'], 'gzip')
+        self.assertTrue(compressed.headers['ETag'].endswith('-gzip"'))
+        self.assertEqual(json.loads(gzip.decompress(compressed.get_data())), PRODUCTS)
+        self.assertTrue(etag_matches(first.headers['ETag'], compressed.headers['ETag']))
+
+        self.assertEqual(self.respond(**{'If-None-Match': first.headers['ETag']}).status_code, 304)
+        self.assertEqual(self.loads, 1)
+
+        self.cache.bump()
+        self.assertEqual(self.respond().headers['X-Cache'], 'MISS')
+        self.assertEqual(self.cache.stats()['not_modified'], 1)
+        self.assertEqual(self.cache.stats()['bumps'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import gzip
+import json
+import unittest
+import zlib
+
+from flask import Flask, Response, jsonify
+
+from backend.core.compression import init_compression
+from backend.core.content_coding import compress_stream, negotiate
+
+
+def compressed_app():
+    app = Flask(__name__)
+    rows = [{'subscription_id': str(i), 'status': 'active'} for i in range(200)]
+    app.add_url_rule('/large', 'large', lambda: jsonify(rows))
+    app.add_url_rule('/small', 'small', lambda: jsonify({'ok': True}))
+    app.add_url_rule('/stream', 'stream',
+                     lambda: Response((json.dumps(row) + '\n' for row in rows), mimetype='text/plain'))
+    app.add_url_rule('/image', 'image', lambda: Response(b'\x89PNG' * 1000, mimetype='image/png'))
+    return init_compression(app), rows
+
+
+class CompressionTest(unittest.TestCase):
+    def test_negotiation(self):
+        self.assertEqual(negotiate('gzip, deflate', size=4096), 'gzip')
+        self.assertIsNone(negotiate('gzip;q=0, identity', size=4096))
+        self.assertEqual(negotiate('*;q=0.5', size=4096, available=('gzip',)), 'gzip')
+        self.assertIsNone(negotiate('gzip', size=10))
+
+    def test_buffered_response(self):
+        app, rows = compressed_app()
+        client = app.test_client()
+
+        response = client.get('/large', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(json.loads(gzip.decompress(response.data)), rows)
+
+        self.assertNotIn('Content-Encoding', client.get('/large', headers={'Accept-Encoding': 'gzip;q=0'}).headers)
+        self.assertNotIn('Content-Encoding', client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers)
+        self.assertNotIn('Content-Encoding', client.get('/image', headers={'Accept-Encoding': 'gzip'}).headers)
+
+    def test_streamed_response(self):
+        app, rows = compressed_app()
+        response = app.test_client().get('/stream', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', response.headers)
+        lines = gzip.decompress(response.data).decode().splitlines()
+        self.assertEqual([json.loads(line) for line in lines], rows)
+
+    def test_stream_blocks_decode_on_arrival(self):
+        decoder = zlib.decompressobj(31)
+        blocks = compress_stream(['{"a": 1}\n', b'{"b": 2}\n'], 'gzip')
+        self.assertEqual(decoder.decompress(next(blocks)), b'{"a": 1}\n')
+        self.assertEqual(decoder.decompress(next(blocks)), b'{"b": 2}\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import threading
+import time
+import unittest
+
+import psycopg2
+from psycopg2 import extensions
+
+from backend.core.database import Database
+from backend.core.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+        self.fail_ping = False
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+    def cursor(self, cursor_factory=None):
+        conn = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params=None):
+                if conn.fail_ping:
+                    raise psycopg2.OperationalError('server closed the connection unexpectedly')
+
+            def close(self):
+                pass
+
+        return Cursor()
+
+    def close(self):
+        self.closed = 1
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.opened = []
+
+    def connect(self):
+        conn = FakeConnection()
+        self.opened.append(conn)
+        return conn
+
+    def test_connections_are_reused(self):
+        pool = ConnectionPool(self.connect, min_size=0, max_size=2)
+        for _ in range(5):
+            conn = pool.getconn()
+            pool.putconn(conn)
+        self.assertEqual(len(self.opened), 1)
+        self.assertEqual(pool.stats()['checkouts'], 5)
+
+    def test_checkout_times_out_when_exhausted(self):
+        pool = ConnectionPool(self.connect, min_size=0, max_size=1, timeout=0.05)
+        held = pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+        # A waiter is woken as soon as the connection comes back
+        threading.Timer(0.02, pool.putconn, (held,)).start()
+        self.assertIs(pool.getconn(timeout=1), held)
+
+    def test_open_transaction_is_rolled_back_on_return(self):
+        pool = ConnectionPool(self.connect, min_size=0, max_size=1)
+        conn = pool.getconn()
+        conn.status = extensions.TRANSACTION_STATUS_INTRANS
+        pool.putconn(conn)
+        self.assertEqual(conn.rollbacks, 1)
+        self.assertIs(pool.getconn(), conn)
+
+    def test_broken_and_expired_connections_are_replaced(self):
+        pool = ConnectionPool(self.connect, min_size=0, max_size=2, ping_after=0, max_lifetime=60)
+        conn = pool.getconn()
+        pool.putconn(conn)
+        conn.fail_ping = True
+        replacement = pool.getconn()
+        self.assertIsNot(replacement, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['failed_checks'], 1)
+
+        pool.max_lifetime = 0
+        pool.putconn(replacement)
+        self.assertTrue(replacement.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+    def test_idle_connections_are_reaped_down_to_min_size(self):
+        pool = ConnectionPool(self.connect, min_size=1, max_size=3, max_idle=10)
+        conns = [pool.getconn() for _ in range(3)]
+        for conn in conns:
+            pool.putconn(conn)
+        self.assertEqual(pool.reap(time.monotonic() + 11), 2)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_database_cursor_api_uses_pool(self):
+        database = Database('postgresql://test', min_size=0, max_size=1)
+        database.pool.connect = self.connect
+
+        for _ in range(3):
+            with database.get_cursor() as (cursor, conn):
+                cursor.execute('SELECT 1')
+        self.assertEqual(len(self.opened), 1)
+
+        with self.assertRaises(psycopg2.OperationalError):
+            with database.get_cursor():
+                raise psycopg2.OperationalError('connection lost')
+        self.assertTrue(self.opened[0].closed)
+        self.assertEqual(database.stats()['size'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
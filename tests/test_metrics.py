@@ -0,0 +1,78 @@
+import unittest
+
+from flask import Flask, abort
+
+from backend.core import metrics as metrics_module
+from backend.core.request_metrics import RequestMetrics
+
+
+def metered_app(registry, path=None):
+    app = Flask(__name__)
+    app.add_url_rule('/items/<item_id>', 'item', lambda item_id: {'id': item_id})
+    app.add_url_rule('/boom', 'boom', lambda: abort(503))
+    app.add_url_rule('/stats', 'stats', lambda: metrics_module.metrics_response(database_pool={'size': 2}))
+    return metrics_module.init_metrics(app, path, registry)
+
+
+class FlaskMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = RequestMetrics()
+
+    def test_requests_labelled_by_rule_and_status(self):
+        client = metered_app(self.registry).test_client()
+        client.get('/items/1')
+        client.get('/items/2')
+        client.get('/boom')
+        client.get('/missing')
+
+        snapshot = self.registry.snapshot()
+        self.assertEqual(snapshot['routes']['GET /items/<item_id>']['status'], {'200': 2})
+        self.assertEqual(snapshot['routes']['GET /boom']['error_rate_percent'], 100.0)
+        self.assertEqual(snapshot['routes']['GET <unmatched>']['status'], {'404': 1})
+        self.assertEqual(snapshot['in_flight'], 0)
+
+    def test_metrics_response_adds_extra_sections(self):
+        client = metered_app(self.registry).test_client()
+        client.get('/items/1')
+
+        payload = client.get('/stats').get_json()
+        self.assertEqual(payload['database_pool'], {'size': 2})
+        self.assertEqual(payload['routes']['GET /items/<item_id>']['total_requests'], 1)
+        # The request serving the snapshot is still in flight
+        self.assertEqual(payload['in_flight'], 1)
+
+        response = client.get('/stats?format=prometheus')
+        self.assertTrue(response.mimetype.startswith('text/plain'))
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/items/<item_id>",status="200"} 1',
+                      response.get_data(as_text=True))
+
+    def test_path_serves_metrics(self):
+        client = metered_app(self.registry, '/metrics').test_client()
+        client.get('/items/1')
+        self.assertEqual(client.get('/metrics').get_json()['routes']['GET /items/<item_id>']['status'], {'200': 1})
+
+    def test_default_registry_and_process_stats(self):
+        app = metrics_module.init_metrics(Flask(__name__))
+        self.assertIs(app.extensions['request_metrics'], metrics_module.metrics)
+        stats = metrics_module.process_stats()
+        self.assertEqual(stats['active_connections'], metrics_module.metrics.in_flight())
+        self.assertIn('memory_usage_mb', stats)
+
+
+class RequestMetricsTest(unittest.TestCase):
+    def test_rolling_window_drops_old_slices(self):
+        registry = RequestMetrics(slice_seconds=10, window_seconds=60)
+        for _ in range(3):
+            registry.begin('GET')
+            registry.end('GET', '/users', 200, 0.050, now=1000.0)
+        registry.begin('GET')
+        registry.end('GET', '/users', 500, 0.200, now=1055.0)
+
+        self.assertEqual(registry.snapshot(now=1059.0)['routes']['GET /users']['windows']['60s']['count'], 4)
+        snapshot = registry.snapshot(now=1065.0)
+        self.assertEqual(snapshot['routes']['GET /users']['windows']['60s']['count'], 1)
+        self.assertEqual(snapshot['error_rates']['window_error_rate_percent'], 100.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
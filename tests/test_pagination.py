@@ -0,0 +1,43 @@
+import unittest
+from datetime import datetime, timezone
+
+from werkzeug.datastructures import MultiDict
+
+from backend.core.keyset import MAX_PAGE_SIZE
+from backend.core.pagination import InvalidCursor, KeysetPage, decode_cursor, encode_cursor, page_size
+
+
+class KeysetPageTest(unittest.TestCase):
+    def test_first_page_has_no_filter(self):
+        page = KeysetPage(MultiDict({'limit': '2'}), 's.created_at', 's.subscription_id')
+        self.assertEqual(page.where(), (None, ()))
+        self.assertEqual(page.order_by(), ('ORDER BY s.created_at DESC, s.subscription_id DESC LIMIT %s', (3,)))
+
+    def test_split_and_follow_cursor(self):
+        created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        rows = [{'created_at': created, 'subscription_id': f'sub-{i}'} for i in range(3)]
+        page = KeysetPage(MultiDict({'limit': '2'}), 's.created_at', 's.subscription_id')
+
+        items, cursor = page.split(rows, 'created_at', 'subscription_id')
+        self.assertEqual(items, rows[:2])
+        self.assertEqual(decode_cursor(cursor), ['2024-01-01T00:00:00+00:00', 'sub-1'])
+
+        following = KeysetPage(MultiDict({'limit': '2', 'cursor': cursor}), 's.created_at', 's.subscription_id')
+        self.assertEqual(following.where(), ('(s.created_at, s.subscription_id) < (%s, %s)',
+                                             ('2024-01-01T00:00:00+00:00', 'sub-1')))
+        self.assertEqual(following.split(rows[2:], 'created_at', 'subscription_id'), (rows[2:], None))
+
+    def test_bad_cursor_rejected(self):
+        for cursor in ('not-a-cursor', encode_cursor('only-one')):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                KeysetPage(MultiDict({'cursor': cursor}), 'created_at', 'id')
+
+    def test_page_size_accepts_multidict_and_parse_qs(self):
+        self.assertEqual(page_size(MultiDict({'limit': '100000'})), MAX_PAGE_SIZE)
+        self.assertEqual(page_size(MultiDict({'per_page': '7'})), 7)
+        self.assertEqual(page_size({'limit': ['0']}), 1)
+        self.assertEqual(page_size({'limit': ['abc']}, default=20), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import unittest
+import uuid
+from unittest.mock import patch
+
+from psycopg2 import extensions
+
+from backend.core.database import Database
+from backend.models.subscription import Subscription
+from backend.services.billing_service import BillingService
+
+
+class FakeNamedCursor:
+    # Serves rows lazily, like a server-side cursor, and records each round trip
+    def __init__(self, conn, name):
+        self.conn = conn
+        self.name = name
+        self.itersize = 2000
+        self.position = 0
+        self.closed = False
+
+    def execute(self, sql, params=None):
+        self.conn.executed.append((self.name, sql, params))
+
+    def _fetch(self, size):
+        rows = [{'subscription_id': str(uuid.UUID(int=i)), 'user_id': str(uuid.UUID(int=1)),
+                 'product_id': str(uuid.UUID(int=2)), 'status': 'active',
+                 'frequency': 'monthly', 'amount': 100}
+                for i in range(self.position, min(self.position + size, self.conn.row_count))]
+        self.position += len(rows)
+        self.conn.fetches.append(len(rows))
+        return rows
+
+    def fetchmany(self, size):
+        return self._fetch(size)
+
+    def __iter__(self):
+        while True:
+            rows = self._fetch(self.itersize)
+            if not rows:
+                return
+            yield from rows
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, row_count):
+        self.row_count = row_count
+        self.executed = []
+        self.fetches = []
+        self.cursors = []
+        self.closed = 0
+
+    def cursor(self, name=None, cursor_factory=None):
+        cursor = FakeNamedCursor(self, name)
+        self.cursors.append(cursor)
+        return cursor
+
+    def get_transaction_status(self):
+        return extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
+class TestServerSideCursors(unittest.TestCase):
+    def setUp(self):
+        self.conn = FakeConnection(row_count=2500)
+        self.database = Database('postgresql://test', min_size=0, max_size=1)
+        self.database.pool.connect = lambda: self.conn
+
+    def test_iter_rows_fetches_itersize_at_a_time(self):
+        rows = self.database.iter_rows('SELECT * FROM subscriptions', itersize=1000)
+        self.assertEqual(next(rows)['subscription_id'], str(uuid.UUID(int=0)))
+        # Only the first round trip has happened so far
+        self.assertEqual(self.conn.fetches, [1000])
+        self.assertEqual(sum(1 for _ in rows), 2499)
+        self.assertEqual(self.conn.fetches, [1000, 1000, 500, 0])
+        self.assertIsNotNone(self.conn.cursors[0].name)
+        self.assertTrue(self.conn.cursors[0].closed)
+
+    def test_iter_batches_releases_connection_when_closed_early(self):
+        batches = self.database.iter_batches('SELECT 1', size=100)
+        self.assertEqual(len(next(batches)), 100)
+        self.assertEqual(self.database.stats()['in_use'], 1)
+        batches.close()
+        self.assertTrue(self.conn.cursors[0].closed)
+        self.assertEqual(self.database.stats()['in_use'], 0)
+
+    def test_cursor_names_are_unique(self):
+        list(self.database.iter_rows('SELECT 1'))
+        list(self.database.iter_rows('SELECT 1'))
+        self.assertNotEqual(self.conn.cursors[0].name, self.conn.cursors[1].name)
+
+    def test_subscription_iter_batches(self):
+        with patch('backend.models.subscription.db', self.database):
+            batches = list(Subscription.iter_batches(1000))
+            active = Subscription.get_active_subscriptions()
+        self.assertEqual([len(batch) for batch in batches], [1000, 1000, 500])
+        self.assertIsInstance(batches[0][0], Subscription)
+        self.assertEqual(len(active), 2500)
+
+    def test_recurring_billing_streams_due_subscriptions(self):
+        billing = BillingService()
+        with patch('backend.services.billing_service.db', self.database), \
+                patch.object(BillingService, 'create_subscription_order', return_value={'id': 'order'}), \
+                patch.object(BillingService, '_log_billing_event') as log, \
+                patch.object(Subscription, 'set_next_billing_date') as set_next_billing_date:
+            billing.process_recurring_billing(batch_size=700)
+        self.assertEqual(log.call_count, 2500)
+        self.assertEqual(set_next_billing_date.call_count, 2500)
+        self.assertEqual(self.conn.fetches, [700, 700, 700, 400, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+import unittest
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# api/ and backend/subscription-api/ are deployed on their own (Vercel project,
+# Docker context), so shared stdlib-only modules are copied into them verbatim
+SHARED = {
+    f'backend/core/{name}': [f'api/{name}', f'backend/subscription-api/src/{name}']
+    for name in ('request_metrics.py', 'keyset.py', 'content_coding.py', 'catalog_core.py')
+}
+# The root Flask apps keep no audit log, so the api copy is the source
+SHARED['api/write_behind.py'] = ['backend/subscription-api/src/write_behind.py']
+# The subscription API verifies tokens with flask_jwt_extended, not this cache
+SHARED['backend/core/token_core.py'] = ['api/token_core.py']
+
+
+class SharedModuleCopiesTest(unittest.TestCase):
+    def test_copies_match_source(self):
+        for source, copies in SHARED.items():
+            expected = (ROOT / source).read_bytes()
+            for copy in copies:
+                with self.subTest(copy=copy):
+                    self.assertEqual((ROOT / copy).read_bytes(), expected, f'{copy} differs from {source}; copy it over again')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import unittest
+
+from psycopg2 import errors, extensions
+
+from backend.core.statements import StatementRegistry, to_server_params
+
+
+class FakeConnection:
+    def __init__(self):
+        self.executed = []
+        self.prepared = set()
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = extensions.TRANSACTION_STATUS_IDLE
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, sql, params=None):
+        conn = self.connection
+        conn.executed.append((sql, params))
+        conn.status = extensions.TRANSACTION_STATUS_INTRANS
+        words = sql.split()
+        if words[0] == 'PREPARE':
+            if words[1] in conn.prepared:
+                raise errors.DuplicatePreparedStatement()
+            conn.prepared.add(words[1])
+        elif words[0] == 'EXECUTE' and words[1] not in conn.prepared:
+            raise errors.InvalidSqlStatementName()
+        elif sql == 'DEALLOCATE ALL':
+            conn.prepared.clear()
+        elif words[0] == 'DEALLOCATE':
+            conn.prepared.discard(words[1])
+
+
+class TestStatementRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = StatementRegistry(max_per_connection=2)
+        self.by_user = self.registry.register('by_user', 'SELECT * FROM subscriptions WHERE user_id=%s')
+
+    def statements(self, conn):
+        return [sql for sql, _ in conn.executed]
+
+    def test_placeholders_are_numbered(self):
+        sql, count = to_server_params("SELECT %s, %s WHERE note LIKE 'a%%'")
+        self.assertEqual(sql, "SELECT $1, $2 WHERE note LIKE 'a%'")
+        self.assertEqual(count, 2)
+        with self.assertRaises(ValueError):
+            to_server_params('SELECT %(name)s')
+
+    def test_prepared_once_per_connection(self):
+        conn = FakeConnection()
+        for user_id in ('u1', 'u2', 'u3'):
+            self.by_user.execute(FakeCursor(conn), (user_id,))
+
+        self.assertEqual(self.statements(conn), [
+            'PREPARE by_user AS SELECT * FROM subscriptions WHERE user_id=$1',
+            'EXECUTE by_user (%s)',
+            'EXECUTE by_user (%s)',
+            'EXECUTE by_user (%s)'
+        ])
+        self.assertEqual(conn.executed[-1][1], ('u3',))
+
+        # A new connection (e.g. after a reconnect) prepares again
+        other = FakeConnection()
+        self.by_user.execute(FakeCursor(other), ('u1',))
+        self.assertTrue(self.statements(other)[0].startswith('PREPARE by_user'))
+
+        stats = self.registry.stats()['statements']['by_user']
+        self.assertEqual(stats['calls'], 4)
+        self.assertEqual(stats['prepares'], 2)
+
+    def test_least_recently_used_statement_is_deallocated(self):
+        first = self.registry.register('first', 'SELECT 1')
+        second = self.registry.register('second', 'SELECT 2')
+        conn = FakeConnection()
+        cursor = FakeCursor(conn)
+        first.execute(cursor)
+        second.execute(cursor)
+        first.execute(cursor)
+        self.by_user.execute(cursor, ('u1',))
+
+        self.assertIn('DEALLOCATE second', self.statements(conn))
+        self.assertEqual(conn.prepared, {'first', 'by_user'})
+        self.assertEqual(self.registry.stats()['evictions'], 1)
+
+    def test_lost_statements_are_prepared_again(self):
+        conn = FakeConnection()
+        self.by_user.execute(FakeCursor(conn), ('u1',))
+        # Session state reset behind the registry's back
+        conn.prepared.clear()
+        conn.status = extensions.TRANSACTION_STATUS_IDLE
+
+        self.by_user.execute(FakeCursor(conn), ('u2',))
+        self.assertEqual(conn.rollbacks, 1)
+        self.assertEqual(self.statements(conn)[-2:], [
+            'PREPARE by_user AS SELECT * FROM subscriptions WHERE user_id=$1',
+            'EXECUTE by_user (%s)'
+        ])
+        self.assertEqual(self.registry.stats()['reprepares'], 1)
+
+    def test_lost_statement_inside_transaction_is_not_retried(self):
+        conn = FakeConnection()
+        self.by_user.execute(FakeCursor(conn), ('u1',))
+        conn.prepared.clear()
+
+        with self.assertRaises(errors.InvalidSqlStatementName):
+            self.by_user.execute(FakeCursor(conn), ('u2',))
+        self.assertEqual(conn.rollbacks, 0)
+        # The next call prepares from scratch
+        conn.rollback()
+        self.by_user.execute(FakeCursor(conn), ('u3',))
+        self.assertIn('by_user', conn.prepared)
+
+    def test_disabled_registry_sends_plain_sql(self):
+        registry = StatementRegistry(enabled=False)
+        statement = registry.register('by_user', 'SELECT * FROM subscriptions WHERE user_id=%s')
+        conn = FakeConnection()
+        statement.execute(FakeCursor(conn), ('u1',))
+        self.assertEqual(conn.executed, [('SELECT * FROM subscriptions WHERE user_id=%s', ('u1',))])
+
+    def test_register_rejects_conflicting_sql(self):
+        self.assertIs(self.registry.register('by_user', self.by_user.sql), self.by_user)
+        with self.assertRaises(ValueError):
+            self.registry.register('by_user', 'SELECT 1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+import uuid
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from backend.benchmarks.subscription_memory import measure, CANDIDATES
+from backend.models.subscription import Subscription
+from backend.models.subscription_batch import SubscriptionBatch, SubscriptionRow, from_micros
+
+NOW = datetime(2025, 3, 1, 12, 0)
+
+
+def row(i, frequency='monthly', status='active', amount='299.00', next_billing_date=NOW):
+    return {
+        'subscription_id': str(uuid.UUID(int=i)),
+        'user_id': str(uuid.UUID(int=1000 + i)),
+        'product_id': str(uuid.UUID(int=7)),
+        'status': status,
+        'frequency': frequency,
+        'amount': Decimal(amount),
+        'next_billing_date': next_billing_date
+    }
+
+
+class TestSubscriptionBatch(unittest.TestCase):
+    def test_round_trip(self):
+        source = row(1, 'quarterly', 'paused', '1499.50', NOW - timedelta(days=3))
+        batch = SubscriptionBatch.from_rows([source, row(2)])
+
+        self.assertEqual(len(batch), 2)
+        first = batch.row(0)
+        self.assertIsInstance(first, SubscriptionRow)
+        for name, value in source.items():
+            self.assertEqual(getattr(first, name), value)
+        self.assertFalse(hasattr(first, '__dict__'))
+
+    def test_accepts_subscription_objects(self):
+        subscription = Subscription(**row(3))
+        batch = SubscriptionBatch.from_rows([subscription])
+        self.assertEqual(batch.row(0).subscription_id, subscription.subscription_id)
+
+    def test_bad_row_leaves_columns_aligned(self):
+        batch = SubscriptionBatch.from_rows([row(1)])
+        with self.assertRaises(ValueError):
+            batch.append(dict(row(2), product_id='not-a-uuid'))
+        with self.assertRaises(ValueError):
+            batch.append(row(3, frequency='daily'))
+        self.assertEqual(len(batch), 1)
+        self.assertEqual(len(batch.subscription_ids), 1)
+
+    def test_due_and_next_billing_dates(self):
+        batch = SubscriptionBatch.from_rows([
+            row(1, 'weekly', next_billing_date=NOW - timedelta(days=1)),
+            row(2, 'yearly', next_billing_date=NOW + timedelta(days=1)),
+            row(3, 'monthly', next_billing_date=None),
+        ])
+        self.assertEqual(batch.due(NOW), [0])
+        next_dates = [from_micros(value) for value in batch.next_billing_dates(NOW)]
+        self.assertEqual(next_dates, [NOW + timedelta(days=7), NOW + timedelta(days=365), NOW + timedelta(days=30)])
+
+    def test_aggregates(self):
+        batch = SubscriptionBatch.from_rows([
+            row(1, 'weekly', amount='70.00'),
+            row(2, 'monthly', amount='300.00'),
+            row(3, 'monthly', status='canceled', amount='999.99'),
+            row(4, 'yearly', amount='365.00'),
+        ])
+        self.assertEqual(batch.total_amount(), Decimal('1734.99'))
+        self.assertEqual(batch.total_amount(batch.where_status('active')), Decimal('735.00'))
+        self.assertEqual(batch.revenue_by_frequency()['monthly'], Decimal('300.00'))
+        # 70 * 30/7 + 300 + 365 * 30/365
+        self.assertEqual(batch.monthly_recurring_revenue(), Decimal('630.00'))
+
+        forecast = batch.forecast(14, NOW)
+        # weekly bills at day 0, 7 and 14; monthly and yearly once today
+        self.assertEqual(forecast, {'billings': 5, 'amount': Decimal('875.00')})
+
+    def test_take(self):
+        batch = SubscriptionBatch.from_rows([row(i) for i in range(1, 6)])
+        subset = batch.take([4, 1])
+        self.assertEqual([r.subscription_id for r in subset], [str(uuid.UUID(int=5)), str(uuid.UUID(int=2))])
+
+    def test_batch_is_smaller_than_objects(self):
+        objects = measure(CANDIDATES['Subscription'], 2000)
+        batch = measure(CANDIDATES['SubscriptionBatch'], 2000)
+        self.assertLess(batch['bytes'] * 5, objects['bytes'])
+
+
+if __name__ == '__main__':
+    unittest.main()
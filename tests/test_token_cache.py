@@ -0,0 +1,90 @@
+import time
+import unittest
+from unittest.mock import patch
+
+import jwt
+
+from backend.core.token_cache import VerifiedTokenCache
+from backend.core.token_core import unverified_expiry
+
+SECRET = 'test-secret'
+
+
+def make_token(secret=SECRET, **claims):
+    payload = {'user_id': 'u1', 'role': 'customer', 'exp': int(time.time()) + 3600}
+    payload.update(claims)
+    return jwt.encode(payload, secret, algorithm='HS256')
+
+
+class VerifiedTokenCacheTest(unittest.TestCase):
+    def test_signature_checked_once(self):
+        cache = VerifiedTokenCache(SECRET)
+        token = make_token()
+        with patch('backend.core.token_cache.jwt.decode', wraps=jwt.decode) as decode:
+            for _ in range(5):
+                self.assertEqual(cache.verify(token)['user_id'], 'u1')
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (4, 1))
+
+    def test_invalid_and_expired_tokens(self):
+        cache = VerifiedTokenCache(SECRET)
+        self.assertIsNone(cache.verify(make_token(secret='other-secret')))
+        self.assertIsNone(cache.verify(make_token(exp=int(time.time()) - 10)))
+        self.assertIsNone(cache.verify(''))
+        self.assertEqual(cache.stats()['rejected'], 2)
+        self.assertEqual(cache.stats()['size'], 0)
+
+        # Cached claims lapse at the token's exp and the token is verified afresh
+        token = make_token()
+        cache.verify(token)
+        with patch('backend.core.token_core.time.time', return_value=time.time() + 7200), \
+                patch('backend.core.token_cache.jwt.decode', wraps=jwt.decode) as decode:
+            cache.verify(token)
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual(cache.stats()['misses'], 4)
+
+    def test_tokens_without_exp_use_default_ttl(self):
+        cache = VerifiedTokenCache(SECRET, default_ttl=60)
+        token = jwt.encode({'user_id': 'u1'}, SECRET, algorithm='HS256')
+        self.assertEqual(cache.verify(token)['user_id'], 'u1')
+        with patch('backend.core.token_core.time.time', return_value=time.time() + 61), \
+                patch('backend.core.token_cache.jwt.decode', wraps=jwt.decode) as decode:
+            cache.verify(token)
+        self.assertEqual(decode.call_count, 1)
+
+    def test_revocation(self):
+        cache = VerifiedTokenCache(SECRET)
+        token = make_token()
+        self.assertTrue(cache.verify(token))
+        cache.revoke(token)
+        self.assertIsNone(cache.verify(token))
+        self.assertEqual(cache.stats()['revoked'], 1)
+
+        # Deny entries are pruned once the token would have expired
+        with patch('backend.core.token_core.time.time', return_value=time.time() + 7200):
+            cache.revoke(make_token(user_id='u2'), until=time.time() + 10000)
+        self.assertEqual(cache.stats()['revoked'], 1)
+
+    def test_unverified_expiry(self):
+        exp = int(time.time()) + 3600
+        self.assertEqual(unverified_expiry(make_token(secret='other', exp=exp)), exp)
+        self.assertIsNone(unverified_expiry('not-a-token'))
+        self.assertIsNone(unverified_expiry(jwt.encode({'user_id': 'u1'}, SECRET, algorithm='HS256')))
+
+    def test_lru_bound(self):
+        cache = VerifiedTokenCache(SECRET, max_entries=3)
+        tokens = [make_token(user_id=f'u{i}') for i in range(4)]
+        for token in tokens[:3]:
+            cache.verify(token)
+        cache.verify(tokens[0])
+        cache.verify(tokens[3])
+        self.assertEqual(cache.stats()['size'], 3)
+        with patch('backend.core.token_cache.jwt.decode', wraps=jwt.decode) as decode:
+            cache.verify(tokens[0])
+            cache.verify(tokens[1])
+        # tokens[0] was recently used and kept; tokens[1] was evicted
+        self.assertEqual(decode.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()